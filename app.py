@@ -39,6 +39,11 @@ db.init_app(app)
 app.config["GOOGLE_MAPS_API_KEY"] = os.environ.get("GOOGLE_MAPS_API_KEY", "")
 app.config["MOTIVE_API_KEY"] = os.environ.get("MOTIVE_API_KEY", "")
 
+# Server-sent dashboard updates hold a worker thread per open dashboard; needs a threaded worker
+# (gunicorn -k gthread). Set LIVE_UPDATES_SSE=false on sync workers to fall back to polling.
+# Each worker streams to at most LIVE_UPDATES_MAX_STREAMS dashboards; extra ones get 204 and poll.
+app.config["LIVE_UPDATES_SSE"] = os.environ.get("LIVE_UPDATES_SSE", "true").lower() == "true"
+
 # Safe Mode configuration - disable API calls for testing
 app.config["SAFE_MODE"] = os.environ.get("SAFE_MODE", "false").lower() == "true"
 
@@ -51,6 +56,13 @@ with app.app_context():
     # Create database tables
     db.create_all()
     
+    # Add columns introduced since the tables were first created
+    from services.db_maintenance import ensure_schema
+    ensure_schema()
+    
+    # Keep the driver performance rollups current on every flush
+    import services.rollups  # noqa: F401
+    
     # Register blueprints (removed auth blueprint)
     from routes.dashboard import dashboard_bp
     from routes.loads import loads_bp
@@ -62,6 +74,7 @@ with app.app_context():
     from routes.availability import availability_bp
     from routes.temperature import temperature_bp
     from routes.assets import assets_bp
+    from routes.locations import locations_bp
     
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(loads_bp)
@@ -73,6 +86,15 @@ with app.app_context():
     app.register_blueprint(availability_bp)
     app.register_blueprint(temperature_bp, url_prefix='/temperature')
     app.register_blueprint(assets_bp)
+    app.register_blueprint(locations_bp)
+    
+    # Poll Motive for vehicle locations in the background once the worker serves requests
+    from services.motive_poller import motive_poller
+    app.before_request(motive_poller.ensure_running)
+    
+    # Resume availability broadcasts left unfinished by a restarted worker
+    from services.availability_mailer import worker as broadcast_worker
+    app.before_request(broadcast_worker.ensure_running)
     
     # Add root route redirect
     @app.route('/')
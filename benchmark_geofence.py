@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compare scalar and vectorized geofence evaluation
+
+Builds in-memory loads and facilities (nothing is written to the database) and
+runs the same pings through check_geofence_entry one at a time and through
+evaluate_geofence_pings as one batch, then checks both leave the loads in the
+same state.
+
+Usage:
+    python benchmark_geofence.py [--loads 500] [--pings 20000] [--seed 7]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import Facility, Load
+from services.geofencing import (
+    calculate_distance, haversine_miles, check_geofence_entry, evaluate_geofence_pings
+)
+
+LOAD_FIELDS = ('status', 'actual_pickup_arrival', 'actual_pickup_departure',
+               'actual_delivery_arrival', 'actual_delivery_departure')
+
+
+def build_loads(count, rng):
+    """Transient loads whose pickup and delivery fences are about 100 miles apart"""
+    loads = {}
+    for load_id in range(1, count + 1):
+        lat, lng = rng.uniform(30, 45), rng.uniform(-120, -80)
+        pickup = Facility(id=load_id * 2, name=f"Pickup {load_id}", address='', lat=lat, lng=lng, geofence_radius=0.5)
+        delivery = Facility(id=load_id * 2 + 1, name=f"Delivery {load_id}", address='',
+                            lat=lat + 1.4, lng=lng, geofence_radius=0.5)
+        loads[load_id] = Load(id=load_id, reference_number=f"BENCH-{load_id}", status='scheduled',
+                              pickup_facility=pickup, delivery_facility=delivery)
+    return loads
+
+
+def build_pings(loads, count, rng):
+    """Pings moving each load from its pickup fence to its delivery fence"""
+    start = datetime(2025, 5, 1)
+    per_load = max(count // len(loads), 4)
+    pings = []
+    for load_id, load in loads.items():
+        pickup, delivery = load.pickup_facility, load.delivery_facility
+        for step in range(per_load):
+            progress = step / (per_load - 1)
+            pings.append({
+                'load_id': load_id,
+                'lat': pickup.lat + (delivery.lat - pickup.lat) * progress + rng.uniform(-0.001, 0.001),
+                'lng': pickup.lng + rng.uniform(-0.001, 0.001),
+                'timestamp': start + timedelta(minutes=step)
+            })
+    rng.shuffle(pings)
+    return pings
+
+
+def snapshot(loads):
+    return {load_id: tuple(getattr(load, field) is not None if field != 'status' else load.status
+                           for field in LOAD_FIELDS)
+            for load_id, load in loads.items()}
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loads', type=int, default=500)
+    parser.add_argument('--pings', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with app.app_context():
+        rng = random.Random(args.seed)
+        scalar_loads = build_loads(args.loads, rng)
+        pings = build_pings(scalar_loads, args.pings, rng)
+        batch_loads = build_loads(args.loads, random.Random(args.seed))
+        print(f"{len(pings)} pings over {args.loads} loads\n")
+
+        lats = [ping['lat'] for ping in pings]
+        lngs = [ping['lng'] for ping in pings]
+        fence_lats = [scalar_loads[ping['load_id']].pickup_facility.lat for ping in pings]
+        fence_lngs = [scalar_loads[ping['load_id']].pickup_facility.lng for ping in pings]
+
+        _, scalar_distance = timed("Distances, scalar calculate_distance", lambda: [
+            calculate_distance(*values) for values in zip(lats, lngs, fence_lats, fence_lngs)
+        ])
+        _, vector_distance = timed("Distances, vectorized haversine_miles",
+                                   lambda: haversine_miles(lats, lngs, fence_lats, fence_lngs))
+
+        # The scalar path sees pings in arrival order per load, as /geofencing/check would
+        ordered = sorted(pings, key=lambda ping: (ping['load_id'], ping['timestamp']))
+        _, scalar_check = timed("Geofence checks, check_geofence_entry", lambda: [
+            check_geofence_entry(scalar_loads[ping['load_id']], ping['lat'], ping['lng']) for ping in ordered
+        ])
+        events, batch_check = timed("Geofence checks, evaluate_geofence_pings",
+                                    lambda: evaluate_geofence_pings(batch_loads, pings))
+
+        print(f"\nDistance speedup: {scalar_distance / vector_distance:.1f}x")
+        print(f"Check speedup:    {scalar_check / batch_check:.1f}x")
+        print(f"Status changes:   {len(events)}")
+
+        if snapshot(scalar_loads) != snapshot(batch_loads):
+            print("MISMATCH: scalar and batch paths left loads in different states")
+            return 1
+        print("Scalar and batch paths agree on every load's final state")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
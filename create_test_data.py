@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db
 from models import Driver, Vehicle, Client, Facility, Load, LocationUpdate, DriverPerformance
+from services.rollups import rebuild_rollups
 
 def create_test_data():
     with app.app_context():
@@ -227,53 +228,9 @@ def create_test_data():
         
         db.session.commit()
         
-        # Create driver performance records
-        print("Creating driver performance records...")
-        for driver in drivers:
-            driver_loads = [load for load in loads if load.driver_id == driver.id]
-            
-            # Group loads by date
-            performance_by_date = {}
-            for load in driver_loads:
-                date = load.scheduled_pickup_time.date()
-                if date not in performance_by_date:
-                    performance_by_date[date] = {
-                        'loads_completed': 0,
-                        'on_time_pickups': 0,
-                        'on_time_deliveries': 0,
-                        'total_delay_minutes': 0
-                    }
-                
-                perf = performance_by_date[date]
-                perf['loads_completed'] += 1
-                
-                if load.pickup_on_time():
-                    perf['on_time_pickups'] += 1
-                else:
-                    delay = (load.actual_pickup_arrival - load.scheduled_pickup_time).total_seconds() / 60
-                    perf['total_delay_minutes'] += max(0, delay)
-                
-                if load.delivery_on_time():
-                    perf['on_time_deliveries'] += 1
-                else:
-                    delay = (load.actual_delivery_arrival - load.scheduled_delivery_time).total_seconds() / 60
-                    perf['total_delay_minutes'] += max(0, delay)
-            
-            # Create performance records
-            for date, perf in performance_by_date.items():
-                avg_delay = perf['total_delay_minutes'] / perf['loads_completed'] if perf['loads_completed'] > 0 else 0
-                
-                driver_perf = DriverPerformance(
-                    driver_id=driver.id,
-                    date=date,
-                    loads_completed=perf['loads_completed'],
-                    on_time_pickups=perf['on_time_pickups'],
-                    on_time_deliveries=perf['on_time_deliveries'],
-                    average_delay_minutes=avg_delay
-                )
-                db.session.add(driver_perf)
-        
-        db.session.commit()
+        # Rebuild the daily rollups from the loads just created
+        print("Rebuilding driver performance rollups...")
+        rebuild_rollups()
         
         print(f"Successfully created:")
         print(f"- {len(drivers)} drivers")
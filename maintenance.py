@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Database maintenance commands for FreightPace
+
+Usage:
+    python maintenance.py schema
+    python maintenance.py indexes [--concurrently]
+    python maintenance.py rollups [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python maintenance.py partitions [--convert] [--months-ahead 2]
+    python maintenance.py retention [--downsample-after-days 30] [--bucket-minutes 15] [--drop-after-days 365]
+    python maintenance.py etas [--offline]     # every few minutes when MOTIVE_POLLER is off
+    python maintenance.py motive-poll
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def run_schema(args):
+    """Add missing columns and indexes to existing tables"""
+    from services.db_maintenance import add_missing_columns, create_missing_indexes
+
+    columns = add_missing_columns()
+    indexes = create_missing_indexes()
+    print(f"Added {len(columns)} columns and {len(indexes)} indexes")
+
+
+def run_indexes(args):
+    """Create the reporting indexes declared on the models that are missing"""
+    from services.db_maintenance import create_missing_indexes
+
+    indexes = create_missing_indexes(concurrently=args.concurrently)
+    for name in indexes:
+        print(f"Created index: {name}")
+    print(f"Created {len(indexes)} indexes")
+
+
+def run_rollups(args):
+    """Rebuild the driver performance rollups from the Load table"""
+    from services.rollups import rebuild_rollups
+
+    rows = rebuild_rollups(args.start, args.end)
+    print(f"Rebuilt {rows} driver performance rollup rows")
+
+
+def run_partitions(args):
+    """Create upcoming monthly LocationUpdate partitions (PostgreSQL)"""
+    from services.location_storage import convert_to_partitioned, ensure_partitions
+
+    if args.convert:
+        copied = convert_to_partitioned()
+        if copied is None:
+            print("location_update is already partitioned")
+        else:
+            print(f"Converted location_update to monthly partitions, copied {copied} rows")
+
+    for name in ensure_partitions(args.months_ahead):
+        print(f"Created partition: {name}")
+
+
+def run_retention(args):
+    """Downsample old LocationUpdate breadcrumbs and drop expired partitions"""
+    from services.location_storage import apply_retention
+
+    result = apply_retention(
+        downsample_after_days=args.downsample_after_days,
+        drop_after_days=args.drop_after_days,
+        bucket_minutes=args.bucket_minutes,
+        lookback_days=None if args.full else args.lookback_days
+    )
+    print(f"Downsampled {result['downsampled']} rows")
+    for name in result['dropped_partitions']:
+        print(f"Dropped partition: {name}")
+    print(f"Deleted {result['deleted']} expired rows")
+
+
+def run_etas(args):
+    """Re-estimate current_eta for every in-transit load (the Motive poller does this after each poll)"""
+    from services.eta_engine import refresh_current_etas
+
+    result = refresh_current_etas(use_google=not args.offline)
+    print(f"Updated {result['updated']} of {result['loads']} in-transit loads "
+          f"({result['local']} local, {result['google']} Google, {result['unchanged']} unchanged, "
+          f"{result['no_position']} without a position)")
+
+
+def run_motive_poll(args):
+    """Fetch vehicle locations from Motive once and apply them"""
+    from services.motive_poller import poll_with_lease
+
+    # Ignore the poll interval, but never run alongside a worker's poll in progress
+    result = poll_with_lease(only_if_due=False)
+    if result is None:
+        print("Skipped: another process is polling Motive right now")
+        return
+    print(f"Fetched {result['fetched']} vehicles: moved {result['vehicles_updated']}, "
+          f"{result['inserted']} breadcrumbs, {result['unchanged']} unchanged, "
+          f"{result['unknown_vehicles']} not in the vehicle table")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="FreightPace database maintenance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    schema_parser = subparsers.add_parser('schema', help=run_schema.__doc__)
+    schema_parser.set_defaults(func=run_schema)
+
+    indexes_parser = subparsers.add_parser('indexes', help=run_indexes.__doc__)
+    indexes_parser.add_argument('--concurrently', action='store_true',
+                                help="Build with CREATE INDEX CONCURRENTLY (PostgreSQL)")
+    indexes_parser.set_defaults(func=run_indexes)
+
+    rollups_parser = subparsers.add_parser('rollups', help=run_rollups.__doc__)
+    rollups_parser.add_argument('--start', type=parse_date, help="First day to rebuild (YYYY-MM-DD)")
+    rollups_parser.add_argument('--end', type=parse_date, help="Last day to rebuild (YYYY-MM-DD)")
+    rollups_parser.set_defaults(func=run_rollups)
+
+    partitions_parser = subparsers.add_parser('partitions', help=run_partitions.__doc__)
+    partitions_parser.add_argument('--convert', action='store_true',
+                                   help="Rebuild an unpartitioned location_update table as monthly partitions")
+    partitions_parser.add_argument('--months-ahead', type=int, default=2,
+                                   help="Months past the current one to create partitions for")
+    partitions_parser.set_defaults(func=run_partitions)
+
+    retention_parser = subparsers.add_parser('retention', help=run_retention.__doc__)
+    retention_parser.add_argument('--downsample-after-days', type=int, default=30,
+                                  help="Thin breadcrumbs older than this many days")
+    retention_parser.add_argument('--bucket-minutes', type=int, default=15,
+                                  help="Keep one breadcrumb per load per this many minutes")
+    retention_parser.add_argument('--drop-after-days', type=int, default=365,
+                                  help="Drop breadcrumbs older than this many days")
+    retention_parser.add_argument('--lookback-days', type=int, default=7,
+                                  help="Days before the downsample cutoff to re-scan on each run")
+    retention_parser.add_argument('--full', action='store_true',
+                                  help="Downsample everything before the cutoff, not just the lookback window")
+    retention_parser.set_defaults(func=run_retention)
+
+    etas_parser = subparsers.add_parser('etas', help=run_etas.__doc__)
+    etas_parser.add_argument('--offline', action='store_true',
+                             help="Use local estimates only, never call Google")
+    etas_parser.set_defaults(func=run_etas)
+
+    motive_poll_parser = subparsers.add_parser('motive-poll', help=run_motive_poll.__doc__)
+    motive_poll_parser.set_defaults(func=run_motive_poll)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    with app.app_context():
+        try:
+            args.func(args)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ {args.command} failed: {e}")
+            sys.exit(1)
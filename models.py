@@ -73,6 +73,12 @@ class Facility(db.Model):
     lat = db.Column(db.Float)
     lng = db.Column(db.Float)
     geofence_radius = db.Column(db.Float, default=0.2)  # in miles
+    # Optional polygon fence (encoded polyline of its vertices); takes precedence over the radius
+    geofence_polygon = db.Column(db.Text)
+    geofence_min_lat = db.Column(db.Float)
+    geofence_min_lng = db.Column(db.Float)
+    geofence_max_lat = db.Column(db.Float)
+    geofence_max_lng = db.Column(db.Float)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -81,6 +87,20 @@ class Facility(db.Model):
     deliveries = db.relationship('Load', foreign_keys='Load.delivery_facility_id', backref='delivery_facility', lazy=True)
 
 class Load(db.Model):
+    # Reporting indexes; existing databases pick these up with `python maintenance.py indexes`
+    __table_args__ = (
+        db.Index('ix_load_driver_scheduled_pickup', 'driver_id', 'scheduled_pickup_time'),
+        db.Index('ix_load_driver_scheduled_delivery', 'driver_id', 'scheduled_delivery_time'),
+        db.Index('ix_load_status_scheduled_delivery', 'status', 'scheduled_delivery_time'),
+        db.Index('ix_load_actual_pickup_arrival', 'actual_pickup_arrival'),
+        db.Index('ix_load_actual_delivery_arrival', 'actual_delivery_arrival'),
+        db.Index(
+            'ix_load_active_scheduled_delivery', 'scheduled_delivery_time',
+            postgresql_where=db.text("status IN ('scheduled', 'in_transit')"),
+            sqlite_where=db.text("status IN ('scheduled', 'in_transit')")
+        ),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     reference_number = db.Column(db.String(50), unique=True)
     ratecon_url = db.Column(db.String(200))
@@ -123,23 +143,63 @@ class Load(db.Model):
         return self.actual_delivery_arrival <= self.scheduled_delivery_time
 
 class LocationUpdate(db.Model):
+    """GPS breadcrumb; on PostgreSQL the table is range-partitioned by month (see services.location_storage)"""
+    __table_args__ = (
+        db.Index('ix_location_update_load_timestamp', 'load_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     load_id = db.Column(db.Integer, db.ForeignKey('load.id'), nullable=False)
     lat = db.Column(db.Float, nullable=False)
     lng = db.Column(db.Float, nullable=False)
     speed = db.Column(db.Float)  # mph
     heading = db.Column(db.Float)  # degrees
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class LoadTrack(db.Model):
+    """Simplified breadcrumb track of a delivered load, cached by services.tracks"""
+    __table_args__ = (
+        db.Index('ux_load_track_load_tolerance', 'load_id', 'tolerance_meters', 'max_points', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    load_id = db.Column(db.Integer, db.ForeignKey('load.id'), nullable=False)
+    tolerance_meters = db.Column(db.Float, nullable=False)
+    max_points = db.Column(db.Integer, nullable=False)
+    original_points = db.Column(db.Integer, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    started_at = db.Column(db.DateTime)
+    polyline = db.Column(db.Text, nullable=False)  # encoded polyline of the kept points
+    time_offsets = db.Column(db.Text, nullable=False)  # JSON list of seconds from started_at
+    speeds = db.Column(db.Text, nullable=False)  # JSON list of mph, null where unknown
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class DriverPerformance(db.Model):
+    """Per-driver daily rollup maintained by services.rollups"""
+    __table_args__ = (
+        db.Index('ux_driver_performance_driver_date', 'driver_id', 'date', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
+    
+    # Loads whose scheduled pickup falls on this date
     loads_completed = db.Column(db.Integer, default=0)
     on_time_pickups = db.Column(db.Integer, default=0)
     on_time_deliveries = db.Column(db.Integer, default=0)
+    on_time_loads = db.Column(db.Integer, default=0)  # both pickup and delivery on time
+    delay_minutes_total = db.Column(db.Float, default=0)  # sum of positive pickup and delivery delays
+    delay_count = db.Column(db.Integer, default=0)
     average_delay_minutes = db.Column(db.Float, default=0)
     
+    # Loads whose actual delivery arrival falls on this date
+    deliveries = db.Column(db.Integer, default=0)
+    deliveries_on_time = db.Column(db.Integer, default=0)
+    deliveries_on_time_pickup = db.Column(db.Integer, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
     @property
     def on_time_pickup_percentage(self):
         if self.loads_completed == 0:
@@ -167,6 +227,59 @@ class Notification(db.Model):
     load = db.relationship('Load', backref='notifications')
     driver = db.relationship('Driver', backref='notifications')
 
+class CacheGeneration(db.Model):
+    """Write counter shared by every worker; bumping it invalidates cached responses"""
+    name = db.Column(db.String(50), primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TelematicsSnapshot(db.Model):
+    """Latest payload fetched by a background poller, shared by every worker"""
+    name = db.Column(db.String(50), primary_key=True)
+    payload = db.Column(db.Text)
+    fetched_at = db.Column(db.DateTime)
+    # Lease taken by the worker whose poller is fetching; other workers skip that cycle
+    claimed_at = db.Column(db.DateTime)
+    # When the poll last sent low-confidence ETAs to Google, whichever worker ran it
+    google_refreshed_at = db.Column(db.DateTime)
+
+class AvailabilityBroadcast(db.Model):
+    """An availability email blast, rendered once and delivered by services.availability_mailer"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    text_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='queued')  # 'queued', 'sending', 'completed', 'failed'
+    total_recipients = db.Column(db.Integer, default=0)
+    sent_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    # Lease held by the one worker delivering the broadcast, so the send rate is not multiplied
+    claimed_by = db.Column(db.String(100))
+    claimed_until = db.Column(db.DateTime)
+
+    # Relationships
+    recipients = db.relationship('BroadcastRecipient', backref='broadcast', lazy='dynamic')
+
+class BroadcastRecipient(db.Model):
+    """Delivery status of one broadcast to one recipient"""
+    __table_args__ = (
+        db.Index('ix_broadcast_recipient_broadcast_status', 'broadcast_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('availability_broadcast.id'), nullable=False)
+    email = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(120))
+    company = db.Column(db.String(120))
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+    claimed_at = db.Column(db.DateTime)  # When a worker marked the row 'sending'
+
 class Milestone(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
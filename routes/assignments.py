@@ -1,6 +1,6 @@
 from flask import Blueprint, request, render_template, redirect, flash
 from services.loads_service import get_unassigned_loads, assign_driver_to_load
-from services.motive_api import get_active_driver_locations
+from services.motive_poller import latest_driver_locations
 from services.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -17,10 +17,10 @@ def assign():
 
     unassigned = get_unassigned_loads()
     
-    # Try to get drivers from Motive API with fallback
+    # Drivers from the last Motive poll, with fallback
     try:
-        drivers = get_active_driver_locations()
-        logger.info(f"Retrieved {len(drivers)} drivers from Motive API")
+        drivers = latest_driver_locations()
+        logger.info(f"Retrieved {len(drivers)} drivers from the Motive location snapshot")
     except Exception as e:
         logger.warning(f"Failed to fetch drivers from Motive API: {e}")
         # Fallback to sample drivers for demo purposes
@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from datetime import datetime, timedelta
-from models import db, Driver, Load, Client, Facility
+from sqlalchemy import func
+from email_validator import validate_email, EmailNotValidError
+from models import db, Driver, Load, Client, Facility, AvailabilityBroadcast, BroadcastRecipient
 from services.notification_service import send_notification
+from services.fleet_availability import build_fleet_status, find_nearby_trucks
+from services.availability_mailer import queue_broadcast
+from services.email_delivery import RECIPIENT_NAME
 import logging
 import smtplib
 from email.mime.text import MIMEText
@@ -22,150 +27,77 @@ def index():
 def get_fleet_status():
     """API endpoint to get current fleet availability status for email blast"""
     try:
-        # Get all active drivers and their current status
-        drivers = db.session.query(Driver).filter_by(status='active').all()
-        
-        available_trucks = []
-        upcoming_availability = []
-        
-        for driver in drivers:
-            # Get the most recent load for this driver
-            latest_load = db.session.query(Load).filter(
-                Load.driver_id == driver.id
-            ).order_by(Load.scheduled_delivery_time.desc()).first()
-            
-            # Get delivery facility if it exists
-            delivery_facility = None
-            if latest_load and latest_load.delivery_facility_id:
-                delivery_facility = db.session.query(Facility).get(latest_load.delivery_facility_id)
-            
-            if not latest_load:
-                # Driver has no loads - available immediately
-                available_trucks.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': "Available for dispatch",
-                    'available_date': datetime.now().strftime('%m/%d/%Y'),
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available Now'
-                })
-            elif latest_load.status == 'delivered':
-                # Recently delivered - available now
-                location = "Location TBD"
-                if delivery_facility:
-                    location = f"{delivery_facility.city}, {delivery_facility.state}"
-                
-                available_trucks.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': location,
-                    'available_date': datetime.now().strftime('%m/%d/%Y'),
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available Now'
-                })
-            elif latest_load.status == 'in_transit' and latest_load.scheduled_delivery_time:
-                # In transit - will be available after delivery
-                location = "En route"
-                if delivery_facility:
-                    location = f"Delivering to {delivery_facility.city}, {delivery_facility.state}"
-                
-                upcoming_availability.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': location,
-                    'available_date': latest_load.scheduled_delivery_time.strftime('%m/%d/%Y'),
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available Soon'
-                })
-        
-        return jsonify({
-            'available_now': available_trucks,
-            'upcoming_availability': upcoming_availability,
-            'total_available': len(available_trucks),
-            'total_upcoming': len(upcoming_availability),
-            'report_date': datetime.now().strftime('%B %d, %Y')
-        })
+        return jsonify(build_fleet_status())
         
     except Exception as e:
         logger.error(f"Error getting fleet status: {e}")
         return jsonify({'error': 'Failed to load fleet status'}), 500
 
+def _email_contact_info(data):
+    """Contact information from the request, use "x" for empty fields"""
+    return {
+        'email': data.get('contact_email', '').strip() or 'x',
+        'phone': data.get('contact_phone', '').strip() or 'x',
+        'name': data.get('contact_name', '').strip() or 'x',
+        'hours': data.get('availability_hours', '').strip() or 'x'
+    }
+
+def _email_fleet_data():
+    """Current fleet status in the format used by the availability emails"""
+    return build_fleet_status(
+        upcoming_date_format='%m/%d/%Y at %I:%M %p',  # Include both date and time for upcoming availability
+        upcoming_status='Available after delivery'
+    )
+
+@availability_bp.route('/availability/nearby')
+def nearby_trucks():
+    """
+    API endpoint for trucks available now or soon near a pickup
+    
+    Query params: lat/lng or facility_id for the pickup, radius (miles, default 150),
+    within_hours (default 24) and limit (default 25).
+    """
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    facility_id = request.args.get('facility_id', type=int)
+    
+    if facility_id:
+        facility = Facility.query.get_or_404(facility_id)
+        lat, lng = facility.lat, facility.lng
+    
+    if lat is None or lng is None:
+        return jsonify({'error': 'Pickup lat/lng or a geocoded facility_id is required'}), 400
+    
+    radius = request.args.get('radius', 150, type=float)
+    within_hours = request.args.get('within_hours', 24, type=float)
+    limit = request.args.get('limit', 25, type=int)
+    
+    try:
+        trucks = find_nearby_trucks(lat, lng, radius, within_hours, limit)
+    except Exception as e:
+        logger.error(f"Error finding nearby trucks: {e}")
+        return jsonify({'error': 'Failed to search nearby trucks'}), 500
+    
+    return jsonify({
+        'pickup': {'lat': lat, 'lng': lng},
+        'radius_miles': radius,
+        'trucks': [{
+            **truck,
+            'available_at': truck['available_at'].isoformat(),
+            'ready_at': truck['ready_at'].isoformat()
+        } for truck in trucks]
+    })
+
 @availability_bp.route('/availability/generate-email-template', methods=['POST'])
 def generate_email_template():
     """Generate HTML email template for manual sending"""
     try:
         data = request.get_json()
         subject = data.get('subject', 'Weekly Fleet Availability Update')
-        
-        # Get contact information from the request, use "x" for empty fields
-        contact_info = {
-            'email': data.get('contact_email', '').strip() or 'x',
-            'phone': data.get('contact_phone', '').strip() or 'x',
-            'name': data.get('contact_name', '').strip() or 'x',
-            'hours': data.get('availability_hours', '').strip() or 'x'
-        }
+        contact_info = _email_contact_info(data)
         
         # Get current fleet status
-        drivers = db.session.query(Driver).filter_by(status='active').all()
-        
-        available_trucks = []
-        upcoming_availability = []
-        
-        for driver in drivers:
-            latest_load = db.session.query(Load).filter(
-                Load.driver_id == driver.id
-            ).order_by(Load.scheduled_delivery_time.desc()).first()
-            
-            delivery_facility = None
-            if latest_load and latest_load.delivery_facility_id:
-                delivery_facility = db.session.query(Facility).get(latest_load.delivery_facility_id)
-            
-            if not latest_load:
-                available_trucks.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': "Available for dispatch",
-                    'available_date': datetime.now().strftime('%m/%d/%Y'),
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available Now'
-                })
-            elif latest_load.status == 'delivered':
-                location = "Location TBD"
-                if delivery_facility:
-                    location = f"{delivery_facility.city}, {delivery_facility.state}"
-                
-                available_trucks.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': location,
-                    'available_date': datetime.now().strftime('%m/%d/%Y'),
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available Now'
-                })
-            elif latest_load.status == 'in_transit' and latest_load.scheduled_delivery_time:
-                location = "En route"
-                if delivery_facility:
-                    location = f"Delivering to {delivery_facility.city}, {delivery_facility.state}"
-                
-                # Include both date and time for upcoming availability
-                delivery_datetime = latest_load.scheduled_delivery_time.strftime('%m/%d/%Y at %I:%M %p')
-                
-                upcoming_availability.append({
-                    'driver_name': driver.name,
-                    'truck_info': f"Driver: {driver.name}",
-                    'current_location': location,
-                    'available_date': delivery_datetime,
-                    'contact_info': driver.phone or "Contact dispatch",
-                    'status': 'Available after delivery'
-                })
-        
-        fleet_data = {
-            'available_now': available_trucks,
-            'upcoming_availability': upcoming_availability,
-            'total_available': len(available_trucks),
-            'total_upcoming': len(upcoming_availability),
-            'report_date': datetime.now().strftime('%B %d, %Y')
-        }
+        fleet_data = _email_fleet_data()
         
         # Generate HTML email content with contact info
         html_content = generate_availability_email_html(fleet_data, contact_info)
@@ -187,7 +119,99 @@ def generate_email_template():
         logger.error(f"Error sending email blast: {e}")
         return jsonify({'error': 'Failed to generate email blast'}), 500
 
-def generate_availability_email_html(fleet_data, contact_info=None):
+@availability_bp.route('/availability/send-email-blast', methods=['POST'])
+def send_email_blast():
+    """Render the availability report once and queue it for background delivery to every recipient"""
+    try:
+        data = request.get_json() or {}
+        subject = data.get('subject', 'Weekly Fleet Availability Update')
+        contact_info = _email_contact_info(data)
+        
+        # Recipients may be plain addresses or {email, name, company} objects
+        recipients = []
+        invalid = []
+        seen = set()
+        for entry in data.get('recipients', []):
+            recipient = {'email': entry} if isinstance(entry, str) else dict(entry)
+            try:
+                email = validate_email(str(recipient.get('email', '')).strip(), check_deliverability=False).normalized
+            except EmailNotValidError:
+                invalid.append(recipient.get('email'))
+                continue
+            if email.lower() in seen:
+                continue
+            seen.add(email.lower())
+            recipients.append({'email': email, 'name': recipient.get('name'), 'company': recipient.get('company')})
+        
+        if not recipients:
+            return jsonify({'error': 'No valid recipients', 'invalid': invalid}), 400
+        
+        fleet_data = _email_fleet_data()
+        greeting = f"Hello {RECIPIENT_NAME},"
+        html_content = generate_availability_email_html(fleet_data, contact_info, greeting=greeting)
+        plain_text = generate_plain_text_email(fleet_data, contact_info, greeting=greeting)
+        
+        broadcast = queue_broadcast(subject, html_content, plain_text, recipients)
+        
+        return jsonify({
+            'success': True,
+            'broadcast_id': broadcast.id,
+            'queued': len(recipients),
+            'invalid': invalid,
+            'message': f'Availability email queued for {len(recipients)} recipients'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error queueing email blast: {e}")
+        return jsonify({'error': 'Failed to queue email blast'}), 500
+
+def _broadcast_summary(broadcast):
+    return {
+        'id': broadcast.id,
+        'subject': broadcast.subject,
+        'status': broadcast.status,
+        'total_recipients': broadcast.total_recipients,
+        'sent_count': broadcast.sent_count,
+        'failed_count': broadcast.failed_count,
+        'created_at': broadcast.created_at.isoformat() if broadcast.created_at else None,
+        'completed_at': broadcast.completed_at.isoformat() if broadcast.completed_at else None
+    }
+
+@availability_bp.route('/availability/broadcasts/<int:broadcast_id>')
+def broadcast_status(broadcast_id):
+    """Delivery progress of a broadcast with per-recipient status"""
+    broadcast = AvailabilityBroadcast.query.get_or_404(broadcast_id)
+    
+    status_counts = dict(db.session.query(
+        BroadcastRecipient.status, func.count(BroadcastRecipient.id)
+    ).filter(BroadcastRecipient.broadcast_id == broadcast.id).group_by(BroadcastRecipient.status).all())
+    
+    recipients_query = broadcast.recipients.order_by(BroadcastRecipient.id)
+    status_filter = request.args.get('status')
+    if status_filter:
+        recipients_query = recipients_query.filter(BroadcastRecipient.status == status_filter)
+    recipients_page = recipients_query.paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 100, type=int)
+    )
+    
+    return jsonify({
+        **_broadcast_summary(broadcast),
+        'status_counts': status_counts,
+        'recipients': [{
+            'email': recipient.email,
+            'name': recipient.name,
+            'status': recipient.status,
+            'attempts': recipient.attempts,
+            'error': recipient.error,
+            'sent_at': recipient.sent_at.isoformat() if recipient.sent_at else None
+        } for recipient in recipients_page.items],
+        'page': recipients_page.page,
+        'pages': recipients_page.pages
+    })
+
+def generate_availability_email_html(fleet_data, contact_info=None, greeting=None):
     """Generate professional HTML email content for availability report"""
     if contact_info is None:
         contact_info = {
@@ -229,7 +253,7 @@ def generate_availability_email_html(fleet_data, contact_info=None):
                 <h1>Hitched Logistics LLC</h1>
                 <p>Weekly Fleet Availability Report - {current_date}</p>
             </div>
-            
+            {f'<p>{greeting}</p>' if greeting else ''}
             <div class="section">
                 <h2>🚛 Available Now ({fleet_data.get('total_available', 0)} Trucks)</h2>
                 <table class="truck-table">
@@ -309,7 +333,7 @@ def generate_availability_email_html(fleet_data, contact_info=None):
     
     return html
 
-def generate_plain_text_email(fleet_data, contact_info=None):
+def generate_plain_text_email(fleet_data, contact_info=None, greeting=None):
     """Generate plain text email for copy/paste"""
     if contact_info is None:
         contact_info = {
@@ -324,7 +348,7 @@ def generate_plain_text_email(fleet_data, contact_info=None):
     text = f"""HITCHED LOGISTICS LLC
 Weekly Fleet Availability Report - {current_date}
 
-🚛 AVAILABLE NOW ({fleet_data.get('total_available', 0)} TRUCKS)
+{greeting + chr(10) + chr(10) if greeting else ''}🚛 AVAILABLE NOW ({fleet_data.get('total_available', 0)} TRUCKS)
 {"=" * 50}
 """
     
@@ -396,12 +420,13 @@ def get_message_templates():
 def broadcast_history():
     """Get history of availability broadcasts"""
     try:
-        # For now, return recent notifications related to availability
-        # In a full implementation, you'd have a dedicated broadcast history table
+        broadcasts = AvailabilityBroadcast.query.order_by(AvailabilityBroadcast.created_at.desc()).limit(
+            request.args.get('limit', 20, type=int)
+        ).all()
         
         return jsonify({
-            'broadcasts': [],
-            'total_count': 0
+            'broadcasts': [_broadcast_summary(broadcast) for broadcast in broadcasts],
+            'total_count': AvailabilityBroadcast.query.count()
         })
         
     except Exception as e:
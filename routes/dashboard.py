@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, Response, stream_with_context, current_app
 from datetime import datetime, timedelta
-from sqlalchemy import func, case
-from sqlalchemy.sql import or_
+from sqlalchemy import func, case, and_, or_
+from sqlalchemy.orm import contains_eager, joinedload
 from models import Load, Driver, DriverPerformance, Notification
 from app import db
+from services.dashboard_summary import compute_dashboard_summary
+from services.response_cache import cached_response, response_cache, current_generation
+from services.live_updates import stream_events, hub as live_updates_hub
+from services.eta_cache import eta_cache
+from services.rollups import day_of
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -12,6 +17,7 @@ def index():
     return render_template('dashboard.html')
 
 @dashboard_bp.route('/api/dashboard/summary')
+@cached_response()
 def dashboard_summary():
     """API endpoint for dashboard summary data"""
     from flask import request
@@ -38,226 +44,72 @@ def dashboard_summary():
         date_end = datetime.utcnow().date()
         date_start = date_end - timedelta(days=days)
     
-    # Build base query
-    base_query = Load.query
-    if driver_id:
-        base_query = base_query.filter(Load.driver_id == driver_id)
-    
-    # Get loads counts for all status types
-    active_loads = base_query.filter(Load.status.in_(['scheduled', 'in_transit'])).count()
-    all_loads = base_query.count()
-    delivered_loads = base_query.filter(Load.status == 'delivered').count()
-    scheduled_loads = base_query.filter(Load.status == 'scheduled').count()
-    
-    # Get on-time statistics for the date range
-    on_time_pickups = base_query.filter(
-        func.date(Load.actual_pickup_arrival) >= date_start,
-        func.date(Load.actual_pickup_arrival) <= date_end,
-        Load.actual_pickup_arrival <= Load.scheduled_pickup_time
-    ).count()
-    
-    on_time_deliveries = base_query.filter(
-        func.date(Load.actual_delivery_arrival) >= date_start,
-        func.date(Load.actual_delivery_arrival) <= date_end,
-        Load.actual_delivery_arrival <= Load.scheduled_delivery_time
-    ).count()
-    
-    total_pickups = base_query.filter(
-        func.date(Load.actual_pickup_arrival) >= date_start,
-        func.date(Load.actual_pickup_arrival) <= date_end
-    ).count()
-    
-    total_deliveries = base_query.filter(
-        func.date(Load.actual_delivery_arrival) >= date_start,
-        func.date(Load.actual_delivery_arrival) <= date_end
-    ).count()
-    
-    # Calculate overall on-time (both pickup AND delivery on time)
-    overall_on_time = base_query.filter(
-        func.date(Load.actual_pickup_arrival) >= date_start,
-        func.date(Load.actual_pickup_arrival) <= date_end,
-        func.date(Load.actual_delivery_arrival) >= date_start,
-        func.date(Load.actual_delivery_arrival) <= date_end,
-        Load.actual_pickup_arrival <= Load.scheduled_pickup_time,
-        Load.actual_delivery_arrival <= Load.scheduled_delivery_time
-    ).count()
-    
-    # Get total completed loads (both pickup and delivery completed)
-    total_completed = base_query.filter(
-        func.date(Load.actual_pickup_arrival) >= date_start,
-        func.date(Load.actual_pickup_arrival) <= date_end,
-        func.date(Load.actual_delivery_arrival) >= date_start,
-        func.date(Load.actual_delivery_arrival) <= date_end
-    ).count()
-    
-    # Calculate percentages
-    pickup_percentage = (on_time_pickups / total_pickups * 100) if total_pickups > 0 else 0
-    delivery_percentage = (on_time_deliveries / total_deliveries * 100) if total_deliveries > 0 else 0
-    overall_percentage = (overall_on_time / total_completed * 100) if total_completed > 0 else 0
-    
-    # Get drivers with the best on-time performance using Load data directly
-    if driver_id:
-        # For individual driver view, get the specific driver's info
-        selected_driver = Driver.query.get(driver_id)
-        top_drivers = []
-        if selected_driver:
-            driver_loads = base_query.filter(
-                func.date(Load.actual_delivery_arrival) >= date_start,
-                func.date(Load.actual_delivery_arrival) <= date_end
-            ).count()
-            driver_on_time = base_query.filter(
-                func.date(Load.actual_delivery_arrival) >= date_start,
-                func.date(Load.actual_delivery_arrival) <= date_end,
-                Load.actual_delivery_arrival <= Load.scheduled_delivery_time
-            ).count()
-            on_time_pct = (driver_on_time / driver_loads * 100) if driver_loads > 0 else 0
-            top_drivers = [{'id': selected_driver.id, 'name': selected_driver.name, 'on_time_percentage': on_time_pct}]
-    else:
-        # For company view, get top performing drivers
-        subquery = db.session.query(
-            Load.driver_id,
-            func.count(Load.id).label('total_loads'),
-            func.sum(
-                case(
-                    (Load.actual_delivery_arrival <= Load.scheduled_delivery_time, 1),
-                    else_=0
-                )
-            ).label('on_time_loads')
-        ).filter(
-            func.date(Load.actual_delivery_arrival) >= date_start,
-            func.date(Load.actual_delivery_arrival) <= date_end,
-            Load.driver_id.isnot(None)
-        ).group_by(Load.driver_id).subquery()
-        
-        top_drivers_query = db.session.query(
-            Driver.id,
-            Driver.name,
-            (subquery.c.on_time_loads * 100.0 / subquery.c.total_loads).label('on_time_percentage')
-        ).join(subquery, Driver.id == subquery.c.driver_id).filter(
-            subquery.c.total_loads >= 3  # Only drivers with at least 3 loads
-        ).order_by((subquery.c.on_time_loads * 100.0 / subquery.c.total_loads).desc()).limit(5).all()
-        
-        top_drivers = [{'id': d.id, 'name': d.name, 'on_time_percentage': round(d.on_time_percentage, 1)} for d in top_drivers_query]
-    
-    # Get recent notifications
-    recent_notifications = Notification.query.filter(
-        Notification.read == False
-    ).order_by(Notification.created_at.desc()).limit(5).all()
-    
-    # Calculate late shipments for all three types
-    late_deliveries = total_deliveries - on_time_deliveries
-    late_pickups = total_pickups - on_time_pickups
-    # Overall late shipments: loads where either pickup OR delivery was late
-    late_overall = base_query.filter(
-        func.date(Load.actual_pickup_arrival) >= date_start,
-        func.date(Load.actual_pickup_arrival) <= date_end,
-        func.date(Load.actual_delivery_arrival) >= date_start,
-        func.date(Load.actual_delivery_arrival) <= date_end,
-        or_(
-            Load.actual_pickup_arrival > Load.scheduled_pickup_time,
-            Load.actual_delivery_arrival > Load.scheduled_delivery_time
-        )
-    ).count()
-    
-    # Get total driver count for company view
-    total_drivers = Driver.query.filter_by(status='active').count()
-    
-    # Format the data for the response
-    summary_data = {
-        'active_loads': active_loads,
-        'total_deliveries': total_deliveries,
-        'late_deliveries': late_deliveries,
-        'total_drivers': total_drivers,
-        'on_time': {
-            'pickup_percentage': round(pickup_percentage, 1),
-            'delivery_percentage': round(delivery_percentage, 1),
-            'overall_percentage': round(overall_percentage, 1)
-        },
-        'late_shipments': {
-            'delivery_count': late_deliveries,
-            'pickup_count': late_pickups,
-            'overall_count': late_overall
-        },
-        'loads_count': {
-            'active_count': active_loads,
-            'all_count': all_loads,
-            'delivered_count': delivered_loads,
-            'scheduled_count': scheduled_loads
-        },
-        'top_drivers': top_drivers,
-        'notifications': [
-            {
-                'id': notification.id,
-                'message': notification.message,
-                'type': notification.type,
-                'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M')
-            } for notification in recent_notifications
-        ]
-    }
+    summary_data = compute_dashboard_summary(date_start, date_end, driver_id)
     
     return jsonify(summary_data)
 
-@dashboard_bp.route('/api/dashboard/at_risk_loads')
-def at_risk_loads():
-    """API endpoint for loads at risk of being late"""
-    from datetime import datetime, timedelta
-    from flask import request
-    
-    # Get current time
-    current_time = datetime.utcnow()
-    
-    # Check if filtering by specific driver
-    driver_id = request.args.get('driver_id', type=int)
+def at_risk_loads_query(current_time, driver_id=None, limit=10):
+    """
+    Active loads at risk of being late, classified and ordered by urgency in SQL
+    
+    A load is at risk when, relative to current_time:
+      - it is still scheduled and pickup is overdue or due within 1 hour (pickup risk)
+      - delivery is overdue
+      - it is still scheduled and delivery is due within 2 hours
+      - it is in transit and delivery is due within 4 hours
+    
+    Args:
+        current_time (datetime): Reference time for the classification
+        driver_id (int, optional): Restrict to one driver's loads
+        limit (int): Maximum number of loads to return
+    
+    Returns:
+        Query: (Load, risk_type, minutes_until) rows with driver and facilities eager loaded
+    """
+    pickup_risk = and_(
+        Load.status == 'scheduled',
+        Load.scheduled_pickup_time < current_time + timedelta(hours=1)
+    )
+    delivery_risk = or_(
+        Load.scheduled_delivery_time < current_time,
+        and_(Load.status == 'scheduled', Load.scheduled_delivery_time < current_time + timedelta(hours=2)),
+        and_(Load.status == 'in_transit', Load.scheduled_delivery_time < current_time + timedelta(hours=4))
+    )
     
-    # Build base query
-    query = Load.query.filter(
+    risk_type = case((pickup_risk, 'pickup'), else_='delivery')
+    risk_deadline = case((pickup_risk, Load.scheduled_pickup_time), else_=Load.scheduled_delivery_time)
+    minutes_until = func.extract('epoch', risk_deadline - current_time) / 60
+    
+    query = db.session.query(
+        Load,
+        risk_type.label('risk_type'),
+        minutes_until.label('minutes_until')
+    ).join(Driver, Load.driver_id == Driver.id, isouter=True).options(
+        contains_eager(Load.driver),
+        joinedload(Load.pickup_facility),
+        joinedload(Load.delivery_facility)
+    ).filter(
         Load.status.in_(['scheduled', 'in_transit']),
         Load.actual_delivery_arrival == None,
-        Load.scheduled_delivery_time <= current_time + timedelta(hours=24)  # Due within 24 hours
-    ).join(Driver, Load.driver_id == Driver.id, isouter=True)
+        Load.scheduled_delivery_time <= current_time + timedelta(hours=24),  # Due within 24 hours
+        or_(pickup_risk, delivery_risk)
+    )
     
     # Apply driver filter if specified
     if driver_id:
         query = query.filter(Load.driver_id == driver_id)
     
-    at_risk_loads = query.all()
-    
-    # Filter for loads that are actually at risk (overdue or close to being overdue)
-    filtered_loads = []
-    for load in at_risk_loads:
-        time_until_pickup = (load.scheduled_pickup_time - current_time).total_seconds() / 3600  # hours
-        time_until_delivery = (load.scheduled_delivery_time - current_time).total_seconds() / 3600  # hours
-        
-        risk_info = None
-        
-        # Check pickup risk first
-        if load.status == 'scheduled' and time_until_pickup < 0:
-            # Pickup is overdue
-            risk_info = {'type': 'pickup', 'delay_hours': abs(time_until_pickup)}
-        elif load.status == 'scheduled' and time_until_pickup < 1:
-            # Pickup is at risk (due within 1 hour)
-            risk_info = {'type': 'pickup', 'delay_hours': time_until_pickup}
-        # Check delivery risk
-        elif time_until_delivery < 0:
-            # Delivery is overdue
-            risk_info = {'type': 'delivery', 'delay_hours': abs(time_until_delivery)}
-        elif time_until_delivery < 2 and load.status == 'scheduled':
-            # Delivery at risk and not even picked up
-            risk_info = {'type': 'delivery', 'delay_hours': time_until_delivery}
-        elif time_until_delivery < 4 and load.status == 'in_transit':
-            # Delivery at risk while in transit
-            risk_info = {'type': 'delivery', 'delay_hours': time_until_delivery}
-        
-        if risk_info:
-            load.risk_info = risk_info
-            filtered_loads.append(load)
+    # Most overdue first
+    return query.order_by(risk_deadline, Load.id).limit(limit)
+
+def build_at_risk_loads(driver_id=None, current_time=None):
+    """Format the most urgent at-risk loads for the dashboard"""
+    current_time = current_time or datetime.utcnow()
     
-    # Format the data for the response
     loads_data = []
-    for load in filtered_loads[:10]:  # Limit to 10 most urgent
-        risk_info = load.risk_info
-        delay_minutes = int(risk_info['delay_hours'] * 60)
-        abs_minutes = abs(delay_minutes)
+    for load, risk_type, minutes_until in at_risk_loads_query(current_time, driver_id).all():
+        # Overdue milestones (negative minutes_until) report how late they are, at-risk ones how long is left
+        abs_minutes = int(abs(minutes_until))
         
         # Format time display
         if abs_minutes >= 60:
@@ -271,9 +123,9 @@ def at_risk_loads():
             time_str = f"{abs_minutes}m"
         
         # Create specific risk labels
-        milestone_type = risk_info['type'].title()  # "Pickup" or "Delivery"
+        milestone_type = risk_type.title()  # "Pickup" or "Delivery"
         
-        if delay_minutes < 0:
+        if minutes_until < 0:
             risk_label = f"{milestone_type} Delayed {time_str}"
             risk_class = "danger"
         else:
@@ -296,9 +148,20 @@ def at_risk_loads():
             'delay_minutes': abs_minutes
         })
     
-    return jsonify(loads_data)
+    return loads_data
+
+@dashboard_bp.route('/api/dashboard/at_risk_loads')
+def at_risk_loads():
+    """API endpoint for loads at risk of being late"""
+    from flask import request
+    
+    # Check if filtering by specific driver
+    driver_id = request.args.get('driver_id', type=int)
+    
+    return jsonify(build_at_risk_loads(driver_id))
 
 @dashboard_bp.route('/api/dashboard/performance_trends')
+@cached_response()
 def performance_trends():
     """API endpoint for performance trend data over the past 30 days"""
     from flask import request
@@ -310,34 +173,31 @@ def performance_trends():
     # Check if filtering by specific driver
     driver_id = request.args.get('driver_id', type=int)
     
-    # Build base query using Load data directly
-    query = Load.query.filter(
-        Load.actual_delivery_arrival.isnot(None),
-        func.date(Load.actual_delivery_arrival) >= thirty_days_ago,
-        func.date(Load.actual_delivery_arrival) <= today
-    )
-    
-    # Apply driver filter if specified
     if driver_id:
-        query = query.filter(Load.driver_id == driver_id)
-    
-    # Get daily aggregated data from Load records
-    daily_data = query.with_entities(
-        func.date(Load.actual_delivery_arrival).label('date'),
-        func.count(Load.id).label('total_loads'),
-        func.sum(
-            case(
-                (Load.actual_pickup_arrival <= Load.scheduled_pickup_time, 1),
-                else_=0
-            )
-        ).label('on_time_pickups'),
-        func.sum(
-            case(
-                (Load.actual_delivery_arrival <= Load.scheduled_delivery_time, 1),
-                else_=0
-            )
-        ).label('on_time_deliveries')
-    ).group_by(func.date(Load.actual_delivery_arrival)).order_by(func.date(Load.actual_delivery_arrival)).all()
+        # A single driver's daily delivery counters come from the per-driver rollups
+        daily_data = db.session.query(
+            DriverPerformance.date.label('date'),
+            func.sum(DriverPerformance.deliveries).label('total_loads'),
+            func.sum(DriverPerformance.deliveries_on_time_pickup).label('on_time_pickups'),
+            func.sum(DriverPerformance.deliveries_on_time).label('on_time_deliveries')
+        ).filter(
+            DriverPerformance.driver_id == driver_id,
+            DriverPerformance.deliveries > 0,
+            DriverPerformance.date >= thirty_days_ago,
+            DriverPerformance.date <= today
+        ).group_by(DriverPerformance.date).order_by(DriverPerformance.date).all()
+    else:
+        # The fleet-wide trend reads Load directly, so loads without a driver still count
+        delivered_day = day_of(Load.actual_delivery_arrival)
+        daily_data = db.session.query(
+            delivered_day.label('date'),
+            func.count(Load.id).label('total_loads'),
+            func.count(case((Load.actual_pickup_arrival <= Load.scheduled_pickup_time, 1))).label('on_time_pickups'),
+            func.count(case((Load.actual_delivery_arrival <= Load.scheduled_delivery_time, 1))).label('on_time_deliveries')
+        ).filter(
+            Load.actual_delivery_arrival >= datetime.combine(thirty_days_ago, datetime.min.time()),
+            Load.actual_delivery_arrival < datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ).group_by(delivered_day).order_by(delivered_day).all()
     
     # Format the data for the response
     trend_data = []
@@ -354,3 +214,28 @@ def performance_trends():
         })
     
     return jsonify(trend_data)
+
+@dashboard_bp.route('/api/dashboard/stream')
+def dashboard_stream():
+    """Server-sent events carrying only the parts of the default dashboard that changed"""
+    if not current_app.config.get('LIVE_UPDATES_SSE'):
+        # 204 tells EventSource not to reconnect; the dashboard falls back to polling
+        return Response(status=204)
+    subscriber = live_updates_hub.subscribe()
+    if subscriber is None:
+        # This worker already streams to MAX_SUBSCRIBERS clients; this one polls instead
+        return Response(status=204)
+    response = Response(stream_with_context(stream_events(subscriber)), mimetype='text/event-stream')
+    # A stream closed before its first chunk never runs the generator's cleanup
+    response.call_on_close(lambda: live_updates_hub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@dashboard_bp.route('/api/cache/stats')
+def cache_stats():
+    """API endpoint for response and ETA cache hit/miss counters of this worker"""
+    stats = response_cache.stats()
+    stats['generation'] = current_generation()
+    stats['eta_cache'] = eta_cache.stats()
+    return jsonify(stats)
@@ -1,10 +1,12 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, case, cast
 from app import db
 from models import Driver, DriverPerformance, Load, Milestone
-from services.motive_api import get_active_driver_locations
-from services.google_maps_api import get_eta
+from services.motive_poller import latest_driver_locations
+from services.google_maps_api import get_etas
+from services.driver_metrics import LoadColumns, compute_metrics, weekly_windows
+from services.response_cache import cached_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +17,59 @@ def index():
     """Show all drivers"""
     return render_template('drivers.html')
 
+def page_load_stats(driver_ids, since):
+    """
+    Count loads and on-time arrivals for a page of drivers in one grouped query
+    
+    Args:
+        driver_ids (list): Driver IDs on the page
+        since (datetime): Earliest scheduled pickup time to count
+    
+    Returns:
+        dict: driver_id -> (total_loads, on_time_pickups, on_time_deliveries)
+    """
+    if not driver_ids:
+        return {}
+    
+    rows = db.session.query(
+        Load.driver_id,
+        func.count(Load.id),
+        func.count(case((Load.actual_pickup_arrival <= Load.scheduled_pickup_time, 1))),
+        func.count(case((Load.actual_delivery_arrival <= Load.scheduled_delivery_time, 1)))
+    ).filter(
+        Load.driver_id.in_(driver_ids),
+        Load.scheduled_pickup_time >= since
+    ).group_by(Load.driver_id).all()
+    
+    return {driver_id: (total, pickups, deliveries) for driver_id, total, pickups, deliveries in rows}
+
+def active_loads_by_driver(driver_ids):
+    """
+    Find each driver's next active load (earliest scheduled delivery) in one windowed query
+    
+    Args:
+        driver_ids (list): Driver IDs to look up
+    
+    Returns:
+        dict: driver_id -> Load for drivers with a scheduled or in-transit load
+    """
+    if not driver_ids:
+        return {}
+    
+    ranked = db.session.query(
+        Load.id.label('load_id'),
+        func.row_number().over(
+            partition_by=Load.driver_id,
+            order_by=(Load.scheduled_delivery_time, Load.id)
+        ).label('position')
+    ).filter(
+        Load.driver_id.in_(driver_ids),
+        Load.status.in_(['scheduled', 'in_transit'])
+    ).subquery()
+    
+    loads = Load.query.join(ranked, Load.id == ranked.c.load_id).filter(ranked.c.position == 1).all()
+    return {load.driver_id: load for load in loads}
+
 @drivers_bp.route('/drivers/data')
 def get_drivers():
     """API endpoint to get all drivers with pagination and filtering"""
@@ -44,27 +99,19 @@ def get_drivers():
     today = datetime(2025, 5, 31).date()
     month_ago = datetime(2025, 5, 1).date()
     
+    driver_ids = [driver.id for driver in drivers_page.items]
+    month_ago_datetime = datetime.combine(month_ago, datetime.min.time())
+    load_stats = page_load_stats(driver_ids, month_ago_datetime)
+    active_loads = active_loads_by_driver(driver_ids)
+    
     drivers_data = []
     for driver in drivers_page.items:
-        # Get loads directly from the Load table for accurate count
-        month_ago_datetime = datetime.combine(month_ago, datetime.min.time())
-        loads = Load.query.filter(
-            Load.driver_id == driver.id,
-            Load.scheduled_pickup_time >= month_ago_datetime
-        ).all()
-        
-        total_loads = len(loads)
-        on_time_pickups = sum(1 for load in loads if load.pickup_on_time == True)
-        on_time_deliveries = sum(1 for load in loads if load.delivery_on_time == True)
+        total_loads, on_time_pickups, on_time_deliveries = load_stats.get(driver.id, (0, 0, 0))
         
         pickup_percentage = (on_time_pickups / total_loads * 100) if total_loads > 0 else 0
         delivery_percentage = (on_time_deliveries / total_loads * 100) if total_loads > 0 else 0
         
-        # Get active load
-        active_load = Load.query.filter(
-            Load.driver_id == driver.id,
-            Load.status.in_(['scheduled', 'in_transit'])
-        ).order_by(Load.scheduled_delivery_time).first()
+        active_load = active_loads.get(driver.id)
         
         drivers_data.append({
             'id': driver.id,
@@ -145,75 +192,22 @@ def get_driver_data(driver_id):
         'current_eta': load.current_eta.strftime('%Y-%m-%d %H:%M') if load.current_eta else None
     } for load in upcoming_loads]
     
-    # Calculate performance directly from Load data instead of DriverPerformance records
+    # Calculate performance for every window from the driver's load timestamps
     # Use May 2025 test data period
     today = datetime(2025, 5, 31).date()
     yesterday = datetime(2025, 5, 30).date()
     week_ago = datetime(2025, 5, 24).date()
     month_ago = datetime(2025, 5, 1).date()
     
-    month_ago_datetime = datetime.combine(month_ago, datetime.min.time())
-    
-    # Get all loads for this driver in the period
-    all_loads = Load.query.filter(
-        Load.driver_id == driver.id,
-        Load.scheduled_pickup_time >= month_ago_datetime
-    ).all()
-    
-    # Filter loads by periods
-    today_loads = [l for l in all_loads if l.scheduled_pickup_time.date() == today]
-    yesterday_loads = [l for l in all_loads if l.scheduled_pickup_time.date() == yesterday]
-    weekly_loads = [l for l in all_loads if l.scheduled_pickup_time.date() >= week_ago]
-    monthly_loads = all_loads
-    
-    # Helper function to calculate metrics for a load set
-    def calculate_metrics(loads):
-        if not loads:
-            return {
-                'loads': 0,
-                'on_time_loads': 0,
-                'on_time_percentage': 0,
-                'avg_delay': 0
-            }
-        
-        total_loads = len(loads)
-        
-        # A load is considered on-time only if BOTH pickup AND delivery are on-time
-        on_time_loads = sum(1 for load in loads 
-                           if load.pickup_on_time == True and load.delivery_on_time == True)
-        
-        # Calculate average delay for late loads
-        total_delay = 0
-        delay_count = 0
-        for load in loads:
-            # Check pickup delay
-            if load.actual_pickup_arrival and load.scheduled_pickup_time:
-                delay = (load.actual_pickup_arrival - load.scheduled_pickup_time).total_seconds() / 60
-                if delay > 0:
-                    total_delay += delay
-                    delay_count += 1
-            
-            # Check delivery delay  
-            if load.actual_delivery_arrival and load.scheduled_delivery_time:
-                delay = (load.actual_delivery_arrival - load.scheduled_delivery_time).total_seconds() / 60
-                if delay > 0:
-                    total_delay += delay
-                    delay_count += 1
-        
-        avg_delay = total_delay / max(delay_count, 1) if delay_count > 0 else 0
-        
-        return {
-            'loads': total_loads,
-            'on_time_loads': on_time_loads,
-            'on_time_percentage': round((on_time_loads / total_loads * 100), 1) if total_loads > 0 else 0,
-            'avg_delay': round(avg_delay, 1)
-        }
-    
-    # Calculate metrics for each period
-    today_metrics = calculate_metrics(today_loads)
-    yesterday_metrics = calculate_metrics(yesterday_loads)
-    weekly_metrics = calculate_metrics(weekly_loads)
-    monthly_metrics = calculate_metrics(monthly_loads)
+    # Weekly trend buckets (4 weeks of May 2025) are computed in the same pass
+    weeks = weekly_windows(month_ago, 4)
+    metrics = compute_metrics(LoadColumns.for_driver(driver.id, start_date=month_ago), {
+        'today': (today, today),
+        'yesterday': (yesterday, yesterday),
+        'weekly': (week_ago, None),
+        'monthly': (month_ago, None),
+        **weeks
+    })
     
     # Get milestone data
     milestones = Milestone.query.filter_by(driver_id=driver.id).order_by(Milestone.achieved_at.desc()).limit(5).all()
@@ -225,29 +219,14 @@ def get_driver_data(driver_id):
         'achieved_at': milestone.achieved_at.strftime('%Y-%m-%d')
     } for milestone in milestones]
     
-    # Create weekly trend data for chart (weekly intervals from May 2025)
-    import datetime as dt
-    weekly_data = []
-    start_date = datetime(2025, 5, 1).date()
-    
-    # Generate 4 weeks of data (May 2025)
-    for week in range(4):
-        week_start = start_date + timedelta(weeks=week)
-        week_end = week_start + timedelta(days=6)
-        
-        # Get loads for this week
-        week_loads = [l for l in all_loads 
-                     if week_start <= l.scheduled_pickup_time.date() <= week_end]
-        
-        if week_loads:
-            metrics = calculate_metrics(week_loads)
-            weekly_data.append({
-                'date': week_start.strftime('%Y-%m-%d'),
-                'week': f"Week {week + 1}",
-                'loads': metrics['loads'],
-                'on_time_percentage': metrics['on_time_percentage'],
-                'avg_delay': metrics['avg_delay']
-            })
+    # Create weekly trend data for chart
+    weekly_data = [{
+        'date': week_start.strftime('%Y-%m-%d'),
+        'week': week,
+        'loads': metrics[week]['loads'],
+        'on_time_percentage': metrics[week]['on_time_percentage'],
+        'avg_delay': metrics[week]['avg_delay']
+    } for week, (week_start, _) in weeks.items() if metrics[week]['loads']]
     
     # Compile all data
     driver_data = {
@@ -260,10 +239,10 @@ def get_driver_data(driver_id):
         'created_at': driver.created_at.strftime('%Y-%m-%d'),
         
         'metrics': {
-            'today': today_metrics,
-            'yesterday': yesterday_metrics,
-            'weekly': weekly_metrics,
-            'monthly': monthly_metrics
+            'today': metrics['today'],
+            'yesterday': metrics['yesterday'],
+            'weekly': metrics['weekly'],
+            'monthly': metrics['monthly']
         },
         
         'loads': {
@@ -279,11 +258,12 @@ def get_driver_data(driver_id):
 
 @drivers_bp.route("/api/drivers/locations")
 def driver_locations():
-    """API endpoint for real-time driver locations with ETA calculations"""
-    drivers = get_active_driver_locations()
+    """API endpoint for real-time driver locations with ETA calculations, from the last Motive poll"""
+    drivers = latest_driver_locations()
     destination = "123 Delivery St, Dallas TX"  # Default destination - should be configurable
-    for driver in drivers:
-        driver["eta"] = get_eta(driver["latitude"], driver["longitude"], destination)
+    etas = get_etas([(driver["latitude"], driver["longitude"]) for driver in drivers], destination)
+    for driver, eta in zip(drivers, etas):
+        driver["eta"] = eta
     return jsonify(drivers)
 
 @drivers_bp.route('/drivers/create', methods=['GET', 'POST'])
@@ -359,73 +339,20 @@ def update_driver(driver_id):
         flash(f'Error updating driver: {str(e)}', 'danger')
         return redirect(url_for('drivers.driver_detail', driver_id=driver.id))
 
-@drivers_bp.route('/drivers/<int:driver_id>/performance/update', methods=['POST'])
-def update_performance(driver_id):
-    """Manually update a driver's performance metrics"""
-    driver = Driver.query.get_or_404(driver_id)
-    
-    try:
-        data = request.json
-        date_str = data.get('date')
-        
-        if not date_str:
-            return jsonify({'error': 'Date is required'}), 400
-        
-        performance_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        
-        # Find or create performance record for the given date
-        performance = DriverPerformance.query.filter_by(
-            driver_id=driver.id, 
-            date=performance_date
-        ).first()
-        
-        if not performance:
-            performance = DriverPerformance(
-                driver_id=driver.id,
-                date=performance_date
-            )
-            db.session.add(performance)
-        
-        # Update fields
-        if 'loads_completed' in data:
-            performance.loads_completed = data['loads_completed']
-        
-        if 'on_time_pickups' in data:
-            performance.on_time_pickups = data['on_time_pickups']
-        
-        if 'on_time_deliveries' in data:
-            performance.on_time_deliveries = data['on_time_deliveries']
-        
-        if 'average_delay_minutes' in data:
-            performance.average_delay_minutes = data['average_delay_minutes']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'performance': {
-                'date': performance.date.strftime('%Y-%m-%d'),
-                'loads_completed': performance.loads_completed,
-                'on_time_pickups': performance.on_time_pickups,
-                'on_time_deliveries': performance.on_time_deliveries,
-                'average_delay_minutes': performance.average_delay_minutes,
-                'on_time_pickup_percentage': performance.on_time_pickup_percentage,
-                'on_time_delivery_percentage': performance.on_time_delivery_percentage
-            }
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
-
 @drivers_bp.route('/drivers/scorecards')
 def scorecards():
     """Show driver scorecards and rankings"""
     return render_template('scorecards.html')
 
 @drivers_bp.route('/drivers/scorecards/data')
+@cached_response()
 def get_scorecards_data():
-    """API endpoint to get driver scorecard data"""
+    """
+    API endpoint to get driver scorecard data, ranked in the database
+    
+    Query params: start_date/end_date, top (first N ranks) or page/per_page.
+    The number of ranked drivers is returned in the X-Total-Count header.
+    """
     period = request.args.get('period', 30, type=int)
     start_date_param = request.args.get('start_date')
     end_date_param = request.args.get('end_date')
@@ -440,66 +367,79 @@ def get_scorecards_data():
             end_date = datetime(2025, 5, 31).date()
             start_date = datetime(2025, 5, 1).date()
         
-        # Get all drivers with their performance data
-        drivers = db.session.query(Driver).all()
-        scorecard_data = []
-        
-        for driver in drivers:
-            # Get loads for this driver in the period
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-            
-            loads = db.session.query(Load).filter(
-                Load.driver_id == driver.id,
-                Load.scheduled_pickup_time >= start_datetime,
-                Load.scheduled_pickup_time <= end_datetime
-            ).all()
-            
-            if not loads:
-                continue  # Skip drivers with no loads in this period
-            
-            # Calculate performance metrics
-            total_loads = len(loads)
-            on_time_pickups = sum(1 for load in loads if load.pickup_on_time == True)
-            on_time_deliveries = sum(1 for load in loads if load.delivery_on_time == True)
-            
-            # Calculate average delay
-            total_delay_minutes = 0
-            delayed_loads = 0
-            
-            for load in loads:
-                if load.actual_pickup_arrival and load.scheduled_pickup_time:
-                    pickup_delay = (load.actual_pickup_arrival - load.scheduled_pickup_time).total_seconds() / 60
-                    if pickup_delay > 0:  # Any delay is counted
-                        total_delay_minutes += pickup_delay
-                        delayed_loads += 1
-                
-                if load.actual_delivery_arrival and load.scheduled_delivery_time:
-                    delivery_delay = (load.actual_delivery_arrival - load.scheduled_delivery_time).total_seconds() / 60
-                    if delivery_delay > 0:  # Any delay is counted
-                        total_delay_minutes += delivery_delay
-                        delayed_loads += 1
-            
-            avg_delay = total_delay_minutes / max(delayed_loads, 1) if delayed_loads > 0 else 0
-            
-            # Calculate percentages
-            on_time_pickup_pct = round((on_time_pickups / total_loads * 100), 1) if total_loads > 0 else 0
-            on_time_delivery_pct = round((on_time_deliveries / total_loads * 100), 1) if total_loads > 0 else 0
-            
-            scorecard_data.append({
-                'id': driver.id,
-                'name': driver.name,
-                'loads_completed': total_loads,
-                'on_time_pickup_percentage': on_time_pickup_pct,
-                'on_time_delivery_percentage': on_time_delivery_pct,
-                'average_delay_minutes': round(avg_delay, 1),
-                'overall_score': round((on_time_pickup_pct + on_time_delivery_pct) / 2, 1)
-            })
-        
-        # Sort by overall score (descending) then by loads completed
-        scorecard_data.sort(key=lambda x: (x['overall_score'], x['loads_completed']), reverse=True)
-        
-        return jsonify(scorecard_data)
+        # Pagination: top=N returns the first N ranks; page/per_page pages through all of them
+        top = request.args.get('top', type=int)
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', type=int)
+        
+        totals = db.session.query(
+            DriverPerformance.driver_id.label('driver_id'),
+            func.sum(DriverPerformance.loads_completed).label('loads_completed'),
+            func.sum(DriverPerformance.on_time_pickups).label('on_time_pickups'),
+            func.sum(DriverPerformance.on_time_deliveries).label('on_time_deliveries'),
+            func.sum(DriverPerformance.delay_minutes_total).label('delay_minutes_total'),
+            func.sum(DriverPerformance.delay_count).label('delay_count')
+        ).filter(
+            DriverPerformance.date >= start_date,
+            DriverPerformance.date <= end_date
+        ).group_by(DriverPerformance.driver_id).having(
+            func.sum(DriverPerformance.loads_completed) > 0  # Skip drivers with no loads in this period
+        ).subquery()
+        
+        def percentage(count):
+            return func.round(cast(count * 100.0 / totals.c.loads_completed, db.Numeric), 1)
+        
+        pickup_pct = percentage(totals.c.on_time_pickups)
+        delivery_pct = percentage(totals.c.on_time_deliveries)
+        overall_score = func.round((pickup_pct + delivery_pct) / 2, 1)
+        avg_delay = func.round(cast(case(
+            (totals.c.delay_count > 0, totals.c.delay_minutes_total / totals.c.delay_count),
+            else_=0
+        ), db.Numeric), 1)
+        
+        query = db.session.query(
+            Driver.id,
+            Driver.name,
+            totals.c.loads_completed,
+            pickup_pct.label('on_time_pickup_percentage'),
+            delivery_pct.label('on_time_delivery_percentage'),
+            avg_delay.label('average_delay_minutes'),
+            overall_score.label('overall_score')
+        ).join(totals, totals.c.driver_id == Driver.id).order_by(
+            # Rank by overall score, then by loads completed
+            overall_score.desc(),
+            totals.c.loads_completed.desc(),
+            Driver.id
+        )
+        
+        limit = top or per_page
+        offset = 0 if top else (max(page, 1) - 1) * (per_page or 0)
+        if limit:
+            query = query.limit(limit).offset(offset)
+        
+        rows = query.all()
+        
+        # A partly filled page already tells the total; otherwise count the ranked drivers separately
+        if not limit or 0 < len(rows) < limit:
+            total_count = offset + len(rows)
+        else:
+            total_count = db.session.query(func.count()).select_from(totals).join(
+                Driver, totals.c.driver_id == Driver.id
+            ).scalar()
+        
+        scorecard_data = [{
+            'id': row.id,
+            'name': row.name,
+            'loads_completed': int(row.loads_completed),
+            'on_time_pickup_percentage': float(row.on_time_pickup_percentage),
+            'on_time_delivery_percentage': float(row.on_time_delivery_percentage),
+            'average_delay_minutes': float(row.average_delay_minutes),
+            'overall_score': float(row.overall_score)
+        } for row in rows]
+        
+        response = jsonify(scorecard_data)
+        response.headers['X-Total-Count'] = str(total_count)
+        return response
         
     except Exception as e:
         logger.error(f"Error getting scorecard data: {e}")
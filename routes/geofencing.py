@@ -1,11 +1,29 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
-from datetime import datetime
 from app import db
 from models import Facility, Load
-from services.geofencing import check_geofence_entry
+from services.geofencing import check_geofence_entry, check_geofence_batch, set_geofence_polygon
+from services.polygons import decode_polyline
+from services.facility_index import facility_index
+from services.geofence_stream import geofence_stream
+from services.location_ingest import parse_ping_timestamp, parse_pings
 
 geofencing_bp = Blueprint('geofencing', __name__)
 
+def geofence_bbox(facility):
+    """Stored [min_lat, min_lng, max_lat, max_lng] of a facility's polygon fence, or None"""
+    if not facility.geofence_polygon:
+        return None
+    return [facility.geofence_min_lat, facility.geofence_min_lng,
+            facility.geofence_max_lat, facility.geofence_max_lng]
+
+def parse_polygon(value):
+    """Polygon vertices from an encoded polyline or a list of [lat, lng] pairs; None clears the polygon"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        return decode_polyline(value)
+    return [(point[0], point[1]) for point in value]
+
 @geofencing_bp.route('/geofencing')
 def index():
     """Show geofencing management interface"""
@@ -26,6 +44,8 @@ def get_facilities():
         'lat': f.lat,
         'lng': f.lng,
         'geofence_radius': f.geofence_radius,
+        'geofence_polygon': f.geofence_polygon,
+        'geofence_bbox': geofence_bbox(f),
         'client': f.client.name if f.client else 'Unknown'
     } for f in facilities]
     
@@ -49,6 +69,14 @@ def facility_detail(facility_id):
                 facility.lat = float(data['lat'])
                 facility.lng = float(data['lng'])
             
+            # Polygon as an encoded polyline or [[lat, lng], ...]; null reverts to the radius
+            if 'geofence_polygon' in data:
+                try:
+                    set_geofence_polygon(facility, parse_polygon(data['geofence_polygon']))
+                except (TypeError, ValueError, IndexError) as e:
+                    db.session.rollback()
+                    return jsonify({'error': f"Invalid geofence_polygon: {e}"}), 400
+            
             db.session.commit()
             
             return jsonify({
@@ -58,7 +86,9 @@ def facility_detail(facility_id):
                     'name': facility.name,
                     'lat': facility.lat,
                     'lng': facility.lng,
-                    'geofence_radius': facility.geofence_radius
+                    'geofence_radius': facility.geofence_radius,
+                    'geofence_polygon': facility.geofence_polygon,
+                    'geofence_bbox': geofence_bbox(facility)
                 }
             })
             
@@ -77,6 +107,8 @@ def facility_detail(facility_id):
         'lat': facility.lat,
         'lng': facility.lng,
         'geofence_radius': facility.geofence_radius,
+        'geofence_polygon': facility.geofence_polygon,
+        'geofence_bbox': geofence_bbox(facility),
         'client': {
             'id': facility.client.id,
             'name': facility.client.name
@@ -100,8 +132,8 @@ def check_geofence():
         
         load = Load.query.get_or_404(load_id)
         
-        # Check if the vehicle has entered/exited a geofence
-        result = check_geofence_entry(load, float(lat), float(lng))
+        # Check if the vehicle has entered/exited a geofence, dated to the ping rather than to now
+        result = check_geofence_entry(load, float(lat), float(lng), parse_ping_timestamp(data.get('timestamp')))
         
         # If status has changed, update the load record
         if result['status_changed']:
@@ -113,6 +145,82 @@ def check_geofence():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@geofencing_bp.route('/geofencing/locate')
+def locate():
+    """API endpoint for the geofences containing a point and the nearest facility"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng are required'}), 400
+    
+    max_miles = request.args.get('max_miles', type=float)
+    nearest = facility_index.nearest(lat, lng, max_miles)
+    
+    return jsonify({
+        'inside': [{**fence, 'distance_miles': round(distance, 3)}
+                   for distance, fence in facility_index.containing(lat, lng)],
+        'nearest': {**nearest[1], 'distance_miles': round(nearest[0], 3)} if nearest else None
+    })
+
+MAX_BATCH_PINGS = 10000
+
+def request_pings():
+    """Raw pings from a JSON list or {"pings": [...]} body, or an error response"""
+    data = request.get_json(silent=True)
+    raw_pings = data.get('pings') if isinstance(data, dict) else data
+    
+    if not isinstance(raw_pings, list) or not raw_pings:
+        return None, (jsonify({'error': 'Expected a non-empty list of pings'}), 400)
+    if len(raw_pings) > MAX_BATCH_PINGS:
+        return None, (jsonify({'error': f'At most {MAX_BATCH_PINGS} pings per batch'}), 400)
+    return raw_pings, None
+
+@geofencing_bp.route('/geofencing/check-batch', methods=['POST'])
+def check_geofence_batch_endpoint():
+    """Check many position pings against their loads' geofences and commit once"""
+    raw_pings, error = request_pings()
+    if error:
+        return error
+    
+    pings, errors = parse_pings(raw_pings)
+    try:
+        result = check_geofence_batch(pings) if pings else {'processed': 0, 'events': [], 'unmatched': 0}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    result['invalid'] = errors
+    return jsonify(result)
+
+@geofencing_bp.route('/geofencing/stream', methods=['POST'])
+def stream_geofence_pings():
+    """
+    Feed pings through the debounced per-load geofence state machines
+    
+    Transitions are confirmed only after the minimum dwell, dated to the first
+    ping on the new side, and written in coalesced batches.
+    """
+    raw_pings, error = request_pings()
+    if error:
+        return error
+    
+    pings, errors = parse_pings(raw_pings)
+    try:
+        result = geofence_stream.ingest(pings)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    result['invalid'] = errors
+    return jsonify(result)
+
+@geofencing_bp.route('/geofencing/stream/<int:load_id>')
+def geofence_stream_status(load_id):
+    """Fence state, dwell and detention for a load tracked by the stream"""
+    status = geofence_stream.status(load_id)
+    if status is None:
+        return jsonify({'error': 'Load is not being tracked'}), 404
+    return jsonify(status)
+
 @geofencing_bp.route('/geofencing/create-facility', methods=['POST'])
 def create_facility():
     """Create a new facility with geofence"""
@@ -138,6 +246,8 @@ def create_facility():
             geofence_radius=float(data.get('geofence_radius', 0.2)),
             client_id=int(data['client_id'])
         )
+        if data.get('geofence_polygon'):
+            set_geofence_polygon(new_facility, parse_polygon(data['geofence_polygon']))
         
         db.session.add(new_facility)
         db.session.commit()
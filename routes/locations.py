@@ -0,0 +1,110 @@
+import json
+import logging
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app import db
+from models import Load
+from services.location_ingest import parse_pings, ingest_pings
+from services.geofence_stream import geofence_stream
+from services.tracks import get_track, replay_points, DEFAULT_TOLERANCE_METERS, MAX_TRACK_POINTS
+
+logger = logging.getLogger(__name__)
+
+locations_bp = Blueprint('locations', __name__)
+
+MAX_INGEST_PINGS = 50000
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+def read_raw_pings():
+    """
+    Raw pings from a JSON list, a {"pings": [...]} object or NDJSON (one ping per line)
+
+    Returns:
+        tuple: (raw pings, errors for unparseable NDJSON lines)
+
+    Raises:
+        ValueError: If the body is not a list of pings
+    """
+    if request.mimetype in NDJSON_TYPES:
+        raw_pings = []
+        errors = []
+        for line_number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                raw_pings.append(json.loads(line))
+            except ValueError as e:
+                errors.append({'line': line_number, 'error': str(e)})
+        return raw_pings, errors
+
+    data = request.get_json(silent=True)
+    raw_pings = data.get('pings') if isinstance(data, dict) else data
+    if not isinstance(raw_pings, list):
+        raise ValueError('Expected a list of pings, a {"pings": [...]} object or NDJSON')
+    return raw_pings, []
+
+
+@locations_bp.route('/api/locations/ingest', methods=['POST'])
+def ingest_locations():
+    """
+    Store a batch of GPS pings as LocationUpdate breadcrumbs and update vehicle positions
+
+    Pings are also fed to the geofence state machines unless ?geofence=0.
+    """
+    try:
+        raw_pings, errors = read_raw_pings()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not raw_pings:
+        return jsonify({'error': 'No pings in request', 'invalid': errors}), 400
+    if len(raw_pings) > MAX_INGEST_PINGS:
+        return jsonify({'error': f'At most {MAX_INGEST_PINGS} pings per request'}), 413
+
+    pings, invalid = parse_pings(raw_pings)
+    try:
+        result = ingest_pings(pings)
+    except Exception as e:
+        logger.error(f"Error ingesting {len(pings)} pings: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    load_pings = result.pop('load_pings')
+    if load_pings and request.args.get('geofence', '1') != '0':
+        try:
+            result['geofence'] = geofence_stream.ingest(load_pings)
+        except Exception as e:
+            # The breadcrumbs are already stored; a geofence failure must not fail the ingest
+            db.session.rollback()
+            logger.error(f"Error applying geofences to ingested pings: {e}")
+            result['geofence'] = {'error': str(e)}
+
+    result['invalid'] = errors + invalid
+    return jsonify(result)
+
+
+@locations_bp.route('/api/loads/<int:load_id>/track')
+def load_track(load_id):
+    """
+    Simplified breadcrumb track of a load for replay
+
+    Query parameters:
+        tolerance: Simplification tolerance in meters (snapped to the supported levels)
+        max_points: Point limit, never more than MAX_TRACK_POINTS
+        format: 'json' (default) for the compact polyline form, 'ndjson' to stream one point per line
+    """
+    load = Load.query.get_or_404(load_id)
+    tolerance = request.args.get('tolerance', DEFAULT_TOLERANCE_METERS, type=float)
+    max_points = request.args.get('max_points', MAX_TRACK_POINTS, type=int)
+
+    payload = get_track(load, tolerance, max_points)
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            header = {key: payload[key] for key in ('load_id', 'tolerance_meters', 'original_points', 'point_count')}
+            yield json.dumps(header) + '\n'
+            for point in replay_points(payload):
+                yield json.dumps(point) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    return jsonify(payload)
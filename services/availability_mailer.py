@@ -0,0 +1,325 @@
+import logging
+import os
+import queue
+import socket
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, update, or_
+from app import app, db
+from models import AvailabilityBroadcast, BroadcastRecipient
+from services.email_delivery import SMTPSender, RateLimiter, send_batch
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+RATE_PER_SECOND = float(os.environ.get('MAIL_RATE_PER_SECOND', 10))
+MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 3))
+
+ClaimedRecipient = namedtuple('ClaimedRecipient', 'id email name company attempts')
+
+# Close the SMTP connection when no broadcast has been queued for this long
+IDLE_SECONDS = 60
+
+# Recipients left 'sending', and broadcasts not renewed, longer than this belong to a worker that died
+CLAIM_LEASE_SECONDS = int(os.environ.get('MAIL_CLAIM_LEASE_SECONDS', 600))
+
+
+def queue_broadcast(subject, html_body, text_body, recipients):
+    """
+    Store a broadcast and its recipients, then hand it to the background worker
+
+    Args:
+        subject (str): Message subject
+        html_body (str): HTML report containing the recipient placeholders
+        text_body (str): Plain text report containing the recipient placeholders
+        recipients (list): Dicts with email and optional name and company
+
+    Returns:
+        AvailabilityBroadcast: The queued broadcast
+    """
+    broadcast = AvailabilityBroadcast(
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body,
+        status='queued',
+        total_recipients=len(recipients)
+    )
+    db.session.add(broadcast)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(BroadcastRecipient, [{
+        'broadcast_id': broadcast.id,
+        'email': recipient['email'],
+        'name': recipient.get('name'),
+        'company': recipient.get('company'),
+        'status': 'pending',
+        'attempts': 0
+    } for recipient in recipients])
+    db.session.commit()
+
+    worker.submit(broadcast.id)
+    return broadcast
+
+
+def claim_broadcast(broadcast_id, owner, now=None):
+    """
+    Take or renew the delivery lease on a broadcast
+
+    A conditional UPDATE, so only one worker holds a broadcast at a time and
+    MAIL_RATE_PER_SECOND applies to the broadcast as a whole, not per process.
+    An expired lease can be taken over by any worker.
+
+    Args:
+        broadcast_id (int): Broadcast to deliver
+        owner (str): Identifier of the claiming worker
+        now (datetime, optional): Current time
+
+    Returns:
+        bool: True if owner holds the lease until now + CLAIM_LEASE_SECONDS
+    """
+    now = now or datetime.utcnow()
+    table = AvailabilityBroadcast.__table__
+    claimed = db.session.execute(
+        update(table).where(
+            table.c.id == broadcast_id,
+            table.c.status.in_(['queued', 'sending']),
+            or_(table.c.claimed_by.is_(None), table.c.claimed_by == owner, table.c.claimed_until < now)
+        ).values(claimed_by=owner, claimed_until=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def release_broadcast(broadcast_id, owner):
+    """Give up the delivery lease so another worker can take the broadcast at once"""
+    table = AvailabilityBroadcast.__table__
+    db.session.execute(
+        update(table).where(table.c.id == broadcast_id, table.c.claimed_by == owner)
+        .values(claimed_by=None, claimed_until=None)
+    )
+    db.session.commit()
+
+
+def _claim_batch(broadcast_id, size=BATCH_SIZE):
+    """
+    Lock and mark the next pending recipients as sending
+
+    Only the lease holder claims batches; SKIP LOCKED still keeps a worker
+    whose lease lapsed mid-batch from sending to anyone twice.
+
+    Returns:
+        list: Detached snapshots of the claimed recipients
+    """
+    rows = BroadcastRecipient.query.filter(
+        BroadcastRecipient.broadcast_id == broadcast_id,
+        BroadcastRecipient.status == 'pending'
+    ).order_by(BroadcastRecipient.id).limit(size).with_for_update(skip_locked=True).all()
+
+    # Snapshot before the commit expires the rows, so sending needs no further queries
+    claimed = [ClaimedRecipient(row.id, row.email, row.name, row.company, (row.attempts or 0) + 1) for row in rows]
+    now = datetime.utcnow()
+    db.session.bulk_update_mappings(BroadcastRecipient, [
+        {'id': recipient.id, 'status': 'sending', 'attempts': recipient.attempts, 'claimed_at': now}
+        for recipient in claimed
+    ])
+    db.session.commit()
+    return claimed
+
+
+def _record_results(recipients, results):
+    """Store per-recipient outcomes; failures go back to pending until MAX_ATTEMPTS"""
+    now = datetime.utcnow()
+    updates = []
+    for recipient in recipients:
+        error = results.get(recipient.id)
+        if error is None:
+            updates.append({'id': recipient.id, 'status': 'sent', 'sent_at': now, 'error': None, 'claimed_at': None})
+        else:
+            status = 'failed' if recipient.attempts >= MAX_ATTEMPTS else 'pending'
+            updates.append({'id': recipient.id, 'status': status, 'error': error, 'claimed_at': None})
+    db.session.bulk_update_mappings(BroadcastRecipient, updates)
+    db.session.commit()
+
+
+def release_stale_claims(now=None):
+    """
+    Return recipients claimed by a worker that died mid-batch to pending
+
+    Rows that already used MAX_ATTEMPTS are marked failed instead. Rows claimed
+    before claimed_at existed have no claim time and count as stale.
+
+    Returns:
+        int: Number of recipients released
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=CLAIM_LEASE_SECONDS)
+    table = BroadcastRecipient.__table__
+    stale = (table.c.status == 'sending') & or_(table.c.claimed_at.is_(None), table.c.claimed_at < cutoff)
+
+    failed = db.session.execute(
+        update(table).where(stale, table.c.attempts >= MAX_ATTEMPTS)
+        .values(status='failed', error='Delivery interrupted', claimed_at=None)
+    ).rowcount
+    released = db.session.execute(
+        update(table).where(stale).values(status='pending', claimed_at=None)
+    ).rowcount
+    db.session.commit()
+    if failed or released:
+        logger.warning(f"Released {released} stale broadcast recipients, failed {failed} out of attempts")
+    return failed + released
+
+
+def unfinished_broadcasts():
+    """Ids of broadcasts still queued or sending, oldest first"""
+    return [broadcast_id for broadcast_id, in db.session.query(AvailabilityBroadcast.id).filter(
+        AvailabilityBroadcast.status.in_(['queued', 'sending'])
+    ).order_by(AvailabilityBroadcast.id)]
+
+
+def _finish_broadcast(broadcast):
+    counts = dict(db.session.query(BroadcastRecipient.status, func.count(BroadcastRecipient.id)).filter(
+        BroadcastRecipient.broadcast_id == broadcast.id
+    ).group_by(BroadcastRecipient.status).all())
+
+    broadcast.sent_count = counts.get('sent', 0)
+    broadcast.failed_count = counts.get('failed', 0)
+    if not counts.get('pending') and not counts.get('sending'):
+        broadcast.status = 'failed' if broadcast.total_recipients and not broadcast.sent_count else 'completed'
+        broadcast.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def deliver_broadcast(broadcast_id, sender, rate_limiter=None, owner=None):
+    """
+    Send a broadcast to all of its pending recipients in batches
+
+    Args:
+        broadcast_id (int): Broadcast to deliver
+        sender (SMTPSender): Reused connection
+        rate_limiter (RateLimiter, optional): Throttle across all messages
+        owner (str, optional): Worker identifier; delivers only while holding the broadcast's lease
+
+    Returns:
+        AvailabilityBroadcast: The broadcast with updated counts, or None if it does not
+            exist or another worker holds it
+    """
+    if owner is not None and not claim_broadcast(broadcast_id, owner):
+        return None
+    try:
+        return _deliver(broadcast_id, sender, rate_limiter, owner)
+    finally:
+        if owner is not None:
+            db.session.rollback()
+            release_broadcast(broadcast_id, owner)
+
+
+def _deliver(broadcast_id, sender, rate_limiter, owner):
+    broadcast = AvailabilityBroadcast.query.get(broadcast_id)
+    if broadcast is None:
+        return None
+
+    if broadcast.status == 'queued':
+        broadcast.status = 'sending'
+        broadcast.started_at = datetime.utcnow()
+        db.session.commit()
+
+    # The report was rendered once when queued; only the placeholders differ per recipient
+    subject, html_body, text_body = broadcast.subject, broadcast.html_body, broadcast.text_body
+
+    while True:
+        if owner is not None and not claim_broadcast(broadcast_id, owner):
+            logger.warning(f"Broadcast {broadcast_id}: lease lost to another worker; stopping")
+            return broadcast
+        recipients = _claim_batch(broadcast_id)
+        if not recipients:
+            break
+
+        results = send_batch(sender, subject, html_body, text_body, recipients, rate_limiter)
+        _record_results(recipients, results)
+        logger.info(f"Broadcast {broadcast_id}: sent {sum(1 for e in results.values() if e is None)} "
+                    f"of {len(recipients)} in batch")
+
+    _finish_broadcast(broadcast)
+    return broadcast
+
+
+class BroadcastWorker:
+    """
+    Background thread that delivers queued broadcasts over one pooled SMTP connection
+
+    The queue only speeds up pickup: the database is the source of truth. When
+    the thread starts and whenever it is idle it releases stale claims and picks
+    up every broadcast still queued or sending, so work survives worker restarts.
+    Every worker may queue a broadcast, but only the one holding its lease
+    delivers it.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.sender = SMTPSender()
+        self.rate_limiter = RateLimiter(RATE_PER_SECOND)
+
+    @property
+    def owner(self):
+        """Lease owner name for this process; read per use so forked workers differ"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def submit(self, broadcast_id):
+        with self._lock:
+            if broadcast_id not in self._queued:
+                self._queued.add(broadcast_id)
+                self._queue.put(broadcast_id)
+        self.ensure_running()
+
+    def ensure_running(self):
+        """Start the delivery thread if it is not running; cheap enough to call on every request"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='availability-mailer', daemon=True)
+                self._thread.start()
+
+    def _recover(self):
+        """Queue the unfinished broadcasts in the database, after releasing stale claims"""
+        with app.app_context():
+            try:
+                release_stale_claims()
+                for broadcast_id in unfinished_broadcasts():
+                    with self._lock:
+                        if broadcast_id in self._queued:
+                            continue
+                        self._queued.add(broadcast_id)
+                        self._queue.put(broadcast_id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error recovering unfinished broadcasts: {e}")
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        self._recover()
+        while True:
+            try:
+                broadcast_id = self._queue.get(timeout=IDLE_SECONDS)
+            except queue.Empty:
+                self.sender.close()
+                self._recover()
+                continue
+
+            with self._lock:
+                self._queued.discard(broadcast_id)
+            with app.app_context():
+                try:
+                    deliver_broadcast(broadcast_id, self.sender, self.rate_limiter, self.owner)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error delivering broadcast {broadcast_id}: {e}")
+                finally:
+                    db.session.remove()
+
+
+worker = BroadcastWorker()
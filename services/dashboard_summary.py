@@ -0,0 +1,181 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, case, and_, or_
+from app import db
+from models import Load, Driver, DriverPerformance, Notification
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('scheduled', 'in_transit')
+
+
+def _in_window(column, date_start, date_end):
+    """
+    Half-open timestamp range for the days date_start through date_end
+
+    Comparing the raw column (instead of func.date(column)) keeps the predicate sargable
+    so the arrival-time indexes on Load can be used.
+    """
+    return and_(
+        column >= datetime.combine(date_start, datetime.min.time()),
+        column < datetime.combine(date_end + timedelta(days=1), datetime.min.time())
+    )
+
+
+def _count_if(*conditions):
+    """COUNT of the rows matching all conditions (NULL rows are not counted)"""
+    return func.count(case((and_(*conditions), 1)))
+
+
+def status_counts_query(driver_id=None):
+    """
+    Count loads per status, optionally for one driver
+
+    Args:
+        driver_id (int, optional): Restrict the counts to one driver
+
+    Returns:
+        Query: (status, load_count) rows
+    """
+    query = db.session.query(Load.status, func.count(Load.id).label('load_count'))
+    if driver_id:
+        query = query.filter(Load.driver_id == driver_id)
+    return query.group_by(Load.status)
+
+
+def window_counts_query(date_start, date_end, driver_id=None):
+    """
+    Compute every on-time KPI for the window in a single conditional-aggregation query
+
+    Only loads with a pickup or delivery arrival inside the window are read, so the
+    arrival-time indexes bound the scan to the window instead of the whole table.
+
+    Args:
+        date_start (date): First day of the reporting window (inclusive)
+        date_end (date): Last day of the reporting window (inclusive)
+        driver_id (int, optional): Restrict the counts to one driver
+
+    Returns:
+        Query: A single row of named on-time counts
+    """
+    pickup_in_window = _in_window(Load.actual_pickup_arrival, date_start, date_end)
+    delivery_in_window = _in_window(Load.actual_delivery_arrival, date_start, date_end)
+    pickup_on_time = Load.actual_pickup_arrival <= Load.scheduled_pickup_time
+    delivery_on_time = Load.actual_delivery_arrival <= Load.scheduled_delivery_time
+
+    query = db.session.query(
+        _count_if(pickup_in_window).label('total_pickups'),
+        _count_if(pickup_in_window, pickup_on_time).label('on_time_pickups'),
+        _count_if(delivery_in_window).label('total_deliveries'),
+        _count_if(delivery_in_window, delivery_on_time).label('on_time_deliveries'),
+        _count_if(pickup_in_window, delivery_in_window).label('total_completed'),
+        _count_if(pickup_in_window, delivery_in_window,
+                  pickup_on_time, delivery_on_time).label('overall_on_time'),
+        _count_if(pickup_in_window, delivery_in_window,
+                  or_(Load.actual_pickup_arrival > Load.scheduled_pickup_time,
+                      Load.actual_delivery_arrival > Load.scheduled_delivery_time)).label('late_overall')
+    ).filter(or_(pickup_in_window, delivery_in_window))
+
+    if driver_id:
+        query = query.filter(Load.driver_id == driver_id)
+
+    return query
+
+
+def _top_drivers(date_start, date_end, limit=5, min_loads=3):
+    """Get the drivers with the best on-time delivery performance in the window from the daily rollups"""
+    total_loads = func.sum(DriverPerformance.deliveries)
+    on_time_percentage = func.sum(DriverPerformance.deliveries_on_time) * 100.0 / total_loads
+
+    top_drivers_query = db.session.query(
+        Driver.id,
+        Driver.name,
+        on_time_percentage.label('on_time_percentage')
+    ).join(DriverPerformance, DriverPerformance.driver_id == Driver.id).filter(
+        DriverPerformance.date >= date_start,
+        DriverPerformance.date <= date_end
+    ).group_by(Driver.id, Driver.name).having(
+        total_loads >= min_loads  # Only drivers with at least 3 loads
+    ).order_by(on_time_percentage.desc()).limit(limit).all()
+
+    return [{'id': d.id, 'name': d.name, 'on_time_percentage': round(d.on_time_percentage, 1)} for d in top_drivers_query]
+
+
+def _percentage(part, total):
+    return (part / total * 100) if total > 0 else 0
+
+
+def compute_dashboard_summary(date_start, date_end, driver_id=None):
+    """
+    Build the /api/dashboard/summary payload with a fixed number of queries
+
+    Status totals come from one grouped count and every windowed on-time figure
+    from one conditional aggregate, whatever the window or driver filter.
+
+    Args:
+        date_start (date): First day of the reporting window (inclusive)
+        date_end (date): Last day of the reporting window (inclusive)
+        driver_id (int, optional): Restrict the summary to one driver
+
+    Returns:
+        dict: Summary data in the shape the dashboard expects
+    """
+    status_counts = dict(status_counts_query(driver_id).all())
+    counts = window_counts_query(date_start, date_end, driver_id).one()
+
+    active_loads = sum(status_counts.get(status, 0) for status in ACTIVE_STATUSES)
+    all_loads = sum(status_counts.values())
+
+    if driver_id:
+        # For individual driver view the delivery counts above are already scoped to the driver
+        selected_driver = Driver.query.get(driver_id)
+        top_drivers = []
+        if selected_driver:
+            on_time_pct = _percentage(counts.on_time_deliveries, counts.total_deliveries)
+            top_drivers = [{'id': selected_driver.id, 'name': selected_driver.name, 'on_time_percentage': on_time_pct}]
+    else:
+        top_drivers = _top_drivers(date_start, date_end)
+
+    # Get recent notifications
+    recent_notifications = Notification.query.filter(
+        Notification.read == False
+    ).order_by(Notification.created_at.desc()).limit(5).all()
+
+    # Get total driver count for company view
+    total_drivers = Driver.query.filter_by(status='active').count()
+
+    late_deliveries = counts.total_deliveries - counts.on_time_deliveries
+    late_pickups = counts.total_pickups - counts.on_time_pickups
+
+    return {
+        'active_loads': active_loads,
+        'total_deliveries': counts.total_deliveries,
+        'late_deliveries': late_deliveries,
+        'total_drivers': total_drivers,
+        'on_time': {
+            'pickup_percentage': round(_percentage(counts.on_time_pickups, counts.total_pickups), 1),
+            'delivery_percentage': round(_percentage(counts.on_time_deliveries, counts.total_deliveries), 1),
+            'overall_percentage': round(_percentage(counts.overall_on_time, counts.total_completed), 1)
+        },
+        'late_shipments': {
+            'delivery_count': late_deliveries,
+            'pickup_count': late_pickups,
+            # Overall late shipments: loads where either pickup OR delivery was late
+            'overall_count': counts.late_overall
+        },
+        'loads_count': {
+            'active_count': active_loads,
+            'all_count': all_loads,
+            'delivered_count': status_counts.get('delivered', 0),
+            'scheduled_count': status_counts.get('scheduled', 0)
+        },
+        'top_drivers': top_drivers,
+        'notifications': [
+            {
+                'id': notification.id,
+                'message': notification.message,
+                'type': notification.type,
+                'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M')
+            } for notification in recent_notifications
+        ]
+    }
@@ -0,0 +1,102 @@
+import logging
+from sqlalchemy import inspect, text
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine=None):
+    """
+    Add columns declared on the models but missing from existing tables
+
+    db.create_all() only creates tables that do not exist yet, so columns added
+    to an existing model have to be added to the live table separately.
+
+    Args:
+        engine (Engine, optional): Engine to inspect, defaults to db.engine
+
+    Returns:
+        list: "table.column" names that were added
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    if_not_exists = 'IF NOT EXISTS ' if engine.dialect.name == 'postgresql' else ''
+
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {if_not_exists}{quote(column.name)} {column_type}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+                logger.info(f"Added missing column {table.name}.{column.name}")
+
+    return added
+
+
+def create_missing_indexes(tables=None, engine=None, concurrently=False):
+    """
+    Create the indexes declared on the models that do not exist in the database yet
+
+    Args:
+        tables (list, optional): Tables to check, defaults to every model table
+        engine (Engine, optional): Engine to use, defaults to db.engine
+        concurrently (bool): On PostgreSQL, build with CREATE INDEX CONCURRENTLY
+            so writes to the table are not blocked while the index builds
+
+    Returns:
+        list: Names of the indexes that were created
+    """
+    engine = engine or db.engine
+    tables = tables if tables is not None else db.metadata.sorted_tables
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    concurrently = concurrently and engine.dialect.name == 'postgresql'
+
+    created = []
+    for table in tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+
+            if concurrently:
+                # CONCURRENTLY cannot run inside a transaction block
+                index.dialect_kwargs['postgresql_concurrently'] = True
+                try:
+                    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        index.create(bind=conn, checkfirst=True)
+                finally:
+                    index.dialect_kwargs['postgresql_concurrently'] = False
+            else:
+                with engine.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+
+            created.append(index.name)
+            logger.info(f"Created index {index.name} on {table.name}")
+
+    return created
+
+
+def ensure_schema():
+    """Bring an existing database up to date with the models at application start"""
+    from models import DriverPerformance
+
+    add_missing_columns()
+
+    # The rollup upsert relies on its unique (driver_id, date) index
+    create_missing_indexes([DriverPerformance.__table__])
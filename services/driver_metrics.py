@@ -0,0 +1,146 @@
+import numpy as np
+from datetime import datetime, timedelta
+from app import db
+from models import Load
+
+# Load timestamp columns, in the order they are fetched
+TIMESTAMP_COLUMNS = (
+    'scheduled_pickup_time',
+    'actual_pickup_arrival',
+    'scheduled_delivery_time',
+    'actual_delivery_arrival'
+)
+
+ONE_MINUTE = np.timedelta64(1, 'm')
+
+
+def _to_datetime64(values):
+    """Convert datetimes (None allowed) to a datetime64[s] array with NaT for missing values"""
+    return np.array([np.datetime64(value, 's') if value else np.datetime64('NaT') for value in values],
+                    dtype='datetime64[s]')
+
+
+class LoadColumns:
+    """
+    A set of loads held as columnar timestamp arrays
+
+    Missing timestamps are NaT, and every comparison against NaT is False, which
+    matches Load.pickup_on_time/delivery_on_time returning None for unarrived loads.
+    """
+
+    def __init__(self, scheduled_pickup, actual_pickup, scheduled_delivery, actual_delivery):
+        self.scheduled_pickup = scheduled_pickup
+        self.actual_pickup = actual_pickup
+        self.scheduled_delivery = scheduled_delivery
+        self.actual_delivery = actual_delivery
+
+    def __len__(self):
+        return len(self.scheduled_pickup)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the columns from (scheduled_pickup, actual_pickup, scheduled_delivery, actual_delivery) rows
+
+        Args:
+            rows (iterable): Row tuples in TIMESTAMP_COLUMNS order
+
+        Returns:
+            LoadColumns: Columnar view of the rows
+        """
+        rows = list(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(TIMESTAMP_COLUMNS)
+        return cls(*(_to_datetime64(column) for column in columns))
+
+    @classmethod
+    def for_driver(cls, driver_id, start_date=None, end_date=None):
+        """
+        Fetch a driver's load timestamps in one query, filtered by scheduled pickup day
+
+        Args:
+            driver_id (int): Driver to fetch
+            start_date (date, optional): First scheduled pickup day
+            end_date (date, optional): Last scheduled pickup day
+
+        Returns:
+            LoadColumns: The driver's loads
+        """
+        query = db.session.query(*(getattr(Load, name) for name in TIMESTAMP_COLUMNS)).filter(
+            Load.driver_id == driver_id
+        )
+        if start_date:
+            query = query.filter(Load.scheduled_pickup_time >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            query = query.filter(Load.scheduled_pickup_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+        return cls.from_rows(query.all())
+
+
+def weekly_windows(start_date, weeks):
+    """
+    Consecutive seven-day windows starting at start_date
+
+    Args:
+        start_date (date): First day of the first week
+        weeks (int): Number of weeks
+
+    Returns:
+        dict: "Week N" -> (week_start, week_end) with inclusive bounds
+    """
+    return {
+        f"Week {week + 1}": (start_date + timedelta(weeks=week), start_date + timedelta(weeks=week, days=6))
+        for week in range(weeks)
+    }
+
+
+def compute_metrics(columns, windows):
+    """
+    Compute load metrics for any number of date windows in one vectorized pass
+
+    Loads are attributed to their scheduled pickup day, as in the daily rollups.
+    A load is on time when both pickup and delivery arrived at or before schedule;
+    the average delay is taken over every late pickup and late delivery.
+
+    Args:
+        columns (LoadColumns): Loads to measure
+        windows (dict): Name -> (start_date, end_date), inclusive; either bound may be None
+
+    Returns:
+        dict: Name -> loads, on_time_loads, on_time_percentage and avg_delay
+    """
+    names = list(windows)
+    if not names:
+        return {}
+
+    day = columns.scheduled_pickup.astype('datetime64[D]')
+
+    pickup_delay = (columns.actual_pickup - columns.scheduled_pickup) / ONE_MINUTE
+    delivery_delay = (columns.actual_delivery - columns.scheduled_delivery) / ONE_MINUTE
+    pickup_late = pickup_delay > 0
+    delivery_late = delivery_delay > 0
+
+    on_time = (columns.actual_pickup <= columns.scheduled_pickup) & \
+        (columns.actual_delivery <= columns.scheduled_delivery)
+    delay_minutes = np.where(pickup_late, pickup_delay, 0.0) + np.where(delivery_late, delivery_delay, 0.0)
+    delay_count = pickup_late.astype(np.int64) + delivery_late.astype(np.int64)
+
+    # One row per window, one column per load
+    starts = np.array([np.datetime64(start or '0001-01-01', 'D') for start, _ in windows.values()])
+    ends = np.array([np.datetime64(end or '9999-12-31', 'D') for _, end in windows.values()])
+    in_window = (day >= starts[:, None]) & (day <= ends[:, None])
+
+    loads = in_window.sum(axis=1)
+    on_time_loads = in_window @ on_time.astype(np.int64)
+    total_delay = in_window @ delay_minutes
+    delays = in_window @ delay_count
+
+    results = {}
+    for i, name in enumerate(names):
+        total = int(loads[i])
+        avg_delay = total_delay[i] / delays[i] if delays[i] > 0 else 0
+        results[name] = {
+            'loads': total,
+            'on_time_loads': int(on_time_loads[i]),
+            'on_time_percentage': round(float(on_time_loads[i] / total * 100), 1) if total > 0 else 0,
+            'avg_delay': round(float(avg_delay), 1)
+        }
+    return results
@@ -0,0 +1,171 @@
+import html
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 30))
+MAIL_FROM = os.environ.get('MAIL_FROM', 'dispatch@hitchedlogistics.com')
+
+# Most providers cap messages per connection; reconnect before hitting the limit
+MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))
+
+# Placeholders left in the rendered report and filled in per recipient
+RECIPIENT_NAME = '%%RECIPIENT_NAME%%'
+RECIPIENT_COMPANY = '%%RECIPIENT_COMPANY%%'
+
+
+def personalize(body, recipient, escape=False):
+    """
+    Fill the recipient placeholders of a report rendered once for the whole broadcast
+
+    Args:
+        body (str): Rendered HTML or plain text
+        recipient: Object with name and company attributes
+        escape (bool): HTML-escape the substituted values
+
+    Returns:
+        str: Body for this recipient
+    """
+    name = recipient.name or 'there'
+    company = recipient.company or ''
+    if escape:
+        name, company = html.escape(name), html.escape(company)
+    return body.replace(RECIPIENT_NAME, name).replace(RECIPIENT_COMPANY, company)
+
+
+def build_message(subject, html_body, text_body, recipient, sender=MAIL_FROM):
+    """Personalized multipart/alternative message for one recipient"""
+    message = MIMEMultipart('alternative')
+    message['Subject'] = subject
+    message['From'] = sender
+    message['To'] = formataddr((recipient.name or '', recipient.email))
+    message.attach(MIMEText(personalize(text_body, recipient), 'plain', 'utf-8'))
+    message.attach(MIMEText(personalize(html_body, recipient, escape=True), 'html', 'utf-8'))
+    return message
+
+
+class RateLimiter:
+    """Spaces calls so no more than `rate` happen per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self.interval
+
+
+class SMTPSender:
+    """
+    A reusable SMTP connection
+
+    The connection is opened on first use and kept open across messages and
+    batches. It is recycled after MAX_MESSAGES_PER_CONNECTION messages, reopened
+    once if the server drops it, and closed after sitting idle.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, use_tls=None,
+                 timeout=SMTP_TIMEOUT, max_messages=MAX_MESSAGES_PER_CONNECTION):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.username = username if username is not None else SMTP_USERNAME
+        self.password = password if password is not None else SMTP_PASSWORD
+        self.use_tls = SMTP_USE_TLS if use_tls is None else use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self._connection = None
+        self._sent_on_connection = 0
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        connection.ehlo()
+        if self.use_tls:
+            connection.starttls()
+            connection.ehlo()
+        if self.username:
+            connection.login(self.username, self.password)
+        self._connection = connection
+        self._sent_on_connection = 0
+        self.connections_opened += 1
+        return connection
+
+    def _connection_for_send(self):
+        if self._connection is not None and self._sent_on_connection >= self.max_messages:
+            self._close()
+        return self._connection or self._connect()
+
+    def send(self, message, recipient_email):
+        """
+        Send one message over the shared connection
+
+        Raises:
+            smtplib.SMTPException, OSError: When the message could not be sent
+        """
+        with self._lock:
+            try:
+                self._connection_for_send().send_message(message, to_addrs=[recipient_email])
+            except smtplib.SMTPServerDisconnected:
+                # The server closed an idle or recycled connection; retry once on a fresh one
+                self._connection = None
+                self._connect().send_message(message, to_addrs=[recipient_email])
+            self._sent_on_connection += 1
+
+    def _close(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._connection = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+def send_batch(sender, subject, html_body, text_body, recipients, rate_limiter=None):
+    """
+    Personalize and send a report to a batch of recipients over one connection
+
+    Args:
+        sender (SMTPSender): Connection to send through
+        subject (str): Message subject
+        html_body (str): HTML report rendered once with the recipient placeholders
+        text_body (str): Plain text report rendered once with the recipient placeholders
+        recipients (iterable): Objects with id, email, name and company attributes
+        rate_limiter (RateLimiter, optional): Throttle applied before each message
+
+    Returns:
+        dict: recipient id -> None when sent, or the error message when it failed
+    """
+    results = {}
+    for recipient in recipients:
+        if rate_limiter:
+            rate_limiter.wait()
+        try:
+            sender.send(build_message(subject, html_body, text_body, recipient), recipient.email)
+            results[recipient.id] = None
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning(f"Failed to send availability email to {recipient.email}: {e}")
+            results[recipient.id] = str(e) or e.__class__.__name__
+    return results
@@ -0,0 +1,84 @@
+import os
+from datetime import datetime
+from services.ttl_cache import TTLCache
+
+# Entries live for ETA_CACHE_TTL seconds; traffic shifts within the time-of-day bucket are tolerated
+DEFAULT_TTL = int(os.environ.get('ETA_CACHE_TTL', 300))
+MAX_ENTRIES = int(os.environ.get('ETA_CACHE_MAX_ENTRIES', 2048))
+
+# Precision 6 is a cell of roughly 1.2 km x 0.6 km, about the size of a yard or a few blocks
+GEOHASH_PRECISION = int(os.environ.get('ETA_CACHE_GEOHASH_PRECISION', 6))
+TIME_BUCKET_MINUTES = int(os.environ.get('ETA_CACHE_BUCKET_MINUTES', 30))
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Encode a coordinate as a geohash
+
+    Args:
+        lat (float): Latitude in degrees
+        lng (float): Longitude in degrees
+        precision (int): Number of characters
+
+    Returns:
+        str: Geohash of the cell containing the point
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def eta_cache_key(origin_lat, origin_lng, dest_address, now=None):
+    """
+    Cache key for an ETA: origin cell, normalized destination and time-of-day bucket
+
+    Args:
+        origin_lat (float): Origin latitude
+        origin_lng (float): Origin longitude
+        dest_address (str): Destination address
+        now (datetime, optional): Time of the lookup, defaults to utcnow
+
+    Returns:
+        tuple: Hashable cache key
+    """
+    now = now or datetime.utcnow()
+    bucket = (now.hour * 60 + now.minute) // TIME_BUCKET_MINUTES
+    destination = ' '.join(str(dest_address).lower().split())
+    return (geohash(float(origin_lat), float(origin_lng)), destination, bucket)
+
+
+class EtaCache(TTLCache):
+    """In-process LRU of ETA results with a per-entry TTL and hit-rate counters"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=DEFAULT_TTL):
+        super().__init__(max_entries, ttl)
+
+    def stats(self):
+        stats = super().stats()
+        stats['geohash_precision'] = GEOHASH_PRECISION
+        stats['time_bucket_minutes'] = TIME_BUCKET_MINUTES
+        return stats
+
+
+eta_cache = EtaCache()
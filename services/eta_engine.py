@@ -0,0 +1,274 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import aliased
+from app import app, db
+from models import Load, LocationUpdate, Vehicle, Facility
+from services.eta_model import great_circle_miles, estimate_hours, with_rest_breaks, MIN_MOVING_MPH
+
+logger = logging.getLogger(__name__)
+
+# Estimates below this confidence are checked against Google when it is reachable
+CONFIDENCE_THRESHOLD = float(os.environ.get('ETA_CONFIDENCE_THRESHOLD', 0.35))
+
+# Upper bound on Google lookups per refresh, so a cold start cannot burn the quota
+MAX_GOOGLE_LOOKUPS = int(os.environ.get('ETA_MAX_GOOGLE_LOOKUPS', 100))
+
+# Breadcrumbs this recent feed the recent speed; positions older than the max age are not used
+RECENT_WINDOW = timedelta(minutes=60)
+POSITION_MAX_AGE = timedelta(hours=6)
+
+# Lane speeds come from loads delivered in this window and are recomputed this often
+LANE_HISTORY_DAYS = 180
+LANE_CACHE_SECONDS = 3600
+MIN_LANE_SAMPLES = 3
+
+# Stored ETAs within this of the new estimate are left alone, so frequent refreshes do not rewrite every load
+MIN_ETA_CHANGE = timedelta(minutes=int(os.environ.get('ETA_MIN_CHANGE_MINUTES', 2)))
+
+
+def _lane_rows(since):
+    pickup = aliased(Facility)
+    delivery = aliased(Facility)
+    return db.session.query(
+        Load.pickup_facility_id, Load.delivery_facility_id,
+        pickup.state, delivery.state,
+        pickup.lat, pickup.lng, delivery.lat, delivery.lng,
+        Load.actual_pickup_departure, Load.actual_delivery_arrival
+    ).join(pickup, pickup.id == Load.pickup_facility_id).join(
+        delivery, delivery.id == Load.delivery_facility_id
+    ).filter(
+        Load.status == 'delivered',
+        Load.actual_delivery_arrival >= since,
+        Load.actual_pickup_departure.isnot(None),
+        Load.actual_delivery_arrival > Load.actual_pickup_departure,
+        pickup.lat.isnot(None), delivery.lat.isnot(None)
+    ).all()
+
+
+def compute_lane_speeds(now=None):
+    """
+    Historical door-to-door speed per lane from delivered loads
+
+    A lane is a (pickup facility, delivery facility) pair; state pairs are kept
+    as a coarser fallback. Speed is great-circle miles over the time from pickup
+    departure to delivery arrival, so stops and breaks are already included.
+
+    Returns:
+        dict: Lane key -> (mean mph, sample count), for lanes with at least MIN_LANE_SAMPLES loads
+    """
+    now = now or datetime.utcnow()
+    rows = _lane_rows(now - timedelta(days=LANE_HISTORY_DAYS))
+    if not rows:
+        return {}
+
+    columns = list(zip(*rows))
+    miles = great_circle_miles(columns[4], columns[5], columns[6], columns[7])
+    hours = np.array([(arrival - departure).total_seconds() / 3600
+                      for departure, arrival in zip(columns[8], columns[9])])
+    speeds = miles / hours
+
+    samples = defaultdict(list)
+    for row, speed in zip(rows, speeds):
+        if not 0 < speed < 80:
+            continue
+        samples[('facility', row[0], row[1])].append(speed)
+        if row[2] and row[3]:
+            samples[('state', row[2], row[3])].append(speed)
+
+    return {key: (float(np.mean(values)), len(values))
+            for key, values in samples.items() if len(values) >= MIN_LANE_SAMPLES}
+
+
+class LaneSpeeds:
+    """Per-worker cache of compute_lane_speeds, refreshed every LANE_CACHE_SECONDS"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._speeds = None
+        self._built_at = 0
+
+    def get(self):
+        with self._lock:
+            if self._speeds is None or time.monotonic() - self._built_at > LANE_CACHE_SECONDS:
+                self._speeds = compute_lane_speeds()
+                self._built_at = time.monotonic()
+            return self._speeds
+
+
+lane_speeds = LaneSpeeds()
+
+
+def _in_transit_loads():
+    pickup = aliased(Facility)
+    delivery = aliased(Facility)
+    return db.session.query(
+        Load.id, Load.vehicle_id, Load.pickup_facility_id, Load.delivery_facility_id,
+        pickup.state, delivery.state, delivery.lat, delivery.lng, Load.current_eta
+    ).join(pickup, pickup.id == Load.pickup_facility_id).join(
+        delivery, delivery.id == Load.delivery_facility_id
+    ).filter(
+        Load.status == 'in_transit',
+        delivery.lat.isnot(None), delivery.lng.isnot(None)
+    ).all()
+
+
+def _latest_positions(load_ids, now):
+    """load_id -> (lat, lng, timestamp) of the newest breadcrumb within POSITION_MAX_AGE"""
+    ranked = select(
+        LocationUpdate.load_id, LocationUpdate.lat, LocationUpdate.lng, LocationUpdate.timestamp,
+        func.row_number().over(
+            partition_by=LocationUpdate.load_id,
+            order_by=(LocationUpdate.timestamp.desc(), LocationUpdate.id.desc())
+        ).label('position')
+    ).where(
+        LocationUpdate.load_id.in_(load_ids),
+        LocationUpdate.timestamp >= now - POSITION_MAX_AGE
+    ).subquery()
+    rows = db.session.execute(
+        select(ranked.c.load_id, ranked.c.lat, ranked.c.lng, ranked.c.timestamp).where(ranked.c.position == 1)
+    )
+    return {load_id: (lat, lng, timestamp) for load_id, lat, lng, timestamp in rows}
+
+
+def _recent_speeds(load_ids, now):
+    """load_id -> (mean moving mph, sample count) over RECENT_WINDOW"""
+    rows = db.session.execute(
+        select(LocationUpdate.load_id, func.avg(LocationUpdate.speed), func.count(LocationUpdate.speed)).where(
+            LocationUpdate.load_id.in_(load_ids),
+            LocationUpdate.timestamp >= now - RECENT_WINDOW,
+            LocationUpdate.speed >= MIN_MOVING_MPH
+        ).group_by(LocationUpdate.load_id)
+    )
+    return {load_id: (float(speed), count) for load_id, speed, count in rows}
+
+
+def _vehicle_positions(vehicle_ids, now):
+    """vehicle_id -> (lat, lng, last_updated) for fixes within POSITION_MAX_AGE"""
+    rows = db.session.query(Vehicle.id, Vehicle.current_lat, Vehicle.current_lng, Vehicle.last_updated).filter(
+        Vehicle.id.in_(vehicle_ids),
+        Vehicle.current_lat.isnot(None),
+        Vehicle.last_updated >= now - POSITION_MAX_AGE
+    )
+    return {vehicle_id: (lat, lng, updated) for vehicle_id, lat, lng, updated in rows}
+
+
+def _google_available():
+    from services.google_maps_api import GOOGLE_MAPS_API_KEY
+    return bool(GOOGLE_MAPS_API_KEY) and not app.config.get('SAFE_MODE')
+
+
+def _google_hours(loads, positions, indices):
+    """
+    Google driving hours (with rest breaks) for the given loads, grouped by destination
+
+    Returns:
+        dict: Index -> hours for the lookups that succeeded
+    """
+    from services.google_maps_api import get_durations
+
+    by_destination = defaultdict(list)
+    for i in indices:
+        by_destination[(loads[i][6], loads[i][7])].append(i)
+
+    hours = {}
+    for (dest_lat, dest_lng), group in by_destination.items():
+        durations = get_durations([positions[i][:2] for i in group], f"{dest_lat},{dest_lng}")
+        for i, seconds in zip(group, durations):
+            if seconds:
+                hours[i] = float(with_rest_breaks(seconds / 3600))
+    return hours
+
+
+def refresh_current_etas(now=None, use_google=True):
+    """
+    Re-estimate current_eta for every in-transit load in one pass
+
+    Positions, recent speeds and lane history are each read with one query;
+    the estimate itself is vectorized over all loads (services.eta_model).
+    Loads whose estimate has low confidence are checked against Google, up to
+    MAX_GOOGLE_LOOKUPS per run, when an API key is configured and SAFE_MODE is
+    off. ETAs that moved by at least MIN_ETA_CHANGE are written with one bulk
+    UPDATE.
+
+    The Motive poller (services.motive_poller) runs this after every poll, with
+    Google lookups at most every ETA_GOOGLE_REFRESH_SECONDS. Without the poller,
+    schedule `maintenance.py etas` instead.
+
+    Args:
+        now (datetime, optional): Reference time, defaults to utcnow
+        use_google (bool): Allow Google lookups for low-confidence loads
+
+    Returns:
+        dict: Counts of loads considered, updated, estimated locally and from Google,
+            loads whose ETA did not move enough to write, and loads skipped for lack of a position
+    """
+    now = now or datetime.utcnow()
+    loads = _in_transit_loads()
+    if not loads:
+        return {'loads': 0, 'updated': 0, 'local': 0, 'google': 0, 'unchanged': 0, 'no_position': 0}
+
+    load_ids = [load[0] for load in loads]
+    breadcrumbs = _latest_positions(load_ids, now)
+    speeds = _recent_speeds(load_ids, now)
+    vehicles = _vehicle_positions({load[1] for load in loads if load[1] and load[0] not in breadcrumbs}, now)
+    lanes = lane_speeds.get()
+
+    # Keep only loads with a usable position, preferring their own breadcrumbs
+    located = []
+    positions = []
+    for load in loads:
+        position = breadcrumbs.get(load[0]) or vehicles.get(load[1])
+        if position:
+            located.append(load)
+            positions.append(position)
+    if not located:
+        return {'loads': len(loads), 'updated': 0, 'local': 0, 'google': 0, 'unchanged': 0,
+                'no_position': len(loads)}
+
+    count = len(located)
+    remaining = great_circle_miles(
+        [position[0] for position in positions], [position[1] for position in positions],
+        [load[6] for load in located], [load[7] for load in located]
+    )
+    recent_mph = np.full(count, np.nan)
+    recent_samples = np.zeros(count)
+    lane_mph = np.full(count, np.nan)
+    lane_samples = np.zeros(count)
+    age_minutes = np.empty(count)
+    for i, (load, position) in enumerate(zip(located, positions)):
+        if load[0] in speeds:
+            recent_mph[i], recent_samples[i] = speeds[load[0]]
+        lane = lanes.get(('facility', load[2], load[3])) or lanes.get(('state', load[4], load[5]))
+        if lane:
+            lane_mph[i], lane_samples[i] = lane
+        age_minutes[i] = (now - position[2]).total_seconds() / 60
+
+    hours, confidence = estimate_hours(remaining, recent_mph, recent_samples, lane_mph, lane_samples, age_minutes)
+
+    google = {}
+    if use_google and _google_available():
+        low = [int(i) for i in np.argsort(confidence) if confidence[i] < CONFIDENCE_THRESHOLD][:MAX_GOOGLE_LOOKUPS]
+        if low:
+            google = _google_hours(located, positions, low)
+
+    # Project from the position's timestamp, not from now, so stale fixes are not pushed later
+    mappings = []
+    for i, (load, position) in enumerate(zip(located, positions)):
+        eta = max(position[2] + timedelta(hours=google.get(i, float(hours[i]))), now).replace(microsecond=0)
+        if load[8] is None or abs(eta - load[8]) >= MIN_ETA_CHANGE:
+            mappings.append({'id': load[0], 'current_eta': eta})
+
+    if mappings:
+        db.session.execute(update(Load), mappings)
+        db.session.commit()
+
+    logger.info(f"Refreshed ETAs for {len(mappings)} of {len(loads)} in-transit loads "
+                f"({len(google)} from Google)")
+    return {'loads': len(loads), 'updated': len(mappings), 'local': count - len(google),
+            'google': len(google), 'unchanged': count - len(mappings), 'no_position': len(loads) - count}
@@ -0,0 +1,108 @@
+"""
+Vectorized ETA estimation from remaining distance and observed speeds
+
+Kept free of database and app imports so it can be benchmarked and tested offline.
+"""
+import os
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Road miles per great-circle mile on typical US freight lanes
+ROAD_CIRCUITY = float(os.environ.get('ETA_ROAD_CIRCUITY', 1.2))
+
+# Effective door-to-door speed when there is no other evidence; includes stops
+DEFAULT_EFFECTIVE_MPH = float(os.environ.get('ETA_DEFAULT_EFFECTIVE_MPH', 45))
+
+# Hours-of-service: after this much driving a 10 hour break is due
+MAX_DRIVING_HOURS = 11
+REST_HOURS = 10
+
+# Plausible moving speeds; anything outside is treated as noise
+MIN_MOVING_MPH = 5
+MAX_MOVING_MPH = 85
+
+# Recent speed matters for the next few hours; its weight halves roughly every this many miles
+RECENT_SPEED_HORIZON_MILES = 150
+
+# Evidence needed before recent speeds or lane history carry half their full weight
+RECENT_SAMPLES_HALF_WEIGHT = 5
+LANE_SAMPLES_HALF_WEIGHT = 3
+
+# Weight of the default speed, acting as a prior
+PRIOR_WEIGHT = 0.5
+
+# Position age at which confidence has dropped to about a third
+POSITION_AGE_SCALE_MINUTES = 30
+
+# Within this distance the ETA is dominated by the last few miles and trusted
+ARRIVING_MILES = 5
+
+
+def great_circle_miles(lat1, lng1, lat2, lng2):
+    """Vectorized haversine distance in miles"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def with_rest_breaks(driving_hours):
+    """Driving hours plus the hours-of-service breaks needed along the way"""
+    driving_hours = np.asarray(driving_hours, dtype=float)
+    breaks = np.floor(np.maximum(driving_hours - 1e-9, 0) / MAX_DRIVING_HOURS)
+    return driving_hours + breaks * REST_HOURS
+
+
+def estimate_hours(remaining_miles, recent_mph, recent_samples, lane_mph, lane_samples, position_age_minutes):
+    """
+    Hours to destination and a confidence score for many loads at once
+
+    Three speed estimates are blended, each weighted by how much evidence backs it:
+    recent moving speed from the load's breadcrumbs (plus rest breaks), which
+    matters most close in; the lane's historical door-to-door speed; and a default
+    effective speed acting as a prior. Confidence is the share of weight carried
+    by real evidence, discounted by the age of the last position.
+
+    Args:
+        remaining_miles (array-like): Great-circle miles to destination
+        recent_mph (array-like): Mean recent moving speed, NaN when unknown
+        recent_samples (array-like): Number of speed samples behind recent_mph
+        lane_mph (array-like): Historical lane speed in great-circle miles per hour, NaN when unknown
+        lane_samples (array-like): Number of past loads behind lane_mph
+        position_age_minutes (array-like): Age of the position used
+
+    Returns:
+        tuple: (hours, confidence) numpy arrays; confidence is in [0, 1]
+    """
+    remaining_miles = np.asarray(remaining_miles, dtype=float)
+    road_miles = remaining_miles * ROAD_CIRCUITY
+    recent_mph = np.asarray(recent_mph, dtype=float)
+    lane_mph = np.asarray(lane_mph, dtype=float)
+    recent_samples = np.asarray(recent_samples, dtype=float)
+    lane_samples = np.asarray(lane_samples, dtype=float)
+    position_age_minutes = np.asarray(position_age_minutes, dtype=float)
+
+    recent_known = np.isfinite(recent_mph) & (recent_mph >= MIN_MOVING_MPH) & (recent_mph <= MAX_MOVING_MPH)
+    lane_known = np.isfinite(lane_mph) & (lane_mph > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recent_hours = np.where(recent_known, with_rest_breaks(road_miles / np.where(recent_known, recent_mph, 1)), 0)
+        # Lane speeds are measured over great-circle miles, so they already account for circuity
+        lane_hours = np.where(lane_known, remaining_miles / np.where(lane_known, lane_mph, 1), 0)
+    prior_hours = road_miles / DEFAULT_EFFECTIVE_MPH
+
+    recent_weight = np.where(
+        recent_known,
+        recent_samples / (recent_samples + RECENT_SAMPLES_HALF_WEIGHT)
+        * np.exp2(-road_miles / RECENT_SPEED_HORIZON_MILES),
+        0
+    )
+    lane_weight = np.where(lane_known, lane_samples / (lane_samples + LANE_SAMPLES_HALF_WEIGHT), 0)
+    total_weight = recent_weight + lane_weight + PRIOR_WEIGHT
+
+    hours = (recent_weight * recent_hours + lane_weight * lane_hours + PRIOR_WEIGHT * prior_hours) / total_weight
+
+    evidence = (recent_weight + lane_weight) / total_weight
+    freshness = np.exp(-np.maximum(position_age_minutes, 0) / POSITION_AGE_SCALE_MINUTES)
+    confidence = np.where(road_miles <= ARRIVING_MILES * ROAD_CIRCUITY, freshness, evidence * freshness)
+    return hours, confidence
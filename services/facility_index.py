@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from sqlalchemy import event, select
+from app import db
+from models import Facility, CacheGeneration
+from services.spatial_index import GridIndex
+from services.geofencing import calculate_distance
+from services.polygons import points_in_encoded_polygon
+from services.response_cache import current_generation, bump_generation
+
+logger = logging.getLogger(__name__)
+
+FACILITY_NAMESPACE = 'facilities'
+
+# About 3.5 miles; fences are fractions of a mile, so most lookups touch one to four cells
+CELL_DEGREES = 0.05
+
+# How often to check whether another worker changed a facility
+GENERATION_CHECK_SECONDS = 5
+
+
+def _fence(facility):
+    fence = {
+        'id': facility.id,
+        'name': facility.name,
+        'lat': facility.lat,
+        'lng': facility.lng,
+        'geofence_radius': facility.geofence_radius or 0.2,
+        'city': facility.city,
+        'state': facility.state,
+        'geofence_polygon': facility.geofence_polygon
+    }
+    if facility.geofence_polygon:
+        fence['geofence_bbox'] = (facility.geofence_min_lat, facility.geofence_min_lng,
+                                  facility.geofence_max_lat, facility.geofence_max_lng)
+    return fence
+
+
+def _reach(fence):
+    """Farthest a point inside the fence can be from the facility center, in miles"""
+    if not fence['geofence_polygon']:
+        return fence['geofence_radius']
+    min_lat, min_lng, max_lat, max_lng = fence['geofence_bbox']
+    return max(calculate_distance(fence['lat'], fence['lng'], lat, lng)
+               for lat in (min_lat, max_lat) for lng in (min_lng, max_lng))
+
+
+class FacilityIndex:
+    """
+    Per-worker grid index of facility geofences
+
+    Facilities written through this worker's session are re-indexed individually
+    after commit. Changes from other workers are picked up through the shared
+    'facilities' generation, which triggers a full rebuild.
+    """
+
+    def __init__(self, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._grid = None
+        self._max_radius = 0
+        self._generation = None
+        self._checked_at = 0
+
+    def _rebuild(self, generation):
+        grid = GridIndex(self.cell_degrees)
+        max_radius = 0
+        for facility in Facility.query.filter(Facility.lat.isnot(None), Facility.lng.isnot(None)):
+            fence = _fence(facility)
+            grid.insert(facility.id, fence['lat'], fence['lng'], fence)
+            max_radius = max(max_radius, _reach(fence))
+        self._grid = grid
+        self._max_radius = max_radius
+        self._generation = generation
+        logger.info(f"Built facility index with {len(grid)} geofences")
+
+    def _current(self):
+        """The grid, rebuilt first when another worker has changed a facility"""
+        with self._lock:
+            if self._grid is None or time.monotonic() - self._checked_at > GENERATION_CHECK_SECONDS:
+                generation = current_generation(FACILITY_NAMESPACE)
+                self._checked_at = time.monotonic()
+                if self._grid is None or generation != self._generation:
+                    self._rebuild(generation)
+            return self._grid
+
+    def refresh(self, facility_ids):
+        """
+        Re-index individual facilities after they were created, changed or deleted
+
+        Args:
+            facility_ids (iterable): IDs of the facilities to re-read
+        """
+        facility_ids = set(facility_ids)
+        with self._lock:
+            if self._grid is None:
+                return
+            # Runs from after_commit, where the session cannot emit SQL, so read on a separate connection
+            table = Facility.__table__
+            with db.engine.connect() as conn:
+                rows = conn.execute(select(table).where(table.c.id.in_(facility_ids))).all()
+                generation = conn.execute(
+                    select(CacheGeneration.generation).where(CacheGeneration.name == FACILITY_NAMESPACE)
+                ).scalar() or 0
+            facilities = {row.id: row for row in rows}
+            for facility_id in facility_ids:
+                facility = facilities.get(facility_id)
+                if facility is None or facility.lat is None or facility.lng is None:
+                    self._grid.remove(facility_id)
+                    continue
+                fence = _fence(facility)
+                self._grid.insert(facility_id, fence['lat'], fence['lng'], fence)
+                self._max_radius = max(self._max_radius, _reach(fence))
+
+            # Anything other than our own bump means another worker changed facilities too
+            if generation == (self._generation or 0) + 1:
+                self._generation = generation
+            else:
+                self._grid = None
+
+    def invalidate(self):
+        """Drop the grid so the next lookup rebuilds it"""
+        with self._lock:
+            self._grid = None
+
+    def containing(self, lat, lng):
+        """
+        Geofences that contain a point, nearest center first
+
+        Args:
+            lat (float): Latitude
+            lng (float): Longitude
+
+        Returns:
+            list: (distance_miles, fence dict) tuples
+        """
+        grid = self._current()
+        results = []
+        # Only centers within the widest fence's reach can contain the point
+        for fence_lat, fence_lng, fence in grid.candidates(*grid.bounding_box(lat, lng, self._max_radius)):
+            distance = calculate_distance(lat, lng, fence_lat, fence_lng)
+            if fence['geofence_polygon']:
+                inside = points_in_encoded_polygon([lat], [lng], fence['geofence_polygon'], fence['geofence_bbox'])[0]
+            else:
+                inside = distance <= fence['geofence_radius']
+            if inside:
+                results.append((distance, fence))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest(self, lat, lng, max_miles=None):
+        """
+        The facility whose center is closest to a point
+
+        Returns:
+            tuple: (distance_miles, fence dict), or None
+        """
+        return self._current().nearest(lat, lng, max_miles)
+
+
+facility_index = FacilityIndex()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_facility_writes(session, flush_context):
+    changed = {obj.id for obj in session.new | session.dirty | session.deleted if isinstance(obj, Facility)}
+    if changed:
+        session.info.setdefault('facility_index_changed', set()).update(changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _refresh_after_commit(session):
+    changed = session.info.pop('facility_index_changed', None)
+    if not changed:
+        return
+    bump_generation(FACILITY_NAMESPACE)
+    try:
+        facility_index.refresh(changed)
+    except Exception as e:
+        # The next lookup rebuilds from scratch instead
+        logger.error(f"Failed to refresh facility index: {e}")
+        facility_index.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('facility_index_changed', None)
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, and_, inspect
+from app import db
+from models import Driver, Load, Facility, Vehicle
+from services.spatial_index import GridIndex
+from services.response_cache import current_generation, bump_generation
+
+FLEET_NAMESPACE = 'fleet'
+
+# Planning speed used to turn deadhead miles into hours
+AVERAGE_SPEED_MPH = float(os.environ.get('FLEET_AVERAGE_SPEED_MPH', 50))
+
+# A vehicle GPS fix older than this is ignored in favour of the last delivery facility
+VEHICLE_POSITION_MAX_AGE = timedelta(hours=2)
+
+# Vehicle fixes age past VEHICLE_POSITION_MAX_AGE without any write, so the index is also rebuilt on a timer
+INDEX_TTL_SECONDS = int(os.environ.get('FLEET_INDEX_TTL', 60))
+
+# Attributes truck_positions reads; writes to anything else leave the 'fleet' generation alone
+FLEET_FIELDS = {
+    Load: ('status', 'driver_id', 'vehicle_id', 'delivery_facility_id', 'scheduled_delivery_time',
+           'reference_number'),
+    Driver: ('status', 'name', 'phone'),
+    Facility: ('lat', 'lng', 'city', 'state'),
+    Vehicle: ('current_lat', 'current_lng', 'last_updated')
+}
+
+
+def _latest_load_ranking():
+    """Subquery numbering each active driver's loads from the latest scheduled delivery down"""
+    return db.session.query(
+        Load.id.label('load_id'),
+        Load.driver_id.label('driver_id'),
+        func.row_number().over(
+            partition_by=Load.driver_id,
+            order_by=(Load.scheduled_delivery_time.desc(), Load.id.desc())
+        ).label('position')
+    ).join(Driver, Driver.id == Load.driver_id).filter(
+        Driver.status == 'active'
+    ).subquery()
+
+
+def latest_loads_query():
+    """
+    Each active driver with their most recent load and its delivery facility
+
+    The latest load per driver (by scheduled delivery time) is picked with
+    ROW_NUMBER() and outer-joined, so drivers without loads are included and the
+    whole fleet comes back in one query.
+
+    Returns:
+        Query: (Driver, Load or None, Facility or None) rows ordered by driver id
+    """
+    ranked = _latest_load_ranking()
+
+    return db.session.query(Driver, Load, Facility).filter(
+        Driver.status == 'active'
+    ).outerjoin(
+        ranked, and_(ranked.c.driver_id == Driver.id, ranked.c.position == 1)
+    ).outerjoin(
+        Load, Load.id == ranked.c.load_id
+    ).outerjoin(
+        Facility, Facility.id == Load.delivery_facility_id
+    ).order_by(Driver.id)
+
+
+def build_fleet_status(upcoming_date_format='%m/%d/%Y', upcoming_status='Available Soon'):
+    """
+    Split the active fleet into trucks available now and trucks available after delivery
+
+    Args:
+        upcoming_date_format (str): strftime format for an in-transit truck's availability
+        upcoming_status (str): Status label for in-transit trucks
+
+    Returns:
+        dict: available_now, upcoming_availability, their totals and report_date
+    """
+    available_trucks = []
+    upcoming_availability = []
+    today = datetime.now().strftime('%m/%d/%Y')
+
+    for driver, latest_load, delivery_facility in latest_loads_query():
+        if not latest_load:
+            # Driver has no loads - available immediately
+            available_trucks.append({
+                'driver_name': driver.name,
+                'truck_info': f"Driver: {driver.name}",
+                'current_location': "Available for dispatch",
+                'available_date': today,
+                'contact_info': driver.phone or "Contact dispatch",
+                'status': 'Available Now'
+            })
+        elif latest_load.status == 'delivered':
+            # Recently delivered - available now
+            location = "Location TBD"
+            if delivery_facility:
+                location = f"{delivery_facility.city}, {delivery_facility.state}"
+
+            available_trucks.append({
+                'driver_name': driver.name,
+                'truck_info': f"Driver: {driver.name}",
+                'current_location': location,
+                'available_date': today,
+                'contact_info': driver.phone or "Contact dispatch",
+                'status': 'Available Now'
+            })
+        elif latest_load.status == 'in_transit' and latest_load.scheduled_delivery_time:
+            # In transit - will be available after delivery
+            location = "En route"
+            if delivery_facility:
+                location = f"Delivering to {delivery_facility.city}, {delivery_facility.state}"
+
+            upcoming_availability.append({
+                'driver_name': driver.name,
+                'truck_info': f"Driver: {driver.name}",
+                'current_location': location,
+                'available_date': latest_load.scheduled_delivery_time.strftime(upcoming_date_format),
+                'contact_info': driver.phone or "Contact dispatch",
+                'status': upcoming_status
+            })
+
+    return {
+        'available_now': available_trucks,
+        'upcoming_availability': upcoming_availability,
+        'total_available': len(available_trucks),
+        'total_upcoming': len(upcoming_availability),
+        'report_date': datetime.now().strftime('%B %d, %Y')
+    }
+
+
+def truck_positions(now=None):
+    """
+    Where and when each active truck becomes available
+
+    A truck whose latest load is delivered is available now, at its live vehicle
+    position when that is recent, otherwise at the delivery facility. A truck in
+    transit becomes available at the delivery facility at the scheduled delivery
+    time. Drivers without any known position are left out.
+
+    Args:
+        now (datetime, optional): Reference time, defaults to utcnow
+
+    Returns:
+        list: Dicts with driver, position, position source and available_at
+    """
+    now = now or datetime.utcnow()
+    ranked = _latest_load_ranking()
+
+    rows = db.session.query(Driver, Load, Facility, Vehicle).filter(
+        Driver.status == 'active'
+    ).join(
+        ranked, and_(ranked.c.driver_id == Driver.id, ranked.c.position == 1)
+    ).join(
+        Load, Load.id == ranked.c.load_id
+    ).outerjoin(
+        Facility, Facility.id == Load.delivery_facility_id
+    ).outerjoin(
+        Vehicle, Vehicle.id == Load.vehicle_id
+    ).filter(
+        Load.status.in_(['delivered', 'in_transit'])
+    ).all()
+
+    positions = []
+    for driver, load, facility, vehicle in rows:
+        if load.status == 'delivered':
+            available_at = now
+            if vehicle and vehicle.current_lat is not None and vehicle.current_lng is not None \
+                    and vehicle.last_updated and now - vehicle.last_updated <= VEHICLE_POSITION_MAX_AGE:
+                lat, lng, source = vehicle.current_lat, vehicle.current_lng, 'vehicle'
+            elif facility and facility.lat is not None and facility.lng is not None:
+                lat, lng, source = facility.lat, facility.lng, 'last_delivery'
+            else:
+                continue
+        elif load.scheduled_delivery_time and facility and facility.lat is not None and facility.lng is not None:
+            available_at = load.scheduled_delivery_time
+            lat, lng, source = facility.lat, facility.lng, 'delivery_destination'
+        else:
+            continue
+
+        positions.append({
+            'driver_id': driver.id,
+            'driver_name': driver.name,
+            'contact_info': driver.phone or "Contact dispatch",
+            'lat': lat,
+            'lng': lng,
+            'position_source': source,
+            'location': f"{facility.city}, {facility.state}" if facility and facility.city else None,
+            'load_reference': load.reference_number,
+            'available_at': available_at
+        })
+    return positions
+
+
+class FleetIndex:
+    """
+    Per-worker grid index of truck positions
+
+    Rebuilt when the shared 'fleet' generation moves, which happens only on
+    writes that can change where or when a truck is available (see
+    FLEET_FIELDS), and on a timer.
+    """
+
+    def __init__(self, ttl=INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None
+        self._generation = None
+        self._built_at = 0
+
+    def get(self):
+        generation = current_generation(FLEET_NAMESPACE)
+        with self._lock:
+            if self._index is None or generation != self._generation \
+                    or time.monotonic() - self._built_at > self.ttl:
+                index = GridIndex()
+                for truck in truck_positions():
+                    index.insert(truck['driver_id'], truck['lat'], truck['lng'], truck)
+                self._index = index
+                self._generation = generation
+                self._built_at = time.monotonic()
+            return self._index
+
+
+fleet_index = FleetIndex()
+
+
+def mark_fleet_changed(session):
+    """Bump the 'fleet' generation when session commits; for writes that bypass the ORM flush"""
+    session.info['fleet_index_dirty'] = True
+
+
+def _changes_fleet(obj, new_or_deleted):
+    fields = FLEET_FIELDS.get(type(obj))
+    if fields is None:
+        return False
+    if new_or_deleted:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_fleet_writes(session, flush_context):
+    if any(_changes_fleet(obj, True) for obj in session.new | session.deleted) \
+            or any(_changes_fleet(obj, False) for obj in session.dirty):
+        mark_fleet_changed(session)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop('fleet_index_dirty', False):
+        bump_generation(FLEET_NAMESPACE)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('fleet_index_dirty', None)
+
+
+def find_nearby_trucks(lat, lng, radius_miles=150, within_hours=24, limit=25, now=None):
+    """
+    Trucks available now or soon within radius_miles of a pickup
+
+    Trucks are ranked by when they could reach the pickup: the later of now and
+    their availability time, plus deadhead miles at AVERAGE_SPEED_MPH.
+
+    Args:
+        lat (float): Pickup latitude
+        lng (float): Pickup longitude
+        radius_miles (float): Maximum deadhead distance
+        within_hours (float): Only trucks available within this many hours
+        limit (int): Maximum number of trucks returned
+        now (datetime, optional): Reference time, defaults to utcnow
+
+    Returns:
+        list: Truck dicts with deadhead_miles and ready_at, best first
+    """
+    now = now or datetime.utcnow()
+    latest_available = now + timedelta(hours=within_hours)
+
+    trucks = []
+    for distance, truck in fleet_index.get().within(lat, lng, radius_miles):
+        if truck['available_at'] > latest_available:
+            continue
+        ready_at = max(now, truck['available_at']) + timedelta(hours=distance / AVERAGE_SPEED_MPH)
+        trucks.append({**truck, 'deadhead_miles': round(distance, 1), 'ready_at': ready_at})
+
+    trucks.sort(key=lambda truck: (truck['ready_at'], truck['deadhead_miles']))
+    return trucks[:limit]
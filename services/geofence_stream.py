@@ -0,0 +1,451 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import update, select, bindparam, or_, and_
+from sqlalchemy.orm import joinedload
+from app import app, db
+from models import Load
+from services.geofencing import (
+    calculate_distance, facility_polygon, apply_geofence_transition, geofence_result
+)
+from services.polygons import points_in_encoded_polygon
+from services.rollups import refresh_rollups
+from services.fleet_availability import mark_fleet_changed
+
+logger = logging.getLogger(__name__)
+
+# A ping must be this far outside a fence before it counts towards an exit
+EXIT_BUFFER_MILES = float(os.environ.get('GEOFENCE_EXIT_BUFFER_MILES', 0.1))
+
+# How long and over how many pings a vehicle must stay inside (or outside) before it counts
+MIN_DWELL_SECONDS = float(os.environ.get('GEOFENCE_MIN_DWELL_SECONDS', 120))
+MIN_EXIT_SECONDS = float(os.environ.get('GEOFENCE_MIN_EXIT_SECONDS', 60))
+MIN_CONFIRM_PINGS = int(os.environ.get('GEOFENCE_MIN_CONFIRM_PINGS', 2))
+
+# Time at a facility beyond this is detention
+DETENTION_FREE_MINUTES = float(os.environ.get('GEOFENCE_DETENTION_FREE_MINUTES', 120))
+
+# Coalesced load writes are flushed once this many loads changed or this long after the first change
+FLUSH_MAX_LOADS = int(os.environ.get('GEOFENCE_FLUSH_MAX_LOADS', 200))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get('GEOFENCE_FLUSH_INTERVAL_SECONDS', 5))
+
+# Streams without pings for this long are dropped and re-read from the database on the next ping
+STREAM_IDLE_SECONDS = 15 * 60
+
+# Vehicle -> active load assignments are re-read after this long
+VEHICLE_MAP_TTL_SECONDS = 60
+
+LOAD_FIELDS = ('status', 'actual_pickup_arrival', 'actual_pickup_departure',
+               'actual_delivery_arrival', 'actual_delivery_departure')
+
+# (facility_type, entry_exit) -> (timestamp column written, new status or None), in lifecycle order.
+# Each write only lands while the column is still NULL and the load has the status the stream saw.
+TRANSITION_WRITES = {
+    ('pickup', 'entry'): ('actual_pickup_arrival', None),
+    ('pickup', 'exit'): ('actual_pickup_departure', 'in_transit'),
+    ('delivery', 'entry'): ('actual_delivery_arrival', None),
+    ('delivery', 'exit'): ('actual_delivery_departure', 'delivered')
+}
+
+FenceSpec = namedtuple('FenceSpec', 'id name lat lng radius polygon bbox')
+
+
+def fence_spec(facility):
+    """Detached snapshot of a facility's fence, or None when it has no usable fence"""
+    if facility is None:
+        return None
+    polygon = facility_polygon(facility)
+    if not polygon and not (facility.lat and facility.lng):
+        return None
+    return FenceSpec(facility.id, facility.name, facility.lat, facility.lng,
+                     facility.geofence_radius or 0.2, *(polygon or (None, None)))
+
+
+def classify(fence, lat, lng):
+    """
+    Where a ping falls relative to a fence, with a buffer band for hysteresis
+
+    Returns:
+        bool: True inside, False clearly outside, None in the buffer band around the edge
+    """
+    if fence.polygon:
+        if points_in_encoded_polygon([lat], [lng], fence.polygon, fence.bbox)[0]:
+            return True
+        min_lat, min_lng, max_lat, max_lng = fence.bbox
+        # The band around a polygon is its bounding box grown by the buffer
+        buffer_lat = EXIT_BUFFER_MILES / 69.0
+        buffer_lng = buffer_lat / max(0.01, math.cos(math.radians(lat)))
+        near = (min_lat - buffer_lat <= lat <= max_lat + buffer_lat
+                and min_lng - buffer_lng <= lng <= max_lng + buffer_lng)
+        return None if near else False
+
+    distance = calculate_distance(lat, lng, fence.lat, fence.lng)
+    if distance <= fence.radius:
+        return True
+    return None if distance <= fence.radius + EXIT_BUFFER_MILES else False
+
+
+class FenceTracker:
+    """
+    Debounced inside/outside state for one fence
+
+    A change is only confirmed after MIN_CONFIRM_PINGS consecutive pings on the
+    new side spanning at least the minimum dwell (entry) or exit time. The
+    confirmed change is dated to the first of those pings. Pings in the buffer
+    band neither confirm nor reset a pending change.
+    """
+
+    __slots__ = ('inside', 'pending', 'pending_since', 'pending_count')
+
+    def __init__(self, inside):
+        self.inside = inside
+        self.pending = None
+        self.pending_since = None
+        self.pending_count = 0
+
+    def observe(self, membership, timestamp):
+        """
+        Feed one ping's classification
+
+        Returns:
+            datetime: Time of the confirmed change, or None when the state did not change
+        """
+        if membership is None:
+            return None
+        if membership == self.inside:
+            self.pending = None
+            return None
+
+        if self.pending != membership:
+            self.pending = membership
+            self.pending_since = timestamp
+            self.pending_count = 0
+        self.pending_count += 1
+
+        required = MIN_DWELL_SECONDS if membership else MIN_EXIT_SECONDS
+        if self.pending_count >= MIN_CONFIRM_PINGS \
+                and (timestamp - self.pending_since).total_seconds() >= required:
+            self.inside = membership
+            self.pending = None
+            return self.pending_since
+        return None
+
+
+class LoadState:
+    """The slice of a Load the state machine reads and writes, detached from the session"""
+
+    __slots__ = ('id', 'pickup_facility', 'delivery_facility') + LOAD_FIELDS
+
+    def __init__(self, load):
+        self.id = load.id
+        self.pickup_facility = fence_spec(load.pickup_facility)
+        self.delivery_facility = fence_spec(load.delivery_facility)
+        for field in LOAD_FIELDS:
+            setattr(self, field, getattr(load, field))
+
+    def values(self):
+        return tuple(getattr(self, field) for field in LOAD_FIELDS)
+
+
+def dwell_minutes(arrival, departure):
+    """(dwell, detention) in minutes between an arrival and a departure"""
+    dwell = (departure - arrival).total_seconds() / 60
+    return round(dwell, 1), round(max(0.0, dwell - DETENTION_FREE_MINUTES), 1)
+
+
+class LoadStream:
+    """Per-load geofence state machine consuming pings in timestamp order"""
+
+    def __init__(self, load):
+        self.state = LoadState(load)
+        self.trackers = {
+            'pickup': FenceTracker(bool(load.actual_pickup_arrival and not load.actual_pickup_departure)),
+            'delivery': FenceTracker(bool(load.actual_delivery_arrival and not load.actual_delivery_departure))
+        }
+        self.last_timestamp = None
+        self.touched_at = time.monotonic()
+
+    def consume(self, lat, lng, timestamp, writes=None):
+        """
+        Apply one ping
+
+        Args:
+            writes (list, optional): Receives (facility_type, entry_exit, timestamp, prior status)
+                for each confirmed transition
+
+        Returns:
+            list: geofence_result dicts for confirmed transitions, or None if the ping was late
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return None
+        self.last_timestamp = timestamp
+        self.touched_at = time.monotonic()
+
+        events = []
+        for facility_type, tracker in self.trackers.items():
+            fence = getattr(self.state, f"{facility_type}_facility")
+            if fence is None:
+                continue
+            changed_at = tracker.observe(classify(fence, lat, lng), timestamp)
+            if changed_at is None:
+                continue
+
+            membership = {'pickup': None, 'delivery': None}
+            membership[facility_type] = tracker.inside
+            prior_status = self.state.status
+            transition = apply_geofence_transition(
+                self.state, membership['pickup'], membership['delivery'], changed_at
+            )
+            if not transition[0]:
+                continue
+            if writes is not None:
+                writes.append((transition[2], transition[1], changed_at, prior_status))
+
+            event = geofence_result(self.state, *transition)
+            event['ping_timestamp'] = timestamp.isoformat()
+            if transition[1] == 'exit':
+                arrival = getattr(self.state, f"actual_{facility_type}_arrival")
+                event['dwell_minutes'], event['detention_minutes'] = dwell_minutes(arrival, changed_at)
+            events.append(event)
+        return events
+
+    def status(self, now=None):
+        """Current fence state, with dwell so far for a vehicle still inside"""
+        now = now or datetime.utcnow()
+        result = {'load_id': self.state.id, 'status': self.state.status,
+                  'last_ping': self.last_timestamp.isoformat() if self.last_timestamp else None}
+        for facility_type, tracker in self.trackers.items():
+            arrival = getattr(self.state, f"actual_{facility_type}_arrival")
+            departure = getattr(self.state, f"actual_{facility_type}_departure")
+            entry = {'inside': tracker.inside, 'dwell_minutes': None, 'detention_minutes': None}
+            if arrival:
+                entry['dwell_minutes'], entry['detention_minutes'] = dwell_minutes(arrival, departure or now)
+            result[facility_type] = entry
+        return result
+
+
+class GeofenceStreamProcessor:
+    """
+    Per-worker geofence state machines with coalesced load writes
+
+    Pings update in-memory state per load; the transitions confirmed since the
+    last flush are written together, either when FLUSH_MAX_LOADS loads are
+    waiting or FLUSH_INTERVAL_SECONDS after the first change, whichever comes first.
+    Only the columns a transition set are written, and only while the load is
+    still in the state the stream saw, so edits made elsewhere are never reverted.
+    Streams are seeded from the database and dropped after STREAM_IDLE_SECONDS
+    without pings, so changes made elsewhere are picked up once a load goes quiet.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._streams = {}
+        self._vehicle_loads = {}
+        self._pending = {}
+        self._pending_since = None
+        self._flusher = None
+        self._wake = threading.Event()
+
+    def _resolve(self, pings):
+        """Load streams for the pings' load_ids and vehicles, reading only what is not cached"""
+        now = time.monotonic()
+        for load_id in [load_id for load_id, stream in self._streams.items()
+                        if now - stream.touched_at > STREAM_IDLE_SECONDS and load_id not in self._pending]:
+            del self._streams[load_id]
+
+        load_ids = {ping['load_id'] for ping in pings if ping.get('load_id')} - self._streams.keys()
+        vehicle_ids = {ping['vehicle_id'] for ping in pings if ping.get('vehicle_id') and not ping.get('load_id')}
+        stale_vehicles = {vehicle_id for vehicle_id in vehicle_ids
+                          if now - self._vehicle_loads.get(vehicle_id, (0, ()))[0] > VEHICLE_MAP_TTL_SECONDS}
+
+        conditions = []
+        if load_ids:
+            conditions.append(Load.id.in_(load_ids))
+        if stale_vehicles:
+            conditions.append(and_(Load.vehicle_id.in_(stale_vehicles), Load.status.in_(['scheduled', 'in_transit'])))
+        if not conditions:
+            return
+
+        loads = Load.query.options(
+            joinedload(Load.pickup_facility),
+            joinedload(Load.delivery_facility)
+        ).filter(or_(*conditions)).all()
+
+        assigned = {vehicle_id: [] for vehicle_id in stale_vehicles}
+        for load in loads:
+            if load.id not in self._streams:
+                self._streams[load.id] = LoadStream(load)
+            if load.vehicle_id in assigned and load.status in ('scheduled', 'in_transit'):
+                assigned[load.vehicle_id].append(load.id)
+        for vehicle_id, ids in assigned.items():
+            self._vehicle_loads[vehicle_id] = (now, tuple(ids))
+
+    def ingest(self, pings):
+        """
+        Feed pings through their loads' state machines
+
+        Args:
+            pings (list): Dicts with load_id or vehicle_id, lat, lng and timestamp (datetime)
+
+        Returns:
+            dict: Processed, discarded (late or out of order) and unmatched ping counts,
+                the confirmed transition events and whether the changes were flushed
+        """
+        events = []
+        processed = discarded = unmatched = 0
+
+        with self._lock:
+            self._resolve(pings)
+            for ping in sorted(pings, key=lambda ping: ping['timestamp']):
+                if ping.get('load_id'):
+                    targets = [ping['load_id']] if ping['load_id'] in self._streams else []
+                else:
+                    targets = [load_id for load_id in self._vehicle_loads.get(ping.get('vehicle_id'), (0, ()))[1]
+                               if load_id in self._streams]
+                if not targets:
+                    unmatched += 1
+                    continue
+
+                late = True
+                for load_id in targets:
+                    stream = self._streams[load_id]
+                    writes = []
+                    result = stream.consume(ping['lat'], ping['lng'], ping['timestamp'], writes)
+                    if result is None:
+                        continue
+                    late = False
+                    if result:
+                        events.extend(result)
+                    if writes:
+                        self._pending.setdefault(load_id, []).extend(writes)
+                        if self._pending_since is None:
+                            self._pending_since = time.monotonic()
+                if late:
+                    discarded += 1
+                else:
+                    processed += 1
+
+            flushed = False
+            if self._pending and (len(self._pending) >= FLUSH_MAX_LOADS
+                                  or time.monotonic() - self._pending_since >= FLUSH_INTERVAL_SECONDS):
+                flushed = self.flush()
+            elif self._pending:
+                self._ensure_flusher()
+
+        return {'processed': processed, 'discarded': discarded, 'unmatched': unmatched,
+                'events': events, 'flushed': flushed}
+
+    def flush(self):
+        """
+        Write the transitions confirmed since the last flush
+
+        One executemany UPDATE per transition type, applied in lifecycle order.
+        Each sets only that transition's columns and is guarded on the column
+        being NULL and the status the stream saw, so a dispatcher's edit or a
+        write from another worker in the meantime wins. Loads whose row then
+        differs from the stream's state are dropped and re-read on their next
+        ping. Rollups for the loads' (driver, day) keys are refreshed in the same
+        transaction and the response cache is invalidated on commit.
+
+        Returns:
+            bool: True when the pending changes were committed
+        """
+        with self._lock:
+            if not self._pending:
+                return True
+
+            by_transition = {key: [] for key in TRANSITION_WRITES}
+            for load_id, writes in self._pending.items():
+                for facility_type, entry_exit, timestamp, prior_status in writes:
+                    by_transition[(facility_type, entry_exit)].append(
+                        {'load_id': load_id, 'at': timestamp, 'prior_status': prior_status}
+                    )
+
+            table = Load.__table__
+            load_ids = list(self._pending)
+            try:
+                connection = db.session.connection()
+                for (column_name, new_status), params in zip(TRANSITION_WRITES.values(), by_transition.values()):
+                    if not params:
+                        continue
+                    column = table.c[column_name]
+                    new_values = {column_name: bindparam('at')}
+                    if new_status:
+                        new_values['status'] = new_status
+                    connection.execute(
+                        update(table).where(
+                            table.c.id == bindparam('load_id'),
+                            column.is_(None),
+                            table.c.status == bindparam('prior_status')
+                        ).values(new_values),
+                        params
+                    )
+
+                rows = connection.execute(
+                    select(table.c.id, table.c.driver_id, table.c.scheduled_pickup_time,
+                           *[table.c[field] for field in LOAD_FIELDS]).where(table.c.id.in_(load_ids))
+                ).all()
+                keys = set()
+                for row in rows:
+                    keys.add((row.driver_id, row.scheduled_pickup_time.date() if row.scheduled_pickup_time else None))
+                    if row.actual_delivery_arrival:
+                        keys.add((row.driver_id, row.actual_delivery_arrival.date()))
+                refresh_rollups(keys, connection=connection)
+
+                db.session.info['response_cache_dirty'] = True
+                if any(params for (_, new_status), params in zip(TRANSITION_WRITES.values(), by_transition.values())
+                       if new_status):
+                    mark_fleet_changed(db.session)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to flush geofence transitions for {len(load_ids)} loads: {e}")
+                return False
+
+            conflicts = [row.id for row in rows if row.id in self._streams
+                         and tuple(row)[3:] != self._streams[row.id].state.values()]
+            for load_id in conflicts:
+                # Changed elsewhere; the next ping re-reads the load
+                del self._streams[load_id]
+            self._pending.clear()
+            self._pending_since = None
+            logger.info(f"Flushed geofence transitions for {len(load_ids)} loads"
+                        + (f", {len(conflicts)} changed elsewhere" if conflicts else ""))
+            return True
+
+    def status(self, load_id):
+        """State machine status for a load, or None when it is not being tracked"""
+        with self._lock:
+            stream = self._streams.get(load_id)
+            return stream.status() if stream else None
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run_flusher, name='geofence-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        """Flush changes that no later ping came along to flush"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._flusher = None
+                    return
+                wait = FLUSH_INTERVAL_SECONDS - (time.monotonic() - self._pending_since)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            with app.app_context():
+                try:
+                    if not self.flush():
+                        # Back off instead of retrying a failing database in a tight loop
+                        time.sleep(FLUSH_INTERVAL_SECONDS)
+                finally:
+                    db.session.remove()
+
+
+geofence_stream = GeofenceStreamProcessor()
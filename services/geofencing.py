@@ -1,11 +1,19 @@
 import logging
 import math
+import numpy as np
 from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
 from app import db
 from models import Load
+from services.polygons import (
+    normalize_polygon, encode_polyline, decode_polyline, polygon_bbox, points_in_encoded_polygon
+)
 
 logger = logging.getLogger(__name__)
 
+EARTH_RADIUS_MILES = 3958.8
+
 def calculate_distance(lat1, lng1, lat2, lng2):
     """
     Calculate the distance between two coordinates in miles
@@ -20,7 +28,7 @@ def calculate_distance(lat1, lng1, lat2, lng2):
         float: Distance in miles
     """
     # Earth's radius in miles
-    radius = 3958.8
+    radius = EARTH_RADIUS_MILES
     
     # Convert latitude and longitude from degrees to radians
     lat1_rad = math.radians(lat1)
@@ -54,112 +62,198 @@ def is_in_geofence(lat, lng, fence_lat, fence_lng, radius):
     distance = calculate_distance(lat, lng, fence_lat, fence_lng)
     return distance <= radius
 
-def check_geofence_entry(load, current_lat, current_lng):
+def haversine_miles(lat1, lng1, lat2, lng2):
     """
-    Check if a vehicle has entered or exited a facility geofence
-    and update the load record if necessary
-    
+    Vectorized haversine distance in miles
+
+    Args:
+        lat1, lng1 (array-like): Latitudes and longitudes of the first points
+        lat2, lng2 (array-like): Latitudes and longitudes of the second points (broadcastable)
+
+    Returns:
+        numpy.ndarray: Distances in miles, NaN where a coordinate is NaN
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def fence_membership(lats, lngs, fence_lats, fence_lngs, radii):
+    """
+    Whether each point lies inside its own circular fence
+
+    Args:
+        lats, lngs (array-like): Point coordinates
+        fence_lats, fence_lngs (array-like): Fence centers, NaN where there is no fence
+        radii (array-like): Fence radii in miles
+
+    Returns:
+        numpy.ndarray: Boolean array, False where there is no fence
+    """
+    return haversine_miles(lats, lngs, fence_lats, fence_lngs) <= np.asarray(radii, dtype=float)
+
+def apply_geofence_transition(load, in_pickup_geofence, in_delivery_geofence, timestamp):
+    """
+    Apply arrival/departure transitions for one position of a load's vehicle
+
     Args:
         load (Load): The load object
-        current_lat (float): Current latitude of the vehicle
-        current_lng (float): Current longitude of the vehicle
-    
+        in_pickup_geofence (bool): Position is inside the pickup fence, None if there is no pickup fence
+        in_delivery_geofence (bool): Position is inside the delivery fence, None if there is no delivery fence
+        timestamp (datetime): Time stamped on the arrival or departure
+
     Returns:
-        dict: Result of the check, including any status changes
+        tuple: (status_changed, entry_exit, facility_type, facility) for the last transition applied
     """
     status_changed = False
     entry_exit = None
     facility_type = None
     facility = None
     
-    try:
-        # Check pickup facility
-        if load.pickup_facility and load.pickup_facility.lat and load.pickup_facility.lng:
-            pickup_facility = load.pickup_facility
-            in_pickup_geofence = is_in_geofence(
-                current_lat, 
-                current_lng, 
-                pickup_facility.lat, 
-                pickup_facility.lng, 
-                pickup_facility.geofence_radius
-            )
-            
-            # Check if arrived at pickup
-            if in_pickup_geofence and not load.actual_pickup_arrival and load.status == 'scheduled':
-                load.actual_pickup_arrival = datetime.utcnow()
-                status_changed = True
-                entry_exit = 'entry'
-                facility_type = 'pickup'
-                facility = pickup_facility
-                logger.info(f"Vehicle entered pickup geofence for load {load.id}")
-            
-            # Check if departed from pickup
-            elif not in_pickup_geofence and load.actual_pickup_arrival and not load.actual_pickup_departure:
-                load.actual_pickup_departure = datetime.utcnow()
-                load.status = 'in_transit'
-                status_changed = True
-                entry_exit = 'exit'
-                facility_type = 'pickup'
-                facility = pickup_facility
-                logger.info(f"Vehicle exited pickup geofence for load {load.id}")
+    if in_pickup_geofence is not None:
+        pickup_facility = load.pickup_facility
         
-        # Check delivery facility
-        if load.delivery_facility and load.delivery_facility.lat and load.delivery_facility.lng:
-            delivery_facility = load.delivery_facility
-            in_delivery_geofence = is_in_geofence(
-                current_lat, 
-                current_lng, 
-                delivery_facility.lat, 
-                delivery_facility.lng, 
-                delivery_facility.geofence_radius
-            )
-            
-            # Check if arrived at delivery
-            if in_delivery_geofence and not load.actual_delivery_arrival and load.status == 'in_transit':
-                load.actual_delivery_arrival = datetime.utcnow()
-                status_changed = True
-                entry_exit = 'entry'
-                facility_type = 'delivery'
-                facility = delivery_facility
-                logger.info(f"Vehicle entered delivery geofence for load {load.id}")
-            
-            # Check if departed from delivery
-            elif not in_delivery_geofence and load.actual_delivery_arrival and not load.actual_delivery_departure:
-                load.actual_delivery_departure = datetime.utcnow()
-                load.status = 'delivered'
-                status_changed = True
-                entry_exit = 'exit'
-                facility_type = 'delivery'
-                facility = delivery_facility
-                logger.info(f"Vehicle exited delivery geofence for load {load.id}")
+        # Check if arrived at pickup
+        if in_pickup_geofence and not load.actual_pickup_arrival and load.status == 'scheduled':
+            load.actual_pickup_arrival = timestamp
+            status_changed = True
+            entry_exit = 'entry'
+            facility_type = 'pickup'
+            facility = pickup_facility
+            logger.info(f"Vehicle entered pickup geofence for load {load.id}")
         
-        # Compile results
-        result = {
-            'load_id': load.id,
-            'status_changed': status_changed,
-            'entry_exit': entry_exit,
-            'facility_type': facility_type,
-            'facility': {
-                'id': facility.id,
-                'name': facility.name
-            } if facility else None
-        }
+        # Check if departed from pickup
+        elif not in_pickup_geofence and load.actual_pickup_arrival and not load.actual_pickup_departure:
+            load.actual_pickup_departure = timestamp
+            load.status = 'in_transit'
+            status_changed = True
+            entry_exit = 'exit'
+            facility_type = 'pickup'
+            facility = pickup_facility
+            logger.info(f"Vehicle exited pickup geofence for load {load.id}")
+    
+    if in_delivery_geofence is not None:
+        delivery_facility = load.delivery_facility
+        
+        # Check if arrived at delivery
+        if in_delivery_geofence and not load.actual_delivery_arrival and load.status == 'in_transit':
+            load.actual_delivery_arrival = timestamp
+            status_changed = True
+            entry_exit = 'entry'
+            facility_type = 'delivery'
+            facility = delivery_facility
+            logger.info(f"Vehicle entered delivery geofence for load {load.id}")
         
-        # If status changed, add the new load status to the result
-        if status_changed:
-            result['new_load_status'] = load.status
-            
-            # Update fields based on event type
-            if entry_exit == 'entry' and facility_type == 'pickup':
-                result['actual_pickup_arrival'] = load.actual_pickup_arrival.isoformat()
-            elif entry_exit == 'exit' and facility_type == 'pickup':
-                result['actual_pickup_departure'] = load.actual_pickup_departure.isoformat()
-            elif entry_exit == 'entry' and facility_type == 'delivery':
-                result['actual_delivery_arrival'] = load.actual_delivery_arrival.isoformat()
-            elif entry_exit == 'exit' and facility_type == 'delivery':
-                result['actual_delivery_departure'] = load.actual_delivery_departure.isoformat()
+        # Check if departed from delivery
+        elif not in_delivery_geofence and load.actual_delivery_arrival and not load.actual_delivery_departure:
+            load.actual_delivery_departure = timestamp
+            load.status = 'delivered'
+            status_changed = True
+            entry_exit = 'exit'
+            facility_type = 'delivery'
+            facility = delivery_facility
+            logger.info(f"Vehicle exited delivery geofence for load {load.id}")
+    
+    return status_changed, entry_exit, facility_type, facility
+
+def geofence_result(load, status_changed, entry_exit, facility_type, facility):
+    """Format a transition as returned by the geofence check endpoints"""
+    result = {
+        'load_id': load.id,
+        'status_changed': status_changed,
+        'entry_exit': entry_exit,
+        'facility_type': facility_type,
+        'facility': {
+            'id': facility.id,
+            'name': facility.name
+        } if facility else None
+    }
+    
+    # If status changed, add the new load status to the result
+    if status_changed:
+        result['new_load_status'] = load.status
+        
+        # Update fields based on event type
+        if entry_exit == 'entry' and facility_type == 'pickup':
+            result['actual_pickup_arrival'] = load.actual_pickup_arrival.isoformat()
+        elif entry_exit == 'exit' and facility_type == 'pickup':
+            result['actual_pickup_departure'] = load.actual_pickup_departure.isoformat()
+        elif entry_exit == 'entry' and facility_type == 'delivery':
+            result['actual_delivery_arrival'] = load.actual_delivery_arrival.isoformat()
+        elif entry_exit == 'exit' and facility_type == 'delivery':
+            result['actual_delivery_departure'] = load.actual_delivery_departure.isoformat()
+    
+    return result
+
+def _fence(facility):
+    """(lat, lng, radius) of a facility's fence, or None when it is not geocoded"""
+    if facility and facility.lat and facility.lng:
+        return facility.lat, facility.lng, facility.geofence_radius or 0.2
+    return None
+
+def facility_polygon(facility):
+    """(encoded vertices, bounding box) of a facility's polygon fence, or None when it has none"""
+    if facility and facility.geofence_polygon:
+        return facility.geofence_polygon, (facility.geofence_min_lat, facility.geofence_min_lng,
+                                           facility.geofence_max_lat, facility.geofence_max_lng)
+    return None
+
+def set_geofence_polygon(facility, points):
+    """
+    Store a polygon fence on a facility along with its bounding box
+    
+    Args:
+        facility (Facility): The facility to update
+        points (list): (lat, lng) vertices, or None/empty to go back to the radius fence
+    
+    Raises:
+        ValueError: If the polygon is invalid
+    """
+    if not points:
+        facility.geofence_polygon = None
+        facility.geofence_min_lat = facility.geofence_min_lng = None
+        facility.geofence_max_lat = facility.geofence_max_lng = None
+        return
+    
+    facility.geofence_polygon = encode_polyline(normalize_polygon(points))
+    # Box the vertices as stored, after rounding to the polyline precision
+    bbox = polygon_bbox(decode_polyline(facility.geofence_polygon))
+    (facility.geofence_min_lat, facility.geofence_min_lng,
+     facility.geofence_max_lat, facility.geofence_max_lng) = bbox
+
+def in_facility_geofence(facility, lat, lng):
+    """
+    Whether a point is inside a facility's fence, using its polygon when it has one
+    
+    Returns:
+        bool: Membership, or None when the facility has no usable fence
+    """
+    polygon = facility_polygon(facility)
+    if polygon:
+        return bool(points_in_encoded_polygon([lat], [lng], *polygon)[0])
+    fence = _fence(facility)
+    return is_in_geofence(lat, lng, *fence) if fence else None
+
+def check_geofence_entry(load, current_lat, current_lng, timestamp=None):
+    """
+    Check if a vehicle has entered or exited a facility geofence
+    and update the load record if necessary
+    
+    Args:
+        load (Load): The load object
+        current_lat (float): Current latitude of the vehicle
+        current_lng (float): Current longitude of the vehicle
+        timestamp (datetime, optional): When the position was recorded, defaults to utcnow
+    
+    Returns:
+        dict: Result of the check, including any status changes
+    """
+    try:
+        in_pickup_geofence = in_facility_geofence(load.pickup_facility, current_lat, current_lng)
+        in_delivery_geofence = in_facility_geofence(load.delivery_facility, current_lat, current_lng)
         
-        return result
+        transition = apply_geofence_transition(load, in_pickup_geofence, in_delivery_geofence,
+                                               timestamp or datetime.utcnow())
+        return geofence_result(load, *transition)
         
     except Exception as e:
         logger.error(f"Error in check_geofence_entry: {str(e)}")
@@ -167,3 +261,125 @@ def check_geofence_entry(load, current_lat, current_lng):
             'error': str(e),
             'status_changed': False
         }
+
+def evaluate_geofence_pings(loads_by_id, pings):
+    """
+    Evaluate many position pings against their loads' pickup and delivery fences
+    
+    Distances for every ping are computed in one vectorized pass, and pings at
+    facilities with polygon fences are tested once per polygon; transitions are
+    then applied per load in timestamp order so each ping sees the state left by
+    the one before it.
+    
+    Args:
+        loads_by_id (dict): load_id -> Load with facilities loaded
+        pings (list): Dicts with load_id, lat, lng and timestamp (datetime)
+    
+    Returns:
+        list: geofence_result dicts for the pings that changed a load's status
+    """
+    pings = sorted((ping for ping in pings if ping['load_id'] in loads_by_id),
+                   key=lambda ping: (ping['load_id'], ping['timestamp']))
+    if not pings:
+        return []
+    
+    count = len(pings)
+    lats = np.fromiter((ping['lat'] for ping in pings), dtype=float, count=count)
+    lngs = np.fromiter((ping['lng'] for ping in pings), dtype=float, count=count)
+    
+    in_fence = {}
+    has_fence = {}
+    for facility_type in ('pickup', 'delivery'):
+        fence_lats = np.full(count, np.nan)
+        fence_lngs = np.full(count, np.nan)
+        radii = np.full(count, np.nan)
+        polygon_pings = {}
+        for i, ping in enumerate(pings):
+            facility = getattr(loads_by_id[ping['load_id']], f"{facility_type}_facility")
+            polygon = facility_polygon(facility)
+            if polygon:
+                polygon_pings.setdefault(polygon, []).append(i)
+                continue
+            fence = _fence(facility)
+            if fence:
+                fence_lats[i], fence_lngs[i], radii[i] = fence
+        
+        inside = fence_membership(lats, lngs, fence_lats, fence_lngs, radii)
+        present = ~np.isnan(fence_lats)
+        for polygon, indices in polygon_pings.items():
+            indices = np.asarray(indices)
+            inside[indices] = points_in_encoded_polygon(lats[indices], lngs[indices], *polygon)
+            present[indices] = True
+        in_fence[facility_type] = inside
+        has_fence[facility_type] = present
+    
+    events = []
+    for i, ping in enumerate(pings):
+        load = loads_by_id[ping['load_id']]
+        in_pickup_geofence = bool(in_fence['pickup'][i]) if has_fence['pickup'][i] else None
+        in_delivery_geofence = bool(in_fence['delivery'][i]) if has_fence['delivery'][i] else None
+        
+        transition = apply_geofence_transition(load, in_pickup_geofence, in_delivery_geofence, ping['timestamp'])
+        if transition[0]:
+            result = geofence_result(load, *transition)
+            result['ping_timestamp'] = ping['timestamp'].isoformat()
+            events.append(result)
+    
+    return events
+
+def check_geofence_batch(pings):
+    """
+    Apply a batch of position pings to their loads and commit every change in one transaction
+    
+    Pings may name a load_id or a vehicle_id; a vehicle ping applies to the vehicle's
+    scheduled and in-transit loads.
+    
+    Args:
+        pings (list): Dicts with load_id or vehicle_id, lat, lng and timestamp (datetime)
+    
+    Returns:
+        dict: Processed ping count, status change events and unmatched pings
+    """
+    load_ids = {ping['load_id'] for ping in pings if ping.get('load_id')}
+    vehicle_ids = {ping['vehicle_id'] for ping in pings if ping.get('vehicle_id') and not ping.get('load_id')}
+    
+    conditions = []
+    if load_ids:
+        conditions.append(Load.id.in_(load_ids))
+    if vehicle_ids:
+        conditions.append(and_(Load.vehicle_id.in_(vehicle_ids), Load.status.in_(['scheduled', 'in_transit'])))
+    if not conditions:
+        return {'processed': 0, 'events': [], 'unmatched': len(pings)}
+    
+    loads = Load.query.options(
+        joinedload(Load.pickup_facility),
+        joinedload(Load.delivery_facility)
+    ).filter(or_(*conditions)).all()
+    loads_by_id = {load.id: load for load in loads}
+    
+    loads_by_vehicle = {}
+    for load in loads:
+        if load.vehicle_id in vehicle_ids and load.status in ('scheduled', 'in_transit'):
+            loads_by_vehicle.setdefault(load.vehicle_id, []).append(load.id)
+    
+    # Expand vehicle pings to one ping per active load on the vehicle
+    expanded = []
+    unmatched = 0
+    for ping in pings:
+        if ping.get('load_id'):
+            targets = [ping['load_id']] if ping['load_id'] in loads_by_id else []
+        else:
+            targets = loads_by_vehicle.get(ping.get('vehicle_id'), [])
+        if not targets:
+            unmatched += 1
+        expanded.extend({**ping, 'load_id': load_id} for load_id in targets)
+    
+    try:
+        events = evaluate_geofence_pings(loads_by_id, expanded)
+        if events:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return {'processed': len(pings) - unmatched, 'events': events, 'unmatched': unmatched}
@@ -1,25 +1,184 @@
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from .logger import setup_logger
+from .eta_cache import eta_cache, eta_cache_key
 
 logger = setup_logger(__name__)
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+
+# (connect, read) timeout in seconds for every Maps request
+REQUEST_TIMEOUT = (3.05, float(os.getenv("GOOGLE_MAPS_TIMEOUT", 10)))
+
+# The Distance Matrix API accepts at most 25 origins per request
+MAX_ORIGINS_PER_REQUEST = 25
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GOOGLE_MAPS_MAX_CONCURRENCY", 4))
+
+ETA_UNAVAILABLE = "ETA unavailable"
+
+
+def _build_session():
+    """Session with a connection pool sized for the concurrent batch requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = _build_session()
+
 
 def get_eta(origin_lat, origin_lng, dest_address):
     """Calculate ETA from origin coordinates to destination address"""
+    key = eta_cache_key(origin_lat, origin_lng, dest_address)
+    cached = eta_cache.get(key)
+    if cached is not None:
+        return cached
+
     logger.info(f"Calculating ETA from {origin_lat},{origin_lng} to {dest_address}")
-    endpoint = "https://maps.googleapis.com/maps/api/directions/json"
+    endpoint = f"{GOOGLE_MAPS_BASE_URL}/directions/json"
     params = {
         "origin": f"{origin_lat},{origin_lng}",
         "destination": dest_address,
         "key": GOOGLE_MAPS_API_KEY
     }
-    response = requests.get(endpoint, params=params)
-    routes = response.json().get("routes", [])
+    try:
+        response = _session.get(endpoint, params=params, timeout=REQUEST_TIMEOUT)
+        routes = response.json().get("routes", [])
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"ETA request failed: {e}")
+        routes = []
     if routes:
         eta = routes[0]["legs"][0]["duration"]["text"]
         logger.info(f"ETA calculated: {eta}")
+        eta_cache.set(key, eta)
         return eta
     logger.warning("ETA calculation failed")
-    return "ETA unavailable"
\ No newline at end of file
+    return ETA_UNAVAILABLE
+
+
+def _matrix_elements(origins, destination):
+    """
+    Distance Matrix elements for one batch of origins to a single destination
+
+    Args:
+        origins (list): (lat, lng) tuples, at most MAX_ORIGINS_PER_REQUEST
+        destination (str): Destination address or "lat,lng"
+
+    Returns:
+        list: The OK element per origin, None where the lookup failed
+    """
+    endpoint = f"{GOOGLE_MAPS_BASE_URL}/distancematrix/json"
+    params = {
+        "origins": "|".join(f"{lat},{lng}" for lat, lng in origins),
+        "destinations": destination,
+        "key": GOOGLE_MAPS_API_KEY
+    }
+    try:
+        response = _session.get(endpoint, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        rows = response.json().get("rows", [])
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"Distance matrix request for {len(origins)} origins failed: {e}")
+        return [None] * len(origins)
+
+    found = []
+    for i in range(len(origins)):
+        elements = rows[i].get("elements", []) if i < len(rows) else []
+        found.append(elements[0] if elements and elements[0].get("status") == "OK" else None)
+    return found
+
+
+def _matrix_etas(origins, dest_address):
+    """
+    ETAs for one batch of origins from a single Distance Matrix request
+
+    Args:
+        origins (list): (lat, lng) tuples, at most MAX_ORIGINS_PER_REQUEST
+        dest_address (str): Destination address
+
+    Returns:
+        list: Duration text per origin, ETA_UNAVAILABLE where the lookup failed
+    """
+    return [element["duration"]["text"] if element else ETA_UNAVAILABLE
+            for element in _matrix_elements(origins, dest_address)]
+
+
+def get_durations(origins, destination):
+    """
+    Driving durations in seconds from many origins to one destination
+
+    Uncached counterpart of get_etas for callers that need numbers rather than
+    display text; batches run concurrently like get_etas.
+
+    Args:
+        origins (list): (lat, lng) tuples
+        destination (str): Destination address or "lat,lng"
+
+    Returns:
+        list: Seconds per origin in input order, None where the lookup failed
+    """
+    origins = list(origins)
+    batches = [origins[i:i + MAX_ORIGINS_PER_REQUEST] for i in range(0, len(origins), MAX_ORIGINS_PER_REQUEST)]
+    if not batches:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(batches))) as executor:
+        results = executor.map(lambda batch: _matrix_elements(batch, destination), batches)
+        return [element["duration"].get("value") if element else None
+                for batch_elements in results for element in batch_elements]
+
+
+def get_etas(origins, dest_address):
+    """
+    Calculate ETAs from many origins to one destination address
+
+    Cached ETAs are served first. The remaining origins are grouped into Distance
+    Matrix requests that run concurrently over the pooled session. A failed batch
+    or element only marks its own origins as unavailable; the rest of the results
+    are still returned.
+
+    Args:
+        origins (list): (lat, lng) tuples
+        dest_address (str): Destination address
+
+    Returns:
+        list: Duration text per origin in input order, ETA_UNAVAILABLE where the lookup failed
+    """
+    origins = list(origins)
+    if not origins:
+        return []
+
+    # Serve what the cache has; origins sharing a cell are looked up only once
+    keys = [eta_cache_key(lat, lng, dest_address) for lat, lng in origins]
+    etas = [eta_cache.get(key) for key in keys]
+    pending = {}
+    for origin, key, eta in zip(origins, keys, etas):
+        if eta is None and key not in pending:
+            pending[key] = origin
+    if not pending:
+        return etas
+
+    lookup_keys = list(pending)
+    lookup_origins = [pending[key] for key in lookup_keys]
+    batches = [lookup_origins[i:i + MAX_ORIGINS_PER_REQUEST]
+               for i in range(0, len(lookup_origins), MAX_ORIGINS_PER_REQUEST)]
+    logger.info(f"Calculating {len(lookup_origins)} ETAs to {dest_address} in {len(batches)} requests "
+                f"({len(origins) - len(lookup_origins)} served from cache)")
+
+    if len(batches) == 1:
+        fetched = _matrix_etas(batches[0], dest_address)
+    else:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(batches))) as executor:
+            results = executor.map(lambda batch: _matrix_etas(batch, dest_address), batches)
+            fetched = [eta for batch_etas in results for eta in batch_etas]
+
+    found = dict(zip(lookup_keys, fetched))
+    for key, eta in found.items():
+        if eta != ETA_UNAVAILABLE:
+            eta_cache.set(key, eta)
+
+    return [eta if eta is not None else found[key] for key, eta in zip(keys, etas)]
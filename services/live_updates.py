@@ -0,0 +1,159 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from app import app, db
+from services import response_cache
+
+logger = logging.getLogger(__name__)
+
+# How often the hub checks the shared write generation for changes from other workers
+POLL_SECONDS = float(os.environ.get('LIVE_UPDATES_POLL_SECONDS', 2))
+
+# At-risk classification depends on the clock, so recompute at least this often
+RECOMPUTE_SECONDS = float(os.environ.get('LIVE_UPDATES_RECOMPUTE_SECONDS', 60))
+
+# Open streams per worker; each holds a gthread thread, so keep this well below --threads
+MAX_SUBSCRIBERS = int(os.environ.get('LIVE_UPDATES_MAX_STREAMS', 8))
+
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 50
+
+
+def compute_dashboard_snapshot():
+    """Compute the default dashboard view shared by every subscriber"""
+    from models import Notification
+    from routes.dashboard import build_at_risk_loads
+    from services.dashboard_summary import compute_dashboard_summary
+
+    date_end = datetime.utcnow().date()
+    date_start = date_end - timedelta(days=30)
+
+    return {
+        'summary': compute_dashboard_summary(date_start, date_end),
+        'at_risk_loads': build_at_risk_loads(),
+        'unread_count': Notification.query.filter_by(user_id=None, read=False).count()
+    }
+
+
+class LiveUpdateHub:
+    """
+    Fan one shared dashboard computation out to every streaming subscriber
+
+    A single background thread per worker watches the response cache generation
+    (bumped after every committed Load, Driver or Notification write in any worker),
+    recomputes the snapshot once when it moves and pushes only the parts that
+    changed to each subscriber's queue.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._snapshot = None
+        self._generation = None
+
+    def subscribe(self):
+        """
+        Register a subscriber queue
+
+        Returns:
+            Queue: The subscriber's queue, or None when MAX_SUBSCRIBERS streams are already open
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                return None
+            self._subscribers.add(subscriber)
+            self._ensure_thread()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def wake(self):
+        self._wake.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='live-updates', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_computed = 0
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is listening; stop until the next subscriber restarts the thread
+                    self._thread = None
+                    self._snapshot = None
+                    self._generation = None
+                    return
+
+            try:
+                with app.app_context():
+                    generation = response_cache.current_generation()
+                    if generation != self._generation or time.monotonic() - last_computed >= RECOMPUTE_SECONDS:
+                        self._publish(generation, compute_dashboard_snapshot())
+                        last_computed = time.monotonic()
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"Live update computation failed: {e}")
+
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def _publish(self, generation, snapshot):
+        previous = self._snapshot
+        self._snapshot = snapshot
+        self._generation = generation
+
+        if previous is None:
+            return
+
+        changed = {key: value for key, value in snapshot.items() if previous.get(key) != value}
+        if not changed:
+            return
+
+        payload = app.json.dumps({'generation': generation, 'changed': changed})
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # Slow client; drop it and let EventSource reconnect
+                self.unsubscribe(subscriber)
+
+
+hub = LiveUpdateHub()
+response_cache.generation_listeners.append(hub.wake)
+
+
+def stream_events(subscriber, max_seconds=300):
+    """
+    Server-sent event generator for a subscriber from hub.subscribe()
+
+    The stream occupies a worker thread for as long as it is open. It ends after
+    max_seconds so dead connections are noticed, but the browser's EventSource
+    reconnects at once, so an open dashboard effectively holds a thread all the
+    time; run with a threaded worker (gunicorn -k gthread) or disable
+    LIVE_UPDATES_SSE. The hub admits at most MAX_SUBSCRIBERS streams per worker
+    so the remaining threads keep serving ordinary requests.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield "retry: 3000\nevent: ready\ndata: {}\n\n"
+        while time.monotonic() < deadline:
+            try:
+                payload = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: update\ndata: {payload}\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,240 @@
+import csv
+import io
+import logging
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, insert, update, values, column, Integer, Float, DateTime, or_, and_
+from app import db
+from models import Load, LocationUpdate, Vehicle
+from services.response_cache import bump_generation
+from services.fleet_availability import FLEET_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+# Batches at least this large go through PostgreSQL COPY instead of a multi-row INSERT
+COPY_THRESHOLD = 500
+
+# Pings stamped further ahead than this are rejected as clock errors
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+BREADCRUMB_COLUMNS = ('load_id', 'lat', 'lng', 'speed', 'heading', 'timestamp')
+
+
+def parse_ping_timestamp(value):
+    """ISO 8601 timestamp as a naive UTC datetime; missing values default to now"""
+    if not value:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _optional_float(raw, key):
+    value = raw.get(key)
+    return float(value) if value is not None and value != '' else None
+
+
+def parse_ping(raw, now=None):
+    """
+    Validate one raw ping
+
+    Args:
+        raw (dict): load_id and/or vehicle_id, lat, lng and optional speed, heading and timestamp
+        now (datetime, optional): Reference time for the clock skew check
+
+    Returns:
+        dict: Ping with typed fields
+
+    Raises:
+        ValueError: If a field is missing or out of range
+    """
+    if not raw.get('load_id') and not raw.get('vehicle_id'):
+        raise ValueError('load_id or vehicle_id is required')
+
+    lat, lng = float(raw['lat']), float(raw['lng'])
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"Coordinates ({lat}, {lng}) are out of range")
+
+    speed = _optional_float(raw, 'speed')
+    if speed is not None and speed < 0:
+        raise ValueError('speed cannot be negative')
+    heading = _optional_float(raw, 'heading')
+    if heading is not None and not 0 <= heading <= 360:
+        raise ValueError('heading must be between 0 and 360')
+
+    timestamp = parse_ping_timestamp(raw.get('timestamp'))
+    if timestamp > (now or datetime.utcnow()) + MAX_CLOCK_SKEW:
+        raise ValueError(f"timestamp {timestamp.isoformat()} is in the future")
+
+    return {
+        'load_id': int(raw['load_id']) if raw.get('load_id') else None,
+        'vehicle_id': int(raw['vehicle_id']) if raw.get('vehicle_id') else None,
+        'lat': lat,
+        'lng': lng,
+        'speed': speed,
+        'heading': heading,
+        'timestamp': timestamp
+    }
+
+
+def parse_pings(raw_pings):
+    """
+    Validate raw pings
+
+    Returns:
+        tuple: (pings, errors) where each error carries the index of the bad ping
+    """
+    now = datetime.utcnow()
+    pings = []
+    errors = []
+    for index, raw in enumerate(raw_pings):
+        try:
+            pings.append(parse_ping(raw, now))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            errors.append({'index': index, 'error': str(e)})
+    return pings, errors
+
+
+def _resolve(conn, pings):
+    """
+    Map load ids to vehicles and vehicles to their active loads in one query
+
+    Returns:
+        tuple: (load_id -> vehicle_id for known loads, vehicle_id -> [active load ids])
+    """
+    load_ids = {ping['load_id'] for ping in pings if ping['load_id']}
+    vehicle_ids = {ping['vehicle_id'] for ping in pings if ping['vehicle_id'] and not ping['load_id']}
+
+    conditions = []
+    if load_ids:
+        conditions.append(Load.id.in_(load_ids))
+    if vehicle_ids:
+        conditions.append(and_(Load.vehicle_id.in_(vehicle_ids), Load.status.in_(['scheduled', 'in_transit'])))
+    if not conditions:
+        return {}, {}
+
+    load_vehicles = {}
+    vehicle_loads = {vehicle_id: [] for vehicle_id in vehicle_ids}
+    for load_id, vehicle_id, status in conn.execute(
+        select(Load.id, Load.vehicle_id, Load.status).where(or_(*conditions))
+    ):
+        load_vehicles[load_id] = vehicle_id
+        if vehicle_id in vehicle_loads and status in ('scheduled', 'in_transit'):
+            vehicle_loads[vehicle_id].append(load_id)
+    return load_vehicles, vehicle_loads
+
+
+def _copy_breadcrumbs(conn, rows):
+    """Stream rows into location_update with COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # An unquoted empty field is NULL in COPY's CSV format
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+
+    table = LocationUpdate.__table__
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({", ".join(BREADCRUMB_COLUMNS)}) FROM STDIN WITH (FORMAT csv)', buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_breadcrumbs(conn, rows):
+    """Multi-row INSERT; SQLAlchemy batches executemany into INSERT ... VALUES (...), (...)"""
+    conn.execute(insert(LocationUpdate.__table__), [dict(zip(BREADCRUMB_COLUMNS, row)) for row in rows])
+
+
+def _update_vehicle_positions(conn, latest):
+    """
+    Move each vehicle to its newest ping in one UPDATE ... FROM (VALUES ...)
+
+    A vehicle whose stored position is already newer is left alone, so late
+    batches cannot move a truck backwards.
+
+    Returns:
+        int: Number of vehicles updated
+    """
+    if not latest:
+        return 0
+
+    positions = values(
+        column('id', Integer), column('lat', Float), column('lng', Float), column('updated', DateTime),
+        name='positions'
+    ).data([(vehicle_id, ping['lat'], ping['lng'], ping['timestamp']) for vehicle_id, ping in latest.items()])
+
+    vehicle = Vehicle.__table__
+    return conn.execute(
+        update(vehicle).where(
+            vehicle.c.id == positions.c.id,
+            or_(vehicle.c.last_updated.is_(None), vehicle.c.last_updated < positions.c.updated)
+        ).values(
+            current_lat=positions.c.lat,
+            current_lng=positions.c.lng,
+            last_updated=positions.c.updated
+        )
+    ).rowcount
+
+
+def ingest_pings(pings):
+    """
+    Store a batch of validated pings as LocationUpdate rows and move their vehicles
+
+    Pings naming a load are stored against it; pings naming only a vehicle are
+    stored against each of the vehicle's scheduled or in-transit loads. Every
+    ping with a known vehicle also updates that vehicle's current position.
+    Rows go in with COPY on PostgreSQL for large batches and a multi-row INSERT
+    otherwise, together with the vehicle update in one transaction.
+
+    Args:
+        pings (list): Dicts from parse_ping
+
+    Returns:
+        dict: inserted breadcrumbs, vehicles_updated, unmatched pings and the
+            per-load pings for downstream geofence processing
+    """
+    if not pings:
+        return {'inserted': 0, 'vehicles_updated': 0, 'unmatched': 0, 'load_pings': []}
+
+    with db.engine.begin() as conn:
+        load_vehicles, vehicle_loads = _resolve(conn, pings)
+
+        rows = []
+        load_pings = []
+        latest = {}
+        unmatched = 0
+        for ping in pings:
+            if ping['load_id']:
+                if ping['load_id'] not in load_vehicles:
+                    unmatched += 1
+                    continue
+                targets = [ping['load_id']]
+                vehicle_id = ping['vehicle_id'] or load_vehicles[ping['load_id']]
+            else:
+                targets = vehicle_loads.get(ping['vehicle_id'], [])
+                vehicle_id = ping['vehicle_id']
+
+            for load_id in targets:
+                rows.append((load_id, ping['lat'], ping['lng'], ping['speed'], ping['heading'], ping['timestamp']))
+                load_pings.append({**ping, 'load_id': load_id})
+
+            if vehicle_id and (vehicle_id not in latest or ping['timestamp'] > latest[vehicle_id]['timestamp']):
+                latest[vehicle_id] = ping
+
+        if rows:
+            if conn.dialect.name == 'postgresql' and len(rows) >= COPY_THRESHOLD:
+                _copy_breadcrumbs(conn, rows)
+            else:
+                _insert_breadcrumbs(conn, rows)
+        vehicles_updated = _update_vehicle_positions(conn, latest)
+
+    if vehicles_updated:
+        # Moved trucks change where the fleet availability search places them
+        bump_generation(FLEET_NAMESPACE)
+
+    logger.debug(f"Ingested {len(rows)} breadcrumbs, moved {vehicles_updated} vehicles")
+    return {'inserted': len(rows), 'vehicles_updated': vehicles_updated,
+            'unmatched': unmatched, 'load_pings': load_pings}
@@ -0,0 +1,297 @@
+import logging
+from datetime import datetime, date, timedelta
+from sqlalchemy import text, inspect
+from app import db
+from models import LocationUpdate
+
+logger = logging.getLogger(__name__)
+
+TABLE = LocationUpdate.__tablename__
+
+# Old breadcrumbs keep one point per load per bucket
+DEFAULT_BUCKET_MINUTES = 15
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start):
+    """Name of the monthly partition starting at start, e.g. location_update_y2025m05"""
+    return f"{TABLE}_y{start.year:04d}m{start.month:02d}"
+
+
+def is_postgresql(engine=None):
+    return (engine or db.engine).dialect.name == 'postgresql'
+
+
+def is_partitioned(conn):
+    """Whether the location_update table is a PostgreSQL partitioned table"""
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = current_schema()::regnamespace"
+    ), {'table': TABLE}).scalar())
+
+
+def _child_tables(conn):
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND p.relnamespace = current_schema()::regnamespace"
+    ), {'table': TABLE}).all()
+
+
+def list_partitions(conn):
+    """
+    Monthly partitions of location_update with their range
+
+    Returns:
+        list: (name, start date) tuples, oldest first; the default partition is left out
+    """
+    names = [row[0] for row in _child_tables(conn)]
+
+    partitions = []
+    prefix = f"{TABLE}_y"
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            partitions.append((name, datetime.strptime(name[len(prefix):], '%Ym%m').date()))
+        except ValueError:
+            continue
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partition(conn, start):
+    """
+    Create the monthly partition starting at start
+
+    PostgreSQL refuses to create a partition while the default partition holds
+    rows in its range, which happens when partition maintenance fell behind
+    ingest. In that case the default partition is detached, the month partition
+    created, the month's rows moved out of the default and the default
+    re-attached, all in the caller's transaction.
+    """
+    name = partition_name(start)
+    end = add_months(start, 1)
+    default = f"{TABLE}_default"
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_month = "timestamp >= :start AND timestamp < :end"
+    params = {'start': start, 'end': end}
+
+    stranded = conn.execute(text(
+        f'SELECT 1 FROM "{default}" WHERE {in_month} LIMIT 1'
+    ), params).scalar() if default in {row[0] for row in _child_tables(conn)} else None
+    if not stranded:
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" {bounds}'))
+        return name
+
+    columns = ', '.join(f'"{column.name}"' for column in LocationUpdate.__table__.columns)
+    conn.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{default}"'))
+    conn.execute(text(f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" {bounds}'))
+    moved = conn.execute(text(
+        f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM "{default}" WHERE {in_month}'
+    ), params).rowcount
+    conn.execute(text(f'DELETE FROM "{default}" WHERE {in_month}'), params)
+    conn.execute(text(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{default}" DEFAULT'))
+    logger.warning(f"Moved {moved} rows from {default} into new partition {name}")
+    return name
+
+
+def convert_to_partitioned():
+    """
+    Rebuild location_update as a table range-partitioned by month on timestamp
+
+    The existing table is renamed, a partitioned table with the same columns
+    takes its name, monthly partitions are created for the months that hold data
+    and the rows are copied across in one transaction. Rows with timestamps
+    outside every monthly partition land in the default partition.
+
+    Returns:
+        int: Number of rows copied, or None when the table was already partitioned
+    """
+    if not is_postgresql():
+        raise RuntimeError("Partitioning requires PostgreSQL")
+
+    legacy = f"{TABLE}_legacy"
+    with db.engine.begin() as conn:
+        if is_partitioned(conn):
+            return None
+
+        # Stop writers for the duration of the copy
+        conn.execute(text(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE'))
+        conn.execute(text(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"'))
+        # Index names are schema-wide, so move the old ones out of the way
+        for index in inspect(conn).get_indexes(legacy) + [inspect(conn).get_pk_constraint(legacy)]:
+            if index.get('name'):
+                conn.execute(text(f'ALTER INDEX "{index["name"]}" RENAME TO "{index["name"]}_legacy"'))
+
+        # The partition key has to be part of the primary key
+        conn.execute(text(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS, '
+            f'PRIMARY KEY (id, timestamp), '
+            f'FOREIGN KEY (load_id) REFERENCES load (id)) '
+            f'PARTITION BY RANGE (timestamp)'
+        ))
+        conn.execute(text(f'ALTER SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id'))
+        conn.execute(text(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT'))
+
+        bounds = conn.execute(text(
+            f'SELECT min(timestamp), max(timestamp) FROM "{legacy}"'
+        )).one()
+        today = month_start(datetime.utcnow())
+        first = month_start(bounds[0]) if bounds[0] else today
+        last = max(month_start(bounds[1]) if bounds[1] else today, today)
+        start = first
+        while start <= add_months(last, 2):
+            _create_partition(conn, start)
+            start = add_months(start, 1)
+
+        copied = conn.execute(text(
+            f'INSERT INTO "{TABLE}" (id, load_id, lat, lng, speed, heading, timestamp) '
+            f"SELECT id, load_id, lat, lng, speed, heading, COALESCE(timestamp, 'epoch'::timestamp) "
+            f'FROM "{legacy}"'
+        )).rowcount
+        conn.execute(text(f'DROP TABLE "{legacy}"'))
+
+    # Declared indexes are created on the parent and cascade to every partition
+    from services.db_maintenance import create_missing_indexes
+    create_missing_indexes([LocationUpdate.__table__])
+
+    logger.info(f"Converted {TABLE} to monthly partitions, copied {copied} rows")
+    return copied
+
+
+def ensure_partitions(months_ahead=2, now=None, connection=None):
+    """
+    Create the monthly partitions from the current month through months_ahead
+
+    Args:
+        months_ahead (int): Months past the current one to create
+        now (datetime, optional): Reference time, defaults to utcnow
+        connection (Connection, optional): Run in this connection's transaction instead of a new one
+
+    Returns:
+        list: Names of the partitions that were created
+    """
+    if not is_postgresql(connection.engine if connection is not None else None):
+        return []
+    if connection is not None:
+        return _ensure_partitions(connection, month_start(now or datetime.utcnow()), months_ahead)
+    with db.engine.begin() as conn:
+        return _ensure_partitions(conn, month_start(now or datetime.utcnow()), months_ahead)
+
+
+def _ensure_partitions(conn, start, months_ahead):
+    created = []
+    if not is_partitioned(conn):
+        return created
+    existing = {name for name, _ in list_partitions(conn)}
+    for offset in range(months_ahead + 1):
+        month = add_months(start, offset)
+        if partition_name(month) not in existing:
+            created.append(_create_partition(conn, month))
+            logger.info(f"Created partition {created[-1]}")
+    return created
+
+
+def drop_partitions(older_than):
+    """
+    Drop whole partitions (or, when unpartitioned, delete rows) older than a cutoff
+
+    Only partitions that end on or before the cutoff are dropped; rows from the
+    cutoff's own month stay until the next month is past.
+
+    Args:
+        older_than (datetime): Breadcrumbs before this time are removed
+
+    Returns:
+        tuple: (dropped partition names, rows deleted from an unpartitioned table or the default partition)
+    """
+    dropped = []
+    with db.engine.begin() as conn:
+        if is_postgresql() and is_partitioned(conn):
+            for name, start in list_partitions(conn):
+                if add_months(start, 1) <= older_than.date():
+                    conn.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"'))
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+                    dropped.append(name)
+                    logger.info(f"Dropped partition {name}")
+            target = f'"{TABLE}_default"'
+        else:
+            target = f'"{TABLE}"'
+
+        deleted = conn.execute(text(
+            f"DELETE FROM {target} WHERE timestamp < :cutoff"
+        ), {'cutoff': older_than}).rowcount
+    return dropped, deleted
+
+
+def downsample(older_than, bucket_minutes=DEFAULT_BUCKET_MINUTES, newer_than=None):
+    """
+    Thin breadcrumbs older than a cutoff to one point per load per time bucket
+
+    The earliest point in each bucket is kept. Running it again over the same
+    range is a no-op, so newer_than only bounds how much is re-scanned.
+
+    Args:
+        older_than (datetime): Only breadcrumbs before this time are thinned
+        bucket_minutes (int): Bucket width in minutes
+        newer_than (datetime, optional): Only breadcrumbs at or after this time are thinned
+
+    Returns:
+        int: Number of rows deleted
+    """
+    window = "timestamp < :older_than"
+    params = {'older_than': older_than, 'bucket_seconds': bucket_minutes * 60}
+    if newer_than:
+        window += " AND timestamp >= :newer_than"
+        params['newer_than'] = newer_than
+
+    if is_postgresql():
+        bucket = "floor(extract(epoch FROM timestamp) / :bucket_seconds)"
+    else:
+        bucket = "CAST(strftime('%s', timestamp) AS INTEGER) / :bucket_seconds"
+
+    # Partition pruning applies to the timestamp range on both sides of the join
+    with db.engine.begin() as conn:
+        deleted = conn.execute(text(
+            f'DELETE FROM "{TABLE}" WHERE {window} AND id IN ('
+            f'  SELECT id FROM ('
+            f'    SELECT id, row_number() OVER (PARTITION BY load_id, {bucket} ORDER BY timestamp, id) AS position'
+            f'    FROM "{TABLE}" WHERE {window}'
+            f'  ) ranked WHERE position > 1'
+            f')'
+        ), params).rowcount
+
+    logger.info(f"Downsampled {TABLE} before {older_than}: deleted {deleted} rows")
+    return deleted
+
+
+def apply_retention(downsample_after_days=30, drop_after_days=365, bucket_minutes=DEFAULT_BUCKET_MINUTES,
+                    lookback_days=7, now=None):
+    """
+    Downsample aging breadcrumbs and drop expired ones
+
+    Args:
+        downsample_after_days (int): Thin breadcrumbs older than this many days
+        drop_after_days (int): Remove breadcrumbs older than this many days
+        bucket_minutes (int): Resolution kept for downsampled breadcrumbs
+        lookback_days (int): Days before the downsample cutoff to re-scan; None scans everything
+        now (datetime, optional): Reference time, defaults to utcnow
+
+    Returns:
+        dict: Rows downsampled, partitions dropped and rows deleted
+    """
+    now = now or datetime.utcnow()
+    downsample_cutoff = now - timedelta(days=downsample_after_days)
+    newer_than = downsample_cutoff - timedelta(days=lookback_days) if lookback_days is not None else None
+
+    downsampled = downsample(downsample_cutoff, bucket_minutes, newer_than)
+    dropped, deleted = drop_partitions(now - timedelta(days=drop_after_days))
+    return {'downsampled': downsampled, 'dropped_partitions': dropped, 'deleted': deleted}
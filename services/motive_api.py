@@ -1,42 +1,27 @@
 import requests
-import os
 from .logger import setup_logger
+from .motive_client import motive_client, describe_response
 
 logger = setup_logger(__name__)
 
-TOKEN_URL = "https://api.gomotive.com/oauth/token"
-VEHICLE_LOC_URL = "https://api.gomotive.com/v3/vehicle_locations"
-
-CLIENT_ID = os.getenv("MOTIVE_CLIENT_ID")
-CLIENT_SECRET = os.getenv("MOTIVE_SECRET")
+VEHICLE_LOC_PATH = "/v3/vehicle_locations"
 
 def get_access_token():
-    logger.info("Getting Motive OAuth token")
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET
-    }
-    response = requests.post(TOKEN_URL, data=payload)
-    if response.status_code != 200:
-        logger.error(f"OAuth token error: {response.status_code} - {response.text}")
-        return None
-    return response.json().get("access_token")
+    """Cached Motive OAuth token (see MotiveClient.access_token)"""
+    return motive_client.access_token()
 
 def get_vehicle_locations():
     """Fetch vehicle locations using OAuth authentication"""
-    token = get_access_token()
-    if not token:
+    try:
+        response = motive_client.get(VEHICLE_LOC_PATH)
+    except requests.RequestException as e:
+        logger.error(f"Vehicle location request failed: {e}")
+        return []
+    if response is None:
         return []
-
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(VEHICLE_LOC_URL, headers=headers)
-
-    logger.info(f"Response Status: {response.status_code}")
-    logger.info(f"Response Body: {response.text}")
 
     if response.status_code != 200:
-        logger.error(f"Vehicle location error: {response.status_code} - {response.text}")
+        logger.error(f"Vehicle location error: {describe_response(response)}")
         return []
 
     data = response.json()
@@ -47,14 +32,21 @@ def get_vehicle_locations():
             "vehicle_id": v.get("vehicle", {}).get("id"),
             "latitude": v.get("location", {}).get("latitude"),
             "longitude": v.get("location", {}).get("longitude"),
+            "speed": v.get("location", {}).get("speed"),
+            "heading": v.get("location", {}).get("bearing"),
+            "located_at": v.get("location", {}).get("located_at"),
             "driver_name": v.get("driver", {}).get("name", "Unassigned")
         })
     logger.info(f"✅ Retrieved {len(vehicles)} vehicle locations from Motive")
     return vehicles
 
-def get_active_driver_locations():
-    """Get driver data from vehicles endpoint for backward compatibility"""
-    vehicles = get_vehicle_locations()
+def get_active_driver_locations(vehicles=None):
+    """Get driver data from vehicles endpoint for backward compatibility
+
+    Pass vehicles (e.g. a poller snapshot) to skip the Motive request.
+    """
+    if vehicles is None:
+        vehicles = get_vehicle_locations()
     driver_locations = []
     
     for vehicle in vehicles:
@@ -66,4 +58,4 @@ def get_active_driver_locations():
                 "vehicle_id": vehicle["vehicle_id"]
             })
     
-    return driver_locations
\ No newline at end of file
+    return driver_locations
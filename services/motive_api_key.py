@@ -1,48 +1,75 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from .logger import setup_logger
+from .motive_client import motive_client, describe_response, POOL_MAXSIZE
 
 logger = setup_logger(__name__)
 
-API_KEY = os.getenv("MOTIVE_API_KEY")
-BASE_URL = "https://api.gomotive.com/v1"
+USERS_PATH = "/v1/users"
+
+# Pages fetched at once after the first; never more than the client's connection pool
+MAX_CONCURRENT_PAGES = min(int(os.getenv("MOTIVE_MAX_CONCURRENCY", 4)), POOL_MAXSIZE)
+
+# Each page gets this many attempts, with linear backoff between them
+PAGE_ATTEMPTS = 3
+PAGE_RETRY_BACKOFF_SECONDS = 1
+
+def _fetch_users_page(page):
+    """
+    One page of /v1/users, retried on errors and non-200 responses
+
+    Returns:
+        dict: The page's JSON, or None if every attempt failed
+    """
+    for attempt in range(1, PAGE_ATTEMPTS + 1):
+        try:
+            response = motive_client.get_with_api_key(USERS_PATH, params={"page_no": page})
+            logger.info(f"Drivers API ({USERS_PATH}) page {page} response: {response.status_code}")
+            if response.status_code == 200:
+                return response.json()
+            logger.warning(f"Failed to get drivers page {page} (attempt {attempt}): {describe_response(response)}")
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Failed to get drivers page {page} (attempt {attempt}): {e}")
+        if attempt < PAGE_ATTEMPTS:
+            time.sleep(PAGE_RETRY_BACKOFF_SECONDS * attempt)
+    logger.error(f"Giving up on drivers page {page} after {PAGE_ATTEMPTS} attempts")
+    return None
 
 def get_drivers():
-    """Get all drivers using API key authentication with pagination"""
-    if not API_KEY:
+    """Get all drivers using API key authentication with pagination
+
+    The first page gives the page count; the remaining pages are fetched
+    concurrently and merged in page order.
+    """
+    if not motive_client.api_key:
         logger.error("MOTIVE_API_KEY not found in environment")
         return []
     
-    headers = {
-        "X-API-KEY": API_KEY,
-        "Content-Type": "application/json"
-    }
-    
-    # Use the working users endpoint with pagination
-    endpoint = "https://api.gomotive.com/v1/users"
-    all_drivers = []
-    page = 1
-    
     try:
-        while True:
-            response = requests.get(f"{endpoint}?page_no={page}", headers=headers)
-            logger.info(f"Drivers API ({endpoint}) page {page} response: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                drivers = data.get('users', [])
-                all_drivers.extend(drivers)
-                
-                # Check pagination
-                pagination = data.get('pagination', {})
-                total_pages = (pagination.get('total', 0) + pagination.get('per_page', 25) - 1) // pagination.get('per_page', 25)
-                
-                if page >= total_pages:
-                    break
-                page += 1
-            else:
-                logger.error(f"Failed to get drivers page {page}: {response.status_code} - {response.text}")
-                break
+        first = _fetch_users_page(1)
+        if first is None:
+            return []
+        
+        pagination = first.get('pagination', {})
+        per_page = pagination.get('per_page') or 25
+        total_pages = (pagination.get('total', 0) + per_page - 1) // per_page
+        
+        pages = [first]
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_PAGES, total_pages - 1)) as executor:
+                # map yields results in page order whatever order they finish in
+                pages.extend(executor.map(_fetch_users_page, range(2, total_pages + 1)))
+        
+        missing = [page for page, data in enumerate(pages, start=1) if data is None]
+        if missing:
+            logger.error(f"Drivers list is incomplete; pages {missing} of {total_pages} failed")
+        
+        all_drivers = []
+        for data in pages:
+            if data is not None:
+                all_drivers.extend(data.get('users', []))
         
         # Filter for only active drivers (role=driver, status=active)
         active_drivers = []
@@ -51,7 +78,7 @@ def get_drivers():
             if user_data.get('status') == 'active' and user_data.get('role') == 'driver':
                 active_drivers.append(user_item)
         
-        logger.info(f"Retrieved {len(all_drivers)} total users, {len(active_drivers)} active drivers from Motive across {page} pages")
+        logger.info(f"Retrieved {len(all_drivers)} total users, {len(active_drivers)} active drivers from Motive across {max(total_pages, 1)} pages")
         return active_drivers
     except Exception as e:
         logger.error(f"Error getting drivers: {e}")
@@ -59,27 +86,21 @@ def get_drivers():
 
 def get_vehicles():
     """Get all vehicles using API key authentication"""
-    if not API_KEY:
+    if not motive_client.api_key:
         logger.error("MOTIVE_API_KEY not found in environment")
         return []
     
-    headers = {
-        "X-API-KEY": API_KEY,
-        "Content-Type": "application/json"
-    }
-    
     # Try multiple potential endpoints
     endpoints = [
-        f"{BASE_URL}/vehicles",
-        f"{BASE_URL}/assets",
-        "https://api.gomotive.com/v1/vehicles", 
-        "https://api.gomotive.com/v2/vehicles",
-        "https://api.gomotive.com/vehicles"
+        "/v1/vehicles",
+        "/v1/assets",
+        "/v2/vehicles",
+        "/vehicles"
     ]
     
     for endpoint in endpoints:
         try:
-            response = requests.get(endpoint, headers=headers)
+            response = motive_client.get_with_api_key(endpoint)
             logger.info(f"Vehicles API ({endpoint}) response: {response.status_code}")
             
             if response.status_code == 200:
@@ -89,9 +110,9 @@ def get_vehicles():
                     logger.info(f"Retrieved {len(vehicles)} vehicles from Motive")
                     return vehicles
                 else:
-                    logger.info(f"Empty response from {endpoint}: {data}")
+                    logger.info(f"Empty response from {endpoint}")
             elif response.status_code != 404:
-                logger.info(f"Response from {endpoint}: {response.text[:200]}")
+                logger.info(f"Response from {endpoint}: {describe_response(response)}")
         except Exception as e:
             logger.error(f"Error with endpoint {endpoint}: {e}")
             continue
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MOTIVE_BASE_URL = os.getenv("MOTIVE_BASE_URL", "https://api.gomotive.com")
+TOKEN_URL = f"{MOTIVE_BASE_URL}/oauth/token"
+
+# (connect, read) timeout in seconds for every Motive request
+REQUEST_TIMEOUT = (3.05, float(os.getenv("MOTIVE_TIMEOUT", 15)))
+
+# Enough pooled connections for the concurrent page fetches
+POOL_MAXSIZE = int(os.getenv("MOTIVE_POOL_MAXSIZE", 8))
+
+# Tokens are refreshed this long before they expire, so no request goes out with one about to lapse
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Used when the token response carries no expires_in
+DEFAULT_TOKEN_LIFETIME_SECONDS = 3600
+
+# Error bodies are logged up to this many characters
+LOG_BODY_CHARS = 200
+
+
+def _build_session():
+    """Keep-alive session that retries idempotent requests on throttling and gateway errors"""
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def describe_response(response):
+    """Short status line for logs: status code plus the start of the body"""
+    return f"{response.status_code} - {response.text[:LOG_BODY_CHARS]}"
+
+
+class MotiveClient:
+    """
+    Shared Motive HTTP client
+
+    Holds one pooled session for all Motive calls and caches the OAuth access
+    token until shortly before it expires. Requests authenticate either with
+    the OAuth bearer token or with the X-API-KEY header.
+    """
+
+    def __init__(self, base_url=MOTIVE_BASE_URL, client_id=None, client_secret=None, api_key=None):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id or os.getenv("MOTIVE_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("MOTIVE_SECRET")
+        self.api_key = api_key or os.getenv("MOTIVE_API_KEY")
+        self.session = _build_session()
+        self._token_lock = threading.Lock()
+        self._token = None
+        self._token_expires_at = 0
+
+    def access_token(self, force_refresh=False):
+        """
+        Cached OAuth access token, fetched again when it is near expiry
+
+        Args:
+            force_refresh (bool): Ignore the cached token
+
+        Returns:
+            str: Access token, or None if the token request failed
+        """
+        with self._token_lock:
+            if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+
+            logger.info("Getting Motive OAuth token")
+            payload = {
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret
+            }
+            try:
+                response = self.session.post(f"{self.base_url}/oauth/token", data=payload, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.error(f"OAuth token request failed: {e}")
+                return None
+            if response.status_code != 200:
+                logger.error(f"OAuth token error: {describe_response(response)}")
+                return None
+
+            data = response.json()
+            lifetime = int(data.get("expires_in") or DEFAULT_TOKEN_LIFETIME_SECONDS)
+            self._token = data.get("access_token")
+            self._token_expires_at = time.monotonic() + max(lifetime - TOKEN_REFRESH_MARGIN_SECONDS, lifetime / 2)
+            return self._token
+
+    def invalidate_token(self):
+        """Drop the cached token so the next request fetches a new one"""
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0
+
+    def _url(self, path):
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None):
+        """
+        GET with the OAuth bearer token
+
+        A 401 drops the cached token and the request is retried once with a new one.
+
+        Args:
+            path (str): Path below the base URL, e.g. "/v3/vehicle_locations"
+            params (dict, optional): Query parameters
+
+        Returns:
+            requests.Response: The response, or None if no token could be obtained
+        """
+        for attempt in range(2):
+            token = self.access_token()
+            if not token:
+                return None
+            response = self.session.get(self._url(path), params=params, timeout=REQUEST_TIMEOUT,
+                                        headers={"Authorization": f"Bearer {token}"})
+            if response.status_code != 401 or attempt:
+                return response
+            logger.warning("Motive rejected the cached OAuth token; fetching a new one")
+            self.invalidate_token()
+        return response
+
+    def get_with_api_key(self, path, params=None):
+        """
+        GET authenticated with the X-API-KEY header
+
+        Returns:
+            requests.Response: The response, or None if MOTIVE_API_KEY is not set
+        """
+        if not self.api_key:
+            logger.error("MOTIVE_API_KEY not found in environment")
+            return None
+        return self.session.get(self._url(path), params=params, timeout=REQUEST_TIMEOUT,
+                                headers={"X-API-KEY": self.api_key, "Content-Type": "application/json"})
+
+
+motive_client = MotiveClient()
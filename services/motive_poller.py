@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import Vehicle, TelematicsSnapshot
+from services.motive_api import get_vehicle_locations, get_active_driver_locations
+from services.motive_client import motive_client
+from services.location_ingest import parse_ping_timestamp, parse_pings, ingest_pings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'motive_vehicle_locations'
+
+POLL_INTERVAL_SECONDS = float(os.environ.get('MOTIVE_POLL_SECONDS', 60))
+
+# Set MOTIVE_POLLER=false to keep web workers from polling, e.g. when cron runs `maintenance.py motive-poll`
+POLLER_ENABLED = os.environ.get('MOTIVE_POLLER', 'true').lower() == 'true'
+
+# A lease older than this is considered abandoned by a worker that died mid-poll
+LEASE_SECONDS = max(POLL_INTERVAL_SECONDS * 3, 120)
+
+# Web requests re-read the shared snapshot row at most this often per worker
+SNAPSHOT_READ_SECONDS = 5
+
+# ETAs are re-estimated locally after every poll; low-confidence ones go to Google at most this often
+ETA_GOOGLE_REFRESH_SECONDS = float(os.environ.get('ETA_GOOGLE_REFRESH_SECONDS', 900))
+
+
+def _claim(now, only_if_due=True):
+    """
+    Take the poll lease, by default only if the last poll is due
+
+    A conditional UPDATE on the snapshot row, so exactly one worker wins each
+    cycle whatever the database.
+
+    Args:
+        now (datetime): Current time
+        only_if_due (bool): Also require POLL_INTERVAL_SECONDS since the last poll
+
+    Returns:
+        bool: True if this worker should poll now
+    """
+    table = TelematicsSnapshot.__table__
+    conditions = [
+        table.c.name == SNAPSHOT_NAME,
+        (table.c.claimed_at.is_(None)) | (table.c.claimed_at <= now - timedelta(seconds=LEASE_SECONDS))
+    ]
+    if only_if_due:
+        due = now - timedelta(seconds=POLL_INTERVAL_SECONDS)
+        conditions.append((table.c.fetched_at.is_(None)) | (table.c.fetched_at <= due))
+    with db.engine.begin() as conn:
+        claimed = conn.execute(update(table).where(*conditions).values(claimed_at=now)).rowcount
+        if claimed:
+            return True
+        exists = conn.execute(select(table.c.name).where(table.c.name == SNAPSHOT_NAME)).first()
+    if exists:
+        return False
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(table).values(name=SNAPSHOT_NAME, claimed_at=now))
+        return True
+    except IntegrityError:
+        # Another worker created the row, and with it the lease, first
+        return False
+
+
+def _store_snapshot(vehicles, fetched_at):
+    table = TelematicsSnapshot.__table__
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(table).where(table.c.name == SNAPSHOT_NAME).values(
+                payload=json.dumps(vehicles, separators=(',', ':')),
+                fetched_at=fetched_at,
+                claimed_at=None
+            )
+        )
+
+
+def _release():
+    table = TelematicsSnapshot.__table__
+    with db.engine.begin() as conn:
+        conn.execute(update(table).where(table.c.name == SNAPSHOT_NAME).values(claimed_at=None))
+
+
+def vehicle_pings(vehicles):
+    """
+    Raw pings for the Motive vehicles known locally, skipping fixes already stored
+
+    A parked truck reports the same fix every cycle; only fixes newer than the
+    vehicle's last_updated become breadcrumbs.
+
+    Returns:
+        tuple: (raw pings for parse_pings, Motive vehicles with no local Vehicle, unchanged fixes)
+    """
+    located = {str(v['vehicle_id']): v for v in vehicles
+               if v.get('vehicle_id') is not None and v.get('latitude') is not None and v.get('longitude') is not None}
+    if not located:
+        return [], 0, 0
+
+    known = db.session.execute(
+        select(Vehicle.motive_vehicle_id, Vehicle.id, Vehicle.last_updated)
+        .where(Vehicle.motive_vehicle_id.in_(located))
+    ).all()
+
+    raw_pings = []
+    unchanged = 0
+    for motive_id, vehicle_id, last_updated in known:
+        v = located[motive_id]
+        try:
+            located_at = parse_ping_timestamp(v.get('located_at'))
+        except ValueError:
+            located_at = None
+        if last_updated and located_at and located_at <= last_updated:
+            unchanged += 1
+            continue
+        raw_pings.append({
+            'vehicle_id': vehicle_id,
+            'lat': v['latitude'],
+            'lng': v['longitude'],
+            'speed': v.get('speed'),
+            'heading': v.get('heading'),
+            'timestamp': v.get('located_at')
+        })
+    return raw_pings, len(located) - len(known), unchanged
+
+
+def poll_once(now=None):
+    """
+    Fetch vehicle locations from Motive and apply them in one batch
+
+    Vehicle positions are bulk-updated and breadcrumbs appended for vehicles on
+    scheduled or in-transit loads (services.location_ingest), the resulting
+    load pings run through the geofence state machines, the raw list is
+    stored as the snapshot web requests read, and in-transit ETAs are
+    re-estimated (services.eta_engine).
+
+    Returns:
+        dict: Counts of vehicles fetched, breadcrumbs inserted, vehicles moved,
+            unknown vehicles, unchanged fixes and invalid pings, plus geofence results
+    """
+    from services.geofence_stream import geofence_stream
+
+    now = now or datetime.utcnow()
+    vehicles = get_vehicle_locations()
+
+    raw_pings, unknown, unchanged = vehicle_pings(vehicles)
+    pings, invalid = parse_pings(raw_pings)
+
+    result = ingest_pings(pings)
+    load_pings = result.pop('load_pings')
+    if load_pings:
+        try:
+            result['geofence'] = geofence_stream.ingest(load_pings)
+        except Exception as e:
+            # The positions are already stored; the next poll's pings will be evaluated as usual
+            db.session.rollback()
+            logger.error(f"Error applying geofences to polled locations: {e}")
+
+    # An empty fetch usually means Motive was unreachable; keep serving the last good snapshot
+    if vehicles:
+        _store_snapshot(vehicles, now)
+    else:
+        _release()
+
+    result['etas'] = _refresh_etas(now)
+
+    result.update({'fetched': len(vehicles), 'unknown_vehicles': unknown, 'unchanged': unchanged,
+                   'invalid': len(invalid)})
+    logger.info(f"Motive poll: {len(vehicles)} vehicles, {result['vehicles_updated']} moved, "
+                f"{result['inserted']} breadcrumbs")
+    return result
+
+
+def _refresh_etas(now):
+    """
+    Re-estimate current ETAs from the positions just stored; failures do not fail the poll
+
+    The last Google refresh is kept on the snapshot row, so the schedule holds
+    whichever worker wins the poll lease.
+    """
+    from services.eta_engine import refresh_current_etas
+
+    table = TelematicsSnapshot.__table__
+    with db.engine.connect() as conn:
+        refreshed_at = conn.execute(
+            select(table.c.google_refreshed_at).where(table.c.name == SNAPSHOT_NAME)
+        ).scalar()
+    use_google = refreshed_at is None or now - refreshed_at >= timedelta(seconds=ETA_GOOGLE_REFRESH_SECONDS)
+    try:
+        etas = refresh_current_etas(now, use_google=use_google)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error refreshing ETAs after Motive poll: {e}")
+        return {'error': str(e)}
+    if use_google:
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.name == SNAPSHOT_NAME).values(google_refreshed_at=now))
+    return etas
+
+
+def poll_with_lease(now=None, only_if_due=True):
+    """
+    Run poll_once under the shared lease, so no two processes poll the same cycle
+
+    Args:
+        now (datetime, optional): Current time
+        only_if_due (bool): Skip when the last poll was under POLL_INTERVAL_SECONDS ago
+
+    Returns:
+        dict: poll_once result, or None when another process holds the lease
+            (or, with only_if_due, the poll is not due yet)
+    """
+    now = now or datetime.utcnow()
+    if not _claim(now, only_if_due):
+        return None
+    try:
+        return poll_once(now)
+    except Exception:
+        db.session.rollback()
+        _release()
+        raise
+
+
+class MotiveLocationPoller:
+    """
+    Background thread that polls Motive for vehicle locations every POLL_INTERVAL_SECONDS
+
+    Every web worker runs one, but the lease on the snapshot row lets only one
+    of them fetch per cycle. The others read the stored snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._snapshot = None
+        self._snapshot_read_at = 0
+
+    def ensure_running(self):
+        """Start the polling thread if it is not running; cheap enough to call on every request"""
+        if not POLLER_ENABLED or app.config.get('SAFE_MODE') or not motive_client.client_id:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='motive-poller', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            with app.app_context():
+                try:
+                    poll_with_lease()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Motive location poll failed: {e}")
+                finally:
+                    db.session.remove()
+            time.sleep(max(POLL_INTERVAL_SECONDS - (time.monotonic() - started), 1))
+
+    def snapshot(self):
+        """
+        The last vehicle locations stored by any worker's poller
+
+        Returns:
+            tuple: (vehicles list, fetched_at datetime or None)
+        """
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._snapshot_read_at < SNAPSHOT_READ_SECONDS:
+                return self._snapshot
+
+        row = db.session.execute(
+            select(TelematicsSnapshot.payload, TelematicsSnapshot.fetched_at)
+            .where(TelematicsSnapshot.name == SNAPSHOT_NAME)
+        ).first()
+        snapshot = (json.loads(row.payload), row.fetched_at) if row and row.payload else ([], None)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_read_at = time.monotonic()
+        return snapshot
+
+
+motive_poller = MotiveLocationPoller()
+
+
+def latest_vehicle_locations():
+    """Vehicle locations from the last poll, without calling Motive"""
+    return motive_poller.snapshot()[0]
+
+
+def latest_driver_locations():
+    """Driver locations from the last poll, in the get_active_driver_locations format"""
+    return get_active_driver_locations(latest_vehicle_locations())
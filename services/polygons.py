@@ -0,0 +1,185 @@
+from functools import lru_cache
+import numpy as np
+
+# Encoded polylines store coordinates to 1e-5 degrees, about 1.1 m
+POLYLINE_PRECISION = 1e5
+
+MIN_POLYGON_VERTICES = 3
+
+
+def encode_polyline(points):
+    """
+    Encode (lat, lng) points with Google's encoded polyline algorithm
+
+    The same format is decoded in the browser by google.maps.geometry.encoding.decodePath,
+    so the stored value can be served to the map as is.
+
+    Args:
+        points (list): (lat, lng) pairs
+
+    Returns:
+        str: Encoded polyline
+    """
+    chunks = []
+    previous_lat = previous_lng = 0
+    for lat, lng in points:
+        lat, lng = int(round(lat * POLYLINE_PRECISION)), int(round(lng * POLYLINE_PRECISION))
+        for delta in (lat - previous_lat, lng - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lng = lat, lng
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded):
+    """
+    Decode an encoded polyline into (lat, lng) points
+
+    Args:
+        encoded (str): Encoded polyline
+
+    Returns:
+        list: (lat, lng) tuples
+
+    Raises:
+        ValueError: If the string is not a valid encoded polyline
+    """
+    points = []
+    index = 0
+    lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated encoded polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                if not 0 <= byte < 64:
+                    raise ValueError("Invalid character in encoded polyline")
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / POLYLINE_PRECISION, lng / POLYLINE_PRECISION))
+    return points
+
+
+def normalize_polygon(points):
+    """
+    Validate polygon vertices and drop a repeated closing vertex
+
+    Args:
+        points (list): (lat, lng) pairs
+
+    Returns:
+        list: (lat, lng) float tuples
+
+    Raises:
+        ValueError: If there are too few vertices or a coordinate is out of range
+    """
+    vertices = [(float(lat), float(lng)) for lat, lng in points]
+    if len(vertices) > 1 and vertices[0] == vertices[-1]:
+        vertices.pop()
+    if len(vertices) < MIN_POLYGON_VERTICES:
+        raise ValueError(f"A polygon needs at least {MIN_POLYGON_VERTICES} vertices")
+    for lat, lng in vertices:
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"Vertex ({lat}, {lng}) is out of range")
+    return vertices
+
+
+def polygon_bbox(points):
+    """(min_lat, min_lng, max_lat, max_lng) of a polygon's vertices"""
+    lats = [lat for lat, _ in points]
+    lngs = [lng for _, lng in points]
+    return min(lats), min(lngs), max(lats), max(lngs)
+
+
+@lru_cache(maxsize=2048)
+def polygon_arrays(encoded):
+    """
+    Vertex arrays for an encoded polygon, decoded once per distinct polygon
+
+    Returns:
+        tuple: (lats, lngs) read-only numpy arrays
+    """
+    points = decode_polyline(encoded)
+    lats = np.array([lat for lat, _ in points], dtype=float)
+    lngs = np.array([lng for _, lng in points], dtype=float)
+    lats.flags.writeable = False
+    lngs.flags.writeable = False
+    return lats, lngs
+
+
+def points_in_polygon(lats, lngs, polygon_lats, polygon_lngs):
+    """
+    Vectorized even-odd point-in-polygon test
+
+    Casts a ray from each point towards increasing longitude and counts the polygon
+    edges it crosses. Work is one pass per edge over all points, so it suits many
+    points against one polygon.
+
+    Args:
+        lats, lngs (array-like): Point coordinates
+        polygon_lats, polygon_lngs (array-like): Polygon vertices in order, not closed
+
+    Returns:
+        numpy.ndarray: Boolean array, True where the point is inside
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    inside = np.zeros(lats.shape, dtype=bool)
+
+    previous = len(polygon_lats) - 1
+    for current in range(len(polygon_lats)):
+        lat_a, lng_a = polygon_lats[current], polygon_lngs[current]
+        lat_b, lng_b = polygon_lats[previous], polygon_lngs[previous]
+        previous = current
+        if lat_a == lat_b:
+            continue
+
+        # Half-open straddle test so a ray through a vertex is counted once
+        straddles = (lat_a > lats) != (lat_b > lats)
+        crossing_lng = lng_a + (lats - lat_a) * (lng_b - lng_a) / (lat_b - lat_a)
+        inside ^= straddles & (lngs < crossing_lng)
+
+    return inside
+
+
+def in_bbox(lats, lngs, bbox):
+    """Vectorized bounding box test; bbox is (min_lat, min_lng, max_lat, max_lng)"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    return (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+
+
+def points_in_encoded_polygon(lats, lngs, encoded, bbox):
+    """
+    Point-in-polygon for a stored polygon, rejecting points outside its bounding box first
+
+    Args:
+        lats, lngs (array-like): Point coordinates
+        encoded (str): Encoded polygon vertices
+        bbox (tuple): Precomputed (min_lat, min_lng, max_lat, max_lng)
+
+    Returns:
+        numpy.ndarray: Boolean array, True where the point is inside
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    inside = in_bbox(lats, lngs, bbox)
+    if inside.any():
+        polygon_lats, polygon_lngs = polygon_arrays(encoded)
+        candidates = np.flatnonzero(inside)
+        inside[candidates] = points_in_polygon(lats[candidates], lngs[candidates], polygon_lats, polygon_lngs)
+    return inside
@@ -0,0 +1,160 @@
+import logging
+import os
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response, Response
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app import db
+from models import Load, Driver, Notification, CacheGeneration
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = 'reporting'
+
+# Writes to these models invalidate every cached response
+TRACKED_MODELS = (Load, Driver, Notification)
+
+DEFAULT_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+
+# Recomputed for every response rather than replayed from the cache
+UNCACHED_HEADERS = ('Content-Length', 'Set-Cookie', 'X-Cache')
+
+# Callables invoked after this worker bumps the generation, e.g. to wake the live update stream
+generation_listeners = []
+
+
+class ResponseCache(TTLCache):
+    """
+    In-process LRU of rendered responses tagged with the write generation they were built at
+
+    Entries from an older generation are treated as misses, so a bump of the shared
+    CacheGeneration row invalidates the cache of every worker at once.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=DEFAULT_TTL):
+        super().__init__(max_entries, ttl)
+
+    def get(self, key, generation):
+        entry = super().get(key, lambda entry: entry[0] == generation)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, generation, value, ttl=None):
+        super().set(key, (generation, value), ttl)
+
+    def stats(self):
+        stats = super().stats()
+        # Expired here also covers entries from an older generation
+        stats['stale'] = stats.pop('expired')
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def current_generation(name=CACHE_NAMESPACE):
+    """Read a shared write generation, by default the one guarding cached responses"""
+    generation = db.session.execute(
+        select(CacheGeneration.generation).where(CacheGeneration.name == name)
+    ).scalar()
+    return generation or 0
+
+
+def bump_generation(name=CACHE_NAMESPACE):
+    """Increment a shared write generation in its own short transaction"""
+    table = CacheGeneration.__table__
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.name == name)
+                .values(generation=table.c.generation + 1, updated_at=datetime.utcnow())
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(table).values(name=name, generation=1, updated_at=datetime.utcnow()))
+    except IntegrityError:
+        # Another worker created the row first; its bump already invalidated the cache
+        pass
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to bump {name} generation: {e}")
+        if name == CACHE_NAMESPACE:
+            response_cache.clear()
+
+    if name == CACHE_NAMESPACE:
+        for listener in generation_listeners:
+            listener()
+
+
+def _cache_key():
+    """Endpoint plus normalized query args; the UTC date covers the relative default periods"""
+    args = tuple(sorted((key, tuple(sorted(request.args.getlist(key)))) for key in request.args))
+    return (request.endpoint, args, datetime.utcnow().date())
+
+
+def cached_response(ttl=None):
+    """
+    Cache a JSON view's successful responses until the next tracked write
+
+    Args:
+        ttl (int, optional): Maximum age in seconds, defaults to RESPONSE_CACHE_TTL
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                generation = current_generation()
+            except SQLAlchemyError as e:
+                logger.warning(f"Response cache bypassed: {e}")
+                db.session.rollback()
+                return view(*args, **kwargs)
+
+            key = _cache_key()
+            cached = response_cache.get(key, generation)
+            if cached is not None:
+                body, status, headers = cached
+                response = Response(body, status=status, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                headers = [(name, value) for name, value in response.headers if name not in UNCACHED_HEADERS]
+                response_cache.set(key, generation, (response.get_data(), response.status_code, headers), ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _touches_tracked_models(objects):
+    return any(isinstance(obj, TRACKED_MODELS) for obj in objects)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _mark_tracked_writes(session, flush_context):
+    if _touches_tracked_models(session.new) or _touches_tracked_models(session.dirty) \
+            or _touches_tracked_models(session.deleted):
+        session.info['response_cache_dirty'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_bulk_writes(orm_execute_state):
+    """Query.update()/delete() bypass the flush, so catch them here"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    tracked = {model.__mapper__ for model in TRACKED_MODELS}
+    if any(mapper in tracked for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info['response_cache_dirty'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('response_cache_dirty', False):
+        bump_generation()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('response_cache_dirty', None)
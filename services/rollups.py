@@ -0,0 +1,303 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, case, and_, literal, select, union_all, delete, insert, exists, tuple_, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from app import db
+from models import Load, DriverPerformance
+
+logger = logging.getLogger(__name__)
+
+# Load attributes that feed the rollup; any change to these re-aggregates the affected days
+ROLLUP_FIELDS = (
+    'driver_id',
+    'scheduled_pickup_time',
+    'actual_pickup_arrival',
+    'scheduled_delivery_time',
+    'actual_delivery_arrival'
+)
+
+ROLLUP_COLUMNS = (
+    'loads_completed',
+    'on_time_pickups',
+    'on_time_deliveries',
+    'on_time_loads',
+    'delay_minutes_total',
+    'delay_count',
+    'deliveries',
+    'deliveries_on_time',
+    'deliveries_on_time_pickup'
+)
+
+
+class minutes_between(FunctionElement):
+    """SQL expression for the number of minutes from earlier to later"""
+    type = db.Float()
+    inherit_cache = True
+    name = 'minutes_between'
+
+
+@compiles(minutes_between)
+def _minutes_between_default(element, compiler, **kw):
+    later, earlier = element.clauses
+    return f"(EXTRACT(EPOCH FROM {compiler.process(later, **kw)} - {compiler.process(earlier, **kw)}) / 60.0)"
+
+
+@compiles(minutes_between, 'sqlite')
+def _minutes_between_sqlite(element, compiler, **kw):
+    later, earlier = element.clauses
+    return (f"((strftime('%s', {compiler.process(later, **kw)}) - "
+            f"strftime('%s', {compiler.process(earlier, **kw)})) / 60.0)")
+
+
+@compiles(minutes_between, 'mysql')
+def _minutes_between_mysql(element, compiler, **kw):
+    later, earlier = element.clauses
+    return f"(TIMESTAMPDIFF(SECOND, {compiler.process(earlier, **kw)}, {compiler.process(later, **kw)}) / 60.0)"
+
+
+class day_of(FunctionElement):
+    """SQL expression for the calendar day of a timestamp"""
+    type = db.Date()
+    inherit_cache = True
+    name = 'day_of'
+
+
+@compiles(day_of)
+def _day_of_default(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE)"
+
+
+@compiles(day_of, 'sqlite')
+def _day_of_sqlite(element, compiler, **kw):
+    # SQLite has no DATE type; CAST(... AS DATE) would yield the year as a number
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+
+def _count_if(*conditions):
+    return func.count(case((and_(*conditions), 1)))
+
+
+def _sum_if(condition, value):
+    return func.coalesce(func.sum(case((condition, value))), 0.0)
+
+
+def _day_range(column, start_date=None, end_date=None):
+    """Half-open timestamp range covering the days from start_date through end_date"""
+    conditions = []
+    if start_date:
+        conditions.append(column >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        conditions.append(column < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return and_(*conditions)
+
+
+def _aggregate_select(driver_ids=None, start_date=None, end_date=None):
+    """
+    Build the per-driver, per-day aggregate of the Load table
+
+    Scheduled-pickup counters are attributed to the scheduled pickup date and
+    delivery counters to the actual delivery arrival date, so each half is
+    aggregated separately and the two are summed per (driver_id, date).
+
+    Args:
+        driver_ids (iterable, optional): Restrict the aggregate to these drivers
+        start_date (date, optional): First day to aggregate
+        end_date (date, optional): Last day to aggregate
+
+    Returns:
+        Select: driver_id, date and one column per ROLLUP_COLUMNS entry
+    """
+    pickup_on_time = Load.actual_pickup_arrival <= Load.scheduled_pickup_time
+    delivery_on_time = Load.actual_delivery_arrival <= Load.scheduled_delivery_time
+    pickup_late = Load.actual_pickup_arrival > Load.scheduled_pickup_time
+    delivery_late = Load.actual_delivery_arrival > Load.scheduled_delivery_time
+
+    scheduled_day = day_of(Load.scheduled_pickup_time)
+    delivered_day = day_of(Load.actual_delivery_arrival)
+
+    by_schedule = select(
+        Load.driver_id.label('driver_id'),
+        scheduled_day.label('date'),
+        func.count(Load.id).label('loads_completed'),
+        _count_if(pickup_on_time).label('on_time_pickups'),
+        _count_if(delivery_on_time).label('on_time_deliveries'),
+        _count_if(pickup_on_time, delivery_on_time).label('on_time_loads'),
+        (_sum_if(pickup_late, minutes_between(Load.actual_pickup_arrival, Load.scheduled_pickup_time)) +
+         _sum_if(delivery_late, minutes_between(Load.actual_delivery_arrival, Load.scheduled_delivery_time))).label('delay_minutes_total'),
+        (_count_if(pickup_late) + _count_if(delivery_late)).label('delay_count'),
+        literal(0).label('deliveries'),
+        literal(0).label('deliveries_on_time'),
+        literal(0).label('deliveries_on_time_pickup')
+    ).where(Load.driver_id.isnot(None)).group_by(Load.driver_id, scheduled_day)
+
+    by_delivery = select(
+        Load.driver_id.label('driver_id'),
+        delivered_day.label('date'),
+        literal(0).label('loads_completed'),
+        literal(0).label('on_time_pickups'),
+        literal(0).label('on_time_deliveries'),
+        literal(0).label('on_time_loads'),
+        literal(0.0).label('delay_minutes_total'),
+        literal(0).label('delay_count'),
+        func.count(Load.id).label('deliveries'),
+        _count_if(delivery_on_time).label('deliveries_on_time'),
+        _count_if(pickup_on_time).label('deliveries_on_time_pickup')
+    ).where(
+        Load.driver_id.isnot(None),
+        Load.actual_delivery_arrival.isnot(None)
+    ).group_by(Load.driver_id, delivered_day)
+
+    if driver_ids is not None:
+        driver_ids = list(driver_ids)
+        by_schedule = by_schedule.where(Load.driver_id.in_(driver_ids))
+        by_delivery = by_delivery.where(Load.driver_id.in_(driver_ids))
+
+    if start_date or end_date:
+        by_schedule = by_schedule.where(_day_range(Load.scheduled_pickup_time, start_date, end_date))
+        by_delivery = by_delivery.where(_day_range(Load.actual_delivery_arrival, start_date, end_date))
+
+    combined = union_all(by_schedule, by_delivery).subquery()
+
+    totals = [func.sum(combined.c[name]).label(name) for name in ROLLUP_COLUMNS]
+    average_delay = case(
+        (func.sum(combined.c.delay_count) > 0,
+         func.sum(combined.c.delay_minutes_total) / func.sum(combined.c.delay_count)),
+        else_=0.0
+    ).label('average_delay_minutes')
+
+    return select(
+        combined.c.driver_id,
+        combined.c.date,
+        *totals,
+        average_delay,
+        literal(datetime.utcnow()).label('updated_at')
+    ).group_by(combined.c.driver_id, combined.c.date)
+
+
+def _upsert_aggregate(connection, aggregate):
+    """
+    Insert aggregate rows into driver_performance, replacing existing (driver_id, date) rows
+
+    PostgreSQL upserts in one statement; other databases delete the rows being
+    replaced and insert the aggregate in the same transaction.
+    """
+    table = DriverPerformance.__table__
+    column_names = ['driver_id', 'date', *ROLLUP_COLUMNS, 'average_delay_minutes', 'updated_at']
+
+    if connection.dialect.name == 'postgresql':
+        stmt = pg_insert(table).from_select(column_names, aggregate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['driver_id', 'date'],
+            set_={name: stmt.excluded[name] for name in column_names[2:]}
+        )
+        connection.execute(stmt)
+        return
+
+    replaced = aggregate.subquery()
+    connection.execute(delete(table).where(exists().where(
+        replaced.c.driver_id == table.c.driver_id,
+        replaced.c.date == table.c.date
+    )))
+    connection.execute(insert(table).from_select(column_names, aggregate))
+
+
+def refresh_rollups(keys, connection=None):
+    """
+    Re-aggregate the rollup rows for a set of (driver_id, date) keys
+
+    Args:
+        keys (iterable): (driver_id, date) pairs whose rows may be stale
+        connection (Connection, optional): Connection to run on, defaults to the session's
+
+    Returns:
+        int: Number of keys refreshed
+    """
+    keys = {(driver_id, day) for driver_id, day in keys if driver_id is not None and day is not None}
+    if not keys:
+        return 0
+
+    connection = connection or db.session.connection()
+    driver_ids = {driver_id for driver_id, _ in keys}
+    days = {day for _, day in keys}
+
+    # Clear the keys first so days that no longer have any loads disappear
+    connection.execute(
+        delete(DriverPerformance.__table__).where(
+            tuple_(DriverPerformance.driver_id, DriverPerformance.date).in_(list(keys))
+        )
+    )
+    _upsert_aggregate(connection, _aggregate_select(driver_ids, min(days), max(days)))
+
+    return len(keys)
+
+
+def rebuild_rollups(start_date=None, end_date=None):
+    """
+    Rebuild the rollup table from the Load table
+
+    Args:
+        start_date (date, optional): First day to rebuild, defaults to the beginning of history
+        end_date (date, optional): Last day to rebuild, defaults to the end of history
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    connection = db.session.connection()
+
+    clear = delete(DriverPerformance.__table__)
+    if start_date:
+        clear = clear.where(DriverPerformance.date >= start_date)
+    if end_date:
+        clear = clear.where(DriverPerformance.date <= end_date)
+    connection.execute(clear)
+    _upsert_aggregate(connection, _aggregate_select(start_date=start_date, end_date=end_date))
+    db.session.commit()
+
+    query = DriverPerformance.query
+    if start_date:
+        query = query.filter(DriverPerformance.date >= start_date)
+    if end_date:
+        query = query.filter(DriverPerformance.date <= end_date)
+    row_count = query.count()
+
+    logger.info(f"Rebuilt {row_count} driver performance rollup rows")
+    return row_count
+
+
+def _load_rollup_keys(load):
+    """Every (driver_id, date) a load contributes to, before and after its pending changes"""
+    state = inspect(load)
+
+    def values(name):
+        history = state.attrs[name].history
+        found = set(history.added or ()) | set(history.unchanged or ()) | set(history.deleted or ())
+        found.add(getattr(load, name))
+        return {value for value in found if value is not None}
+
+    driver_ids = values('driver_id')
+    days = {value.date() for value in values('scheduled_pickup_time') | values('actual_delivery_arrival')}
+
+    return {(driver_id, day) for driver_id in driver_ids for day in days}
+
+
+def _rollup_fields_changed(load):
+    state = inspect(load)
+    return any(state.attrs[name].history.has_changes() for name in ROLLUP_FIELDS)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _refresh_rollups_after_flush(session, flush_context):
+    """Keep rollups current whenever loads are written through the ORM session"""
+    keys = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Load):
+            keys |= _load_rollup_keys(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Load) and _rollup_fields_changed(obj):
+            keys |= _load_rollup_keys(obj)
+
+    if keys:
+        refresh_rollups(keys, connection=session.connection())
+
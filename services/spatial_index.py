@@ -0,0 +1,166 @@
+import math
+from services.geofencing import calculate_distance
+
+MILES_PER_DEGREE_LAT = 69.0
+
+
+class GridIndex:
+    """
+    Fixed-size lat/lng grid for radius and nearest-point queries
+
+    Points are bucketed by grid cell under a key, so they can be moved or removed
+    individually. A radius query only visits the cells that overlap the query's
+    bounding box, then checks exact haversine distance for the points in those cells.
+    """
+
+    def __init__(self, cell_degrees=0.5):
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        self._locations = {}
+        # (min_row, max_row, min_col, max_col) of the occupied cells; None when it must be recomputed
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, key):
+        return key in self._locations
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def insert(self, key, lat, lng, item):
+        """
+        Add a point, replacing any point already stored under key
+
+        Args:
+            key: Unique key of the point
+            lat (float): Latitude
+            lng (float): Longitude
+            item: Value returned by queries
+        """
+        self.remove(key)
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, {})[key] = (lat, lng, item)
+        self._locations[key] = cell
+        if self._bounds is not None or len(self._cells) == 1:
+            row, col = cell
+            min_row, max_row, min_col, max_col = self._bounds or (row, row, col, col)
+            self._bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def remove(self, key):
+        """Remove the point stored under key, if any"""
+        cell = self._locations.pop(key, None)
+        if cell is None:
+            return
+        points = self._cells[cell]
+        del points[key]
+        if not points:
+            del self._cells[cell]
+            # Emptying an edge cell may shrink the bounds; recompute on the next query
+            if self._bounds is not None and (cell[0] in self._bounds[:2] or cell[1] in self._bounds[2:]):
+                self._bounds = None
+
+    def _occupied_bounds(self):
+        if self._bounds is None:
+            rows = [row for row, _ in self._cells]
+            cols = [col for _, col in self._cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+        return self._bounds
+
+    def bounding_box(self, lat, lng, radius_miles):
+        """(min_lat, min_lng, max_lat, max_lng) enclosing a circle of radius_miles"""
+        dlat = radius_miles / MILES_PER_DEGREE_LAT
+        dlng = radius_miles / (MILES_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        return (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+    def candidates(self, min_lat, min_lng, max_lat, max_lng):
+        """
+        Points inside a bounding box, without exact distance filtering
+
+        Yields:
+            tuple: (lat, lng, item)
+        """
+        min_row, min_col = self._cell(min_lat, min_lng)
+        max_row, max_col = self._cell(max_lat, max_lng)
+
+        # A box wider than the occupied grid is cheaper to answer by scanning the occupied cells
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            cells = (points for (row, col), points in self._cells.items()
+                     if min_row <= row <= max_row and min_col <= col <= max_col)
+        else:
+            cells = (self._cells[(row, col)]
+                     for row in range(min_row, max_row + 1)
+                     for col in range(min_col, max_col + 1)
+                     if (row, col) in self._cells)
+
+        for points in cells:
+            for point in points.values():
+                if min_lat <= point[0] <= max_lat and min_lng <= point[1] <= max_lng:
+                    yield point
+
+    def within(self, lat, lng, radius_miles):
+        """
+        Points within radius_miles of a location, nearest first
+
+        Args:
+            lat (float): Query latitude
+            lng (float): Query longitude
+            radius_miles (float): Search radius in miles
+
+        Returns:
+            list: (distance_miles, item) tuples sorted by distance
+        """
+        results = []
+        for point_lat, point_lng, item in self.candidates(*self.bounding_box(lat, lng, radius_miles)):
+            distance = calculate_distance(lat, lng, point_lat, point_lng)
+            if distance <= radius_miles:
+                results.append((distance, item))
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def nearest(self, lat, lng, max_miles=None):
+        """
+        The point closest to a location
+
+        Searches rings of cells outward from the query cell and stops once no
+        unvisited cell can hold anything closer than the best point found.
+
+        Args:
+            lat (float): Query latitude
+            lng (float): Query longitude
+            max_miles (float, optional): Ignore points farther than this
+
+        Returns:
+            tuple: (distance_miles, item), or None when nothing is in range
+        """
+        if not self._cells:
+            return None
+
+        row0, col0 = self._cell(lat, lng)
+        # No occupied cell lies beyond the ring that reaches the far edge of the occupied bounds
+        min_row, max_row, min_col, max_col = self._occupied_bounds()
+        max_ring = max(abs(min_row - row0), abs(max_row - row0), abs(min_col - col0), abs(max_col - col0))
+        best = None
+
+        for ring in range(max_ring + 1):
+            for row in range(row0 - ring, row0 + ring + 1):
+                edge = row in (row0 - ring, row0 + ring)
+                cols = range(col0 - ring, col0 + ring + 1) if edge else (col0 - ring, col0 + ring)
+                for col in cols:
+                    for point_lat, point_lng, item in self._cells.get((row, col), {}).values():
+                        distance = calculate_distance(lat, lng, point_lat, point_lng)
+                        if best is None or distance < best[0]:
+                            best = (distance, item)
+
+            # Anything beyond this ring is at least `ring` whole cells away in some direction
+            widest_lat = min(abs(lat) + (ring + 1) * self.cell_degrees, 89.0)
+            ring_miles = ring * self.cell_degrees * MILES_PER_DEGREE_LAT * math.cos(math.radians(widest_lat))
+            if best is not None and best[0] <= ring_miles:
+                break
+            if max_miles is not None and ring_miles > max_miles:
+                break
+
+        if best is None or (max_miles is not None and best[0] > max_miles):
+            return None
+        return best
@@ -0,0 +1,218 @@
+import json
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import LocationUpdate, LoadTrack
+from services.polygons import encode_polyline, decode_polyline
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_METERS = 6371008.8
+
+# Requested tolerances snap down to one of these, so a delivered load has a handful of cached tracks at most
+TOLERANCE_LEVELS = (5, 10, 25, 50, 100, 250, 500, 1000)
+DEFAULT_TOLERANCE_METERS = 25
+
+# Upper bound on the points in any replay, however long the trip
+MAX_TRACK_POINTS = 2000
+
+
+def snap_tolerance(tolerance_meters):
+    """The largest tolerance level not above the requested one"""
+    levels = [level for level in TOLERANCE_LEVELS if level <= tolerance_meters]
+    return levels[-1] if levels else TOLERANCE_LEVELS[0]
+
+
+def _project(lats, lngs):
+    """Equirectangular projection to meters around the track's mean latitude"""
+    lat0 = np.radians(np.mean(lats))
+    x = np.radians(lngs) * np.cos(lat0) * EARTH_RADIUS_METERS
+    y = np.radians(lats) * EARTH_RADIUS_METERS
+    return x, y
+
+
+def _segment_distances(x, y, start, end):
+    """Distance in meters from points start+1..end-1 to the segment between start and end"""
+    px, py = x[start + 1:end], y[start + 1:end]
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return np.hypot(px - x[start], py - y[start])
+    t = np.clip(((px - x[start]) * dx + (py - y[start]) * dy) / length_squared, 0, 1)
+    return np.hypot(px - (x[start] + t * dx), py - (y[start] + t * dy))
+
+
+def significance(lats, lngs):
+    """
+    Douglas–Peucker significance of every point in a track
+
+    Each point gets the deviation at which Douglas–Peucker would keep it, capped
+    by its parent split so values never increase down the recursion. Keeping
+    the points above a tolerance then gives the Douglas–Peucker simplification
+    at that tolerance, and keeping the N most significant points gives the best
+    N-point simplification the same recursion can produce.
+
+    Args:
+        lats, lngs (array-like): Track coordinates in time order
+
+    Returns:
+        numpy.ndarray: Significance in meters; the endpoints are infinite
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    count = len(lats)
+    scores = np.zeros(count)
+    if count == 0:
+        return scores
+    scores[0] = scores[-1] = np.inf
+    if count < 3:
+        return scores
+
+    x, y = _project(lats, lngs)
+    # Iterative to stay clear of the recursion limit on long trips
+    stack = [(0, count - 1, np.inf)]
+    while stack:
+        start, end, cap = stack.pop()
+        if end - start < 2:
+            continue
+        distances = _segment_distances(x, y, start, end)
+        offset = int(np.argmax(distances))
+        split = start + 1 + offset
+        score = min(float(distances[offset]), cap)
+        scores[split] = score
+        stack.append((start, split, score))
+        stack.append((split, end, score))
+    return scores
+
+
+def simplify(scores, tolerance_meters, max_points=MAX_TRACK_POINTS):
+    """
+    Indices of the points kept at a tolerance, limited to max_points
+
+    Returns:
+        numpy.ndarray: Sorted indices into the original track
+    """
+    keep = np.flatnonzero(scores > tolerance_meters)
+    if len(keep) > max_points:
+        keep = np.sort(keep[np.argpartition(scores[keep], -max_points)[-max_points:]])
+    return keep
+
+
+def load_breadcrumbs(load_id):
+    """(lats, lngs, speeds, timestamps) of a load's breadcrumbs in time order"""
+    rows = db.session.execute(
+        select(LocationUpdate.lat, LocationUpdate.lng, LocationUpdate.speed, LocationUpdate.timestamp)
+        .where(LocationUpdate.load_id == load_id)
+        .order_by(LocationUpdate.timestamp, LocationUpdate.id)
+    ).all()
+    if not rows:
+        return [], [], [], []
+    lats, lngs, speeds, timestamps = zip(*rows)
+    return lats, lngs, speeds, timestamps
+
+
+def compress_track(load_id, tolerance_meters, max_points=MAX_TRACK_POINTS):
+    """
+    Simplify a load's breadcrumbs
+
+    Returns:
+        dict: Track in the compact replay format (see track_payload)
+    """
+    lats, lngs, speeds, timestamps = load_breadcrumbs(load_id)
+    keep = simplify(significance(lats, lngs), tolerance_meters, max_points) if lats else []
+
+    started_at = timestamps[0] if timestamps else None
+    return {
+        'original_points': len(lats),
+        'started_at': started_at,
+        'polyline': encode_polyline((lats[i], lngs[i]) for i in keep),
+        'time_offsets': [int((timestamps[i] - started_at).total_seconds()) for i in keep],
+        'speeds': [round(speeds[i], 1) if speeds[i] is not None else None for i in keep]
+    }
+
+
+def get_track(load, tolerance_meters=DEFAULT_TOLERANCE_METERS, max_points=MAX_TRACK_POINTS):
+    """
+    A load's simplified track, cached once the load is delivered
+
+    Tracks of loads still moving are computed on every call, since new
+    breadcrumbs keep arriving.
+
+    Args:
+        load (Load): The load
+        tolerance_meters (float): Simplification tolerance, snapped down to TOLERANCE_LEVELS
+        max_points (int): Point limit, capped at MAX_TRACK_POINTS
+
+    Returns:
+        dict: Track payload
+    """
+    tolerance = snap_tolerance(tolerance_meters)
+    max_points = max(2, min(int(max_points), MAX_TRACK_POINTS))
+
+    if load.status == 'delivered':
+        cached = LoadTrack.query.filter_by(load_id=load.id, tolerance_meters=tolerance, max_points=max_points).first()
+        if cached:
+            return track_payload(load.id, tolerance, {
+                'original_points': cached.original_points,
+                'started_at': cached.started_at,
+                'polyline': cached.polyline,
+                'time_offsets': json.loads(cached.time_offsets),
+                'speeds': json.loads(cached.speeds)
+            }, cached=True)
+
+    track = compress_track(load.id, tolerance, max_points)
+
+    if load.status == 'delivered' and track['original_points']:
+        try:
+            db.session.add(LoadTrack(
+                load_id=load.id,
+                tolerance_meters=tolerance,
+                max_points=max_points,
+                original_points=track['original_points'],
+                point_count=len(track['time_offsets']),
+                started_at=track['started_at'],
+                polyline=track['polyline'],
+                time_offsets=json.dumps(track['time_offsets'], separators=(',', ':')),
+                speeds=json.dumps(track['speeds'], separators=(',', ':'))
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Another request cached the same track first
+            db.session.rollback()
+
+    return track_payload(load.id, tolerance, track, cached=False)
+
+
+def track_payload(load_id, tolerance, track, cached):
+    """
+    Compact replay format
+
+    Coordinates are one encoded polyline; times are seconds from started_at and
+    speeds are mph, both aligned with the polyline's points.
+    """
+    return {
+        'load_id': load_id,
+        'tolerance_meters': tolerance,
+        'original_points': track['original_points'],
+        'point_count': len(track['time_offsets']),
+        'started_at': track['started_at'].isoformat() if track['started_at'] else None,
+        'polyline': track['polyline'],
+        'time_offsets': track['time_offsets'],
+        'speeds': track['speeds'],
+        'cached': cached
+    }
+
+
+def replay_points(payload):
+    """Yield the payload's points as dicts with lat, lng, timestamp and speed"""
+    if not payload['started_at']:
+        return
+    started_at = datetime.fromisoformat(payload['started_at'])
+    for (lat, lng), offset, speed in zip(decode_polyline(payload['polyline']),
+                                         payload['time_offsets'], payload['speeds']):
+        yield {'lat': lat, 'lng': lng, 'timestamp': (started_at + timedelta(seconds=offset)).isoformat(),
+               'speed': speed}
+
@@ -41,11 +41,72 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }, 500);
     
-    // Set up refresh interval (every 5 minutes)
-    setInterval(loadDashboardSummary, 300000);
-    setInterval(loadAtRiskLoads, 300000);
+    // Receive changes as they happen; falls back to polling every 5 minutes
+    startLiveUpdates();
 });
 
+let liveUpdates = null;
+let pollingTimers = [];
+
+function startPolling() {
+    if (pollingTimers.length > 0) return;
+    pollingTimers.push(setInterval(loadDashboardSummary, 300000));
+    pollingTimers.push(setInterval(loadAtRiskLoads, 300000));
+}
+
+function stopPolling() {
+    pollingTimers.forEach(timer => clearInterval(timer));
+    pollingTimers = [];
+}
+
+// Subscribe to the dashboard event stream
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    liveUpdates = new EventSource('/api/dashboard/stream');
+    liveUpdates.addEventListener('open', () => {
+        window.liveUpdatesConnected = true;
+        stopPolling();
+    });
+    liveUpdates.addEventListener('update', event => applyLiveUpdate(JSON.parse(event.data)));
+    liveUpdates.addEventListener('error', () => {
+        // EventSource reconnects on its own; poll until it does
+        window.liveUpdatesConnected = false;
+        startPolling();
+    });
+}
+
+// Apply the parts of the default dashboard that changed on the server
+function applyLiveUpdate(update) {
+    const changed = update.changed || {};
+    const isDefaultView = currentViewMode === 'company' && currentDateRange === '30';
+    
+    if ('summary' in changed) {
+        // The stream carries the default view only; other filters refetch (cached server-side)
+        if (isDefaultView) {
+            renderDashboardSummary(changed.summary);
+        } else {
+            loadDashboardSummary();
+        }
+        loadPerformanceTrends();
+    }
+    
+    if ('at_risk_loads' in changed) {
+        if (getCurrentDriverId()) {
+            loadAtRiskLoads();
+        } else {
+            renderAtRiskLoads(changed.at_risk_loads);
+        }
+    }
+    
+    if ('unread_count' in changed && typeof updateNotificationBadge === 'function') {
+        updateNotificationBadge(changed.unread_count);
+    }
+}
+
 // Initialize dashboard controls
 function initializeDashboardControls() {
     // Load available drivers for dropdown
@@ -233,169 +294,172 @@ function loadDashboardSummary() {
     
     fetch(`/api/dashboard/summary?${params.toString()}`)
         .then(response => response.json())
-        .then(data => {
-            console.log('Dashboard data loaded:', data);
+        .then(renderDashboardSummary)
+        .catch(error => console.error('Error loading dashboard summary:', error));
+}
+
+// Render dashboard summary data
+function renderDashboardSummary(data) {
+    console.log('Dashboard data loaded:', data);
+    
+    // Update total deliveries count (using the DELIVERIES card)
+    const totalDeliveriesElement = document.getElementById('active-loads-count');
+    if (totalDeliveriesElement && data.total_deliveries !== undefined) {
+        showSlotMachineEffect(totalDeliveriesElement, data.total_deliveries);
+    }
+    
+    // Show/hide company stats based on view mode
+    const companyStatsElement = document.getElementById('company-stats');
+    if (companyStatsElement) {
+        if (currentViewMode === 'driver' && selectedDriverId) {
+            // Hide company stats in individual driver view
+            companyStatsElement.style.display = 'none';
+            companyStatsElement.style.visibility = 'hidden';
+            companyStatsElement.classList.add('d-none');
+        } else {
+            // Show company stats in company view
+            companyStatsElement.style.display = 'flex';
+            companyStatsElement.style.visibility = 'visible';
+            companyStatsElement.classList.remove('d-none');
             
-            // Update total deliveries count (using the DELIVERIES card)
-            const totalDeliveriesElement = document.getElementById('active-loads-count');
-            if (totalDeliveriesElement && data.total_deliveries !== undefined) {
-                showSlotMachineEffect(totalDeliveriesElement, data.total_deliveries);
-            }
+            // Update driver count and top driver info if available
+            const totalDriversElement = document.getElementById('total-drivers-count');
+            const topDriverElement = document.getElementById('top-driver-info');
             
-            // Show/hide company stats based on view mode
-            const companyStatsElement = document.getElementById('company-stats');
-            if (companyStatsElement) {
-                if (currentViewMode === 'driver' && selectedDriverId) {
-                    // Hide company stats in individual driver view
-                    companyStatsElement.style.display = 'none';
-                    companyStatsElement.style.visibility = 'hidden';
-                    companyStatsElement.classList.add('d-none');
-                } else {
-                    // Show company stats in company view
-                    companyStatsElement.style.display = 'flex';
-                    companyStatsElement.style.visibility = 'visible';
-                    companyStatsElement.classList.remove('d-none');
-                    
-                    // Update driver count and top driver info if available
-                    const totalDriversElement = document.getElementById('total-drivers-count');
-                    const topDriverElement = document.getElementById('top-driver-info');
-                    
-                    if (totalDriversElement && data.total_drivers !== undefined) {
-                        totalDriversElement.textContent = data.total_drivers;
-                    }
-                    
-                    if (topDriverElement && data.top_drivers && data.top_drivers.length > 0) {
-                        const topDriver = data.top_drivers[0];
-                        topDriverElement.textContent = `${topDriver.name} (${Math.round(topDriver.on_time_percentage)}%)`;
-                    }
-                }
+            if (totalDriversElement && data.total_drivers !== undefined) {
+                totalDriversElement.textContent = data.total_drivers;
             }
             
-            // Update on-time data for toggle functionality
-            if (typeof window.updateOnTimeData === 'function') {
-                window.updateOnTimeData(data);
+            if (topDriverElement && data.top_drivers && data.top_drivers.length > 0) {
+                const topDriver = data.top_drivers[0];
+                topDriverElement.textContent = `${topDriver.name} (${Math.round(topDriver.on_time_percentage)}%)`;
             }
-            
-            // Legacy support - update old element if it exists (for backward compatibility)
-            const onTimeDeliveryElement = document.getElementById('on-time-delivery-percentage');
-            if (onTimeDeliveryElement) {
-                const percentValue = Math.ceil(data.on_time.delivery_percentage);
-                onTimeDeliveryElement.textContent = percentValue;
-                
-                // Find the parent circular-metric element and update the --percent CSS variable
-                const circularMetric = onTimeDeliveryElement.closest('.circular-metric');
-                const circularMetricValue = circularMetric?.querySelector('.circular-metric-value');
-                
-                if (circularMetric) {
-                    circularMetric.style.setProperty('--percent', percentValue);
-                }
-                
-                // Apply colors and effects based on performance
-                const progressCircle = circularMetric?.querySelector('.progress-circle');
-                
-                if (percentValue >= 85) {
-                    // Excellent performance - Green
-                    if (circularMetricValue) {
-                        circularMetricValue.style.color = '#00c48c';
-                        circularMetricValue.style.textShadow = '0 0 15px rgba(0, 196, 140, 0.6)';
-                    }
-                    if (progressCircle) progressCircle.style.stroke = '#00c48c';
-                } else if (percentValue >= 70) {
-                    // Warning performance - Yellow/Gold
-                    if (circularMetricValue) {
-                        circularMetricValue.style.color = '#FFD700';
-                        circularMetricValue.style.textShadow = '0 0 15px rgba(255, 215, 0, 0.6)';
-                    }
-                    if (progressCircle) progressCircle.style.stroke = '#FFD700';
-                } else {
-                    // Poor performance - Red
-                    if (circularMetricValue) {
-                        circularMetricValue.style.color = '#ff5757';
-                        circularMetricValue.style.textShadow = '0 0 15px rgba(255, 87, 87, 0.6)';
-                    }
-                    if (progressCircle) progressCircle.style.stroke = '#ff5757';
-                }
+        }
+    }
+    
+    // Update on-time data for toggle functionality
+    if (typeof window.updateOnTimeData === 'function') {
+        window.updateOnTimeData(data);
+    }
+    
+    // Legacy support - update old element if it exists (for backward compatibility)
+    const onTimeDeliveryElement = document.getElementById('on-time-delivery-percentage');
+    if (onTimeDeliveryElement) {
+        const percentValue = Math.ceil(data.on_time.delivery_percentage);
+        onTimeDeliveryElement.textContent = percentValue;
+        
+        // Find the parent circular-metric element and update the --percent CSS variable
+        const circularMetric = onTimeDeliveryElement.closest('.circular-metric');
+        const circularMetricValue = circularMetric?.querySelector('.circular-metric-value');
+        
+        if (circularMetric) {
+            circularMetric.style.setProperty('--percent', percentValue);
+        }
+        
+        // Apply colors and effects based on performance
+        const progressCircle = circularMetric?.querySelector('.progress-circle');
+        
+        if (percentValue >= 85) {
+            // Excellent performance - Green
+            if (circularMetricValue) {
+                circularMetricValue.style.color = '#00c48c';
+                circularMetricValue.style.textShadow = '0 0 15px rgba(0, 196, 140, 0.6)';
             }
-            
-            // Update late loads count using actual data
-            const lateLoadsElement = document.getElementById('late-loads-count');
-            if (lateLoadsElement && data.late_deliveries !== undefined) {
-                showSlotMachineEffect(lateLoadsElement, data.late_deliveries);
+            if (progressCircle) progressCircle.style.stroke = '#00c48c';
+        } else if (percentValue >= 70) {
+            // Warning performance - Yellow/Gold
+            if (circularMetricValue) {
+                circularMetricValue.style.color = '#FFD700';
+                circularMetricValue.style.textShadow = '0 0 15px rgba(255, 215, 0, 0.6)';
             }
-            
+            if (progressCircle) progressCircle.style.stroke = '#FFD700';
+        } else {
+            // Poor performance - Red
+            if (circularMetricValue) {
+                circularMetricValue.style.color = '#ff5757';
+                circularMetricValue.style.textShadow = '0 0 15px rgba(255, 87, 87, 0.6)';
+            }
+            if (progressCircle) progressCircle.style.stroke = '#ff5757';
+        }
+    }
+    
+    // Update late loads count using actual data
+    const lateLoadsElement = document.getElementById('late-loads-count');
+    if (lateLoadsElement && data.late_deliveries !== undefined) {
+        showSlotMachineEffect(lateLoadsElement, data.late_deliveries);
+    }
+    
 
-            
-            // Update top drivers list
-            const topDriversList = document.getElementById('top-drivers-list');
-            if (topDriversList) {
-                topDriversList.innerHTML = '';
+    
+    // Update top drivers list
+    const topDriversList = document.getElementById('top-drivers-list');
+    if (topDriversList) {
+        topDriversList.innerHTML = '';
+        
+        if (data.top_drivers && data.top_drivers.length > 0) {
+            data.top_drivers.forEach(driver => {
+                const listItem = document.createElement('a');
+                listItem.href = `/drivers/${driver.id}`;
+                listItem.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
                 
-                if (data.top_drivers && data.top_drivers.length > 0) {
-                    data.top_drivers.forEach(driver => {
-                        const listItem = document.createElement('a');
-                        listItem.href = `/drivers/${driver.id}`;
-                        listItem.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
-                        
-                        listItem.innerHTML = `
-                            <div>
-                                <i data-feather="user"></i>
-                                <span class="ms-2">${driver.name}</span>
-                            </div>
-                            <span class="badge bg-primary rounded-pill">${driver.on_time_percentage}%</span>
-                        `;
-                        
-                        topDriversList.appendChild(listItem);
-                    });
-                    
-                    // Re-initialize Feather icons
-                    feather.replace();
-                } else {
-                    topDriversList.innerHTML = '<div class="list-group-item">No driver data available</div>';
-                }
-            }
+                listItem.innerHTML = `
+                    <div>
+                        <i data-feather="user"></i>
+                        <span class="ms-2">${driver.name}</span>
+                    </div>
+                    <span class="badge bg-primary rounded-pill">${driver.on_time_percentage}%</span>
+                `;
+                
+                topDriversList.appendChild(listItem);
+            });
             
-            // Update recent notifications
-            const notificationsList = document.getElementById('recent-notifications');
-            if (notificationsList) {
-                notificationsList.innerHTML = '';
+            // Re-initialize Feather icons
+            feather.replace();
+        } else {
+            topDriversList.innerHTML = '<div class="list-group-item">No driver data available</div>';
+        }
+    }
+    
+    // Update recent notifications
+    const notificationsList = document.getElementById('recent-notifications');
+    if (notificationsList) {
+        notificationsList.innerHTML = '';
+        
+        if (data.notifications && data.notifications.length > 0) {
+            data.notifications.forEach(notification => {
+                const listItem = document.createElement('div');
+                listItem.className = 'list-group-item';
                 
-                if (data.notifications && data.notifications.length > 0) {
-                    data.notifications.forEach(notification => {
-                        const listItem = document.createElement('div');
-                        listItem.className = 'list-group-item';
-                        
-                        // Set background color based on notification type
-                        if (notification.type === 'warning') {
-                            listItem.classList.add('list-group-item-warning');
-                        } else if (notification.type === 'danger') {
-                            listItem.classList.add('list-group-item-danger');
-                        } else if (notification.type === 'success') {
-                            listItem.classList.add('list-group-item-success');
-                        } else {
-                            listItem.classList.add('list-group-item-info');
-                        }
-                        
-                        listItem.innerHTML = `
-                            <div class="d-flex w-100 justify-content-between">
-                                <small>${notification.created_at}</small>
-                            </div>
-                            <p class="mb-1">${notification.message}</p>
-                        `;
-                        
-                        notificationsList.appendChild(listItem);
-                    });
+                // Set background color based on notification type
+                if (notification.type === 'warning') {
+                    listItem.classList.add('list-group-item-warning');
+                } else if (notification.type === 'danger') {
+                    listItem.classList.add('list-group-item-danger');
+                } else if (notification.type === 'success') {
+                    listItem.classList.add('list-group-item-success');
                 } else {
-                    notificationsList.innerHTML = '<div class="list-group-item">No recent notifications</div>';
+                    listItem.classList.add('list-group-item-info');
                 }
-            }
-            
-            // Play a success sound if metrics are good (disabled)
-            if (data.on_time.pickup_percentage >= 95 && data.on_time.delivery_percentage >= 95) {
-                // playSuccessSound(); // Disabled audio notifications
-                showConfetti();
-            }
-        })
-        .catch(error => console.error('Error loading dashboard summary:', error));
+                
+                listItem.innerHTML = `
+                    <div class="d-flex w-100 justify-content-between">
+                        <small>${notification.created_at}</small>
+                    </div>
+                    <p class="mb-1">${notification.message}</p>
+                `;
+                
+                notificationsList.appendChild(listItem);
+            });
+        } else {
+            notificationsList.innerHTML = '<div class="list-group-item">No recent notifications</div>';
+        }
+    }
+    
+    // Play a success sound if metrics are good (disabled)
+    if (data.on_time.pickup_percentage >= 95 && data.on_time.delivery_percentage >= 95) {
+        // playSuccessSound(); // Disabled audio notifications
+        showConfetti();
+    }
 }
 
 // Load at-risk loads
@@ -408,55 +472,58 @@ function loadAtRiskLoads() {
     
     fetch(url)
         .then(response => response.json())
-        .then(loads => {
-            const atRiskContent = document.getElementById('at-risk-loads-content');
-            const noAtRiskDiv = document.getElementById('no-at-risk-loads');
+        .then(renderAtRiskLoads)
+        .catch(error => console.error('Error loading at-risk loads:', error));
+}
+
+// Render at-risk loads
+function renderAtRiskLoads(loads) {
+    const atRiskContent = document.getElementById('at-risk-loads-content');
+    const noAtRiskDiv = document.getElementById('no-at-risk-loads');
+    
+    if (atRiskContent) {
+        atRiskContent.innerHTML = '';
+        
+        if (loads && loads.length > 0) {
+            noAtRiskDiv.classList.add('d-none');
             
-            if (atRiskContent) {
-                atRiskContent.innerHTML = '';
+            loads.forEach(load => {
+                const isDelayed = load.risk_class === 'danger';
+                const borderColor = isDelayed ? 'var(--highlight-alert)' : 'var(--celebration-gold)';
+                const bgColor = isDelayed ? 'rgba(255, 87, 87, 0.1)' : 'rgba(255, 215, 0, 0.1)';
+                const badgeColor = isDelayed ? 'var(--highlight-alert)' : 'var(--celebration-gold)';
+                const badgeTextColor = isDelayed ? '#fff' : '#000';
                 
-                if (loads && loads.length > 0) {
-                    noAtRiskDiv.classList.add('d-none');
-                    
-                    loads.forEach(load => {
-                        const isDelayed = load.risk_class === 'danger';
-                        const borderColor = isDelayed ? 'var(--highlight-alert)' : 'var(--celebration-gold)';
-                        const bgColor = isDelayed ? 'rgba(255, 87, 87, 0.1)' : 'rgba(255, 215, 0, 0.1)';
-                        const badgeColor = isDelayed ? 'var(--highlight-alert)' : 'var(--celebration-gold)';
-                        const badgeTextColor = isDelayed ? '#fff' : '#000';
-                        
-                        const loadDiv = document.createElement('div');
-                        loadDiv.className = 'at-risk-load-item mb-3 p-3';
-                        loadDiv.style.cssText = `background-color: ${bgColor}; border-radius: 8px; border-left: 3px solid ${borderColor};`;
-                        
-                        loadDiv.innerHTML = `
-                            <div class="d-flex justify-content-between align-items-center mb-2">
-                                <a href="/loads/${load.id}" class="clickable-ref" style="color: var(--bright-text); font-weight: 600; text-decoration: none; cursor: pointer; transition: color 0.2s;">${load.reference_number}</a>
-                                <span class="badge" style="background-color: ${badgeColor}; color: ${badgeTextColor};">${load.risk_label}</span>
-                            </div>
-                            <div class="d-flex justify-content-between mb-2">
-                                <div>
-                                    <div style="color: var(--neutral-text); font-size: 0.8rem;">ORIGIN-DESTINATION</div>
-                                    <div style="color: var(--bright-text);">${load.origin} → ${load.destination}</div>
-                                </div>
-                                <div class="text-end">
-                                    <div style="color: var(--neutral-text); font-size: 0.8rem;">DRIVER</div>
-                                    <a href="/drivers/${load.driver_id}" class="clickable-driver" style="color: var(--bright-text); text-decoration: none; cursor: pointer; transition: color 0.2s;">${load.driver_name}</a>
-                                </div>
-                            </div>
-                            <div class="progress" style="height: 4px; background-color: rgba(255, 255, 255, 0.1);">
-                                <div class="progress-bar" role="progressbar" style="width: ${isDelayed ? '75' : '85'}%; background-color: ${borderColor};" aria-valuenow="${isDelayed ? '75' : '85'}" aria-valuemin="0" aria-valuemax="100"></div>
-                            </div>
-                        `;
-                        
-                        atRiskContent.appendChild(loadDiv);
-                    });
-                } else {
-                    noAtRiskDiv.classList.remove('d-none');
-                }
-            }
-        })
-        .catch(error => console.error('Error loading at-risk loads:', error));
+                const loadDiv = document.createElement('div');
+                loadDiv.className = 'at-risk-load-item mb-3 p-3';
+                loadDiv.style.cssText = `background-color: ${bgColor}; border-radius: 8px; border-left: 3px solid ${borderColor};`;
+                
+                loadDiv.innerHTML = `
+                    <div class="d-flex justify-content-between align-items-center mb-2">
+                        <a href="/loads/${load.id}" class="clickable-ref" style="color: var(--bright-text); font-weight: 600; text-decoration: none; cursor: pointer; transition: color 0.2s;">${load.reference_number}</a>
+                        <span class="badge" style="background-color: ${badgeColor}; color: ${badgeTextColor};">${load.risk_label}</span>
+                    </div>
+                    <div class="d-flex justify-content-between mb-2">
+                        <div>
+                            <div style="color: var(--neutral-text); font-size: 0.8rem;">ORIGIN-DESTINATION</div>
+                            <div style="color: var(--bright-text);">${load.origin} → ${load.destination}</div>
+                        </div>
+                        <div class="text-end">
+                            <div style="color: var(--neutral-text); font-size: 0.8rem;">DRIVER</div>
+                            <a href="/drivers/${load.driver_id}" class="clickable-driver" style="color: var(--bright-text); text-decoration: none; cursor: pointer; transition: color 0.2s;">${load.driver_name}</a>
+                        </div>
+                    </div>
+                    <div class="progress" style="height: 4px; background-color: rgba(255, 255, 255, 0.1);">
+                        <div class="progress-bar" role="progressbar" style="width: ${isDelayed ? '75' : '85'}%; background-color: ${borderColor};" aria-valuenow="${isDelayed ? '75' : '85'}" aria-valuemin="0" aria-valuemax="100"></div>
+                    </div>
+                `;
+                
+                atRiskContent.appendChild(loadDiv);
+            });
+        } else {
+            noAtRiskDiv.classList.remove('d-none');
+        }
+    }
 }
 
 // Load performance trends
@@ -259,8 +259,29 @@ function initGeofencingMap() {
                 markers.push(marker);
                 bounds.extend(marker.getPosition());
                 
-                // Add geofence circle
-                if (facility.geofence_radius) {
+                // Polygon fences are served encoded and take precedence over the radius
+                if (facility.geofence_polygon) {
+                    const polygon = new google.maps.Polygon({
+                        strokeColor: '#9C27B0',
+                        strokeOpacity: 0.8,
+                        strokeWeight: 2,
+                        fillColor: '#9C27B0',
+                        fillOpacity: 0.1,
+                        map: map,
+                        paths: google.maps.geometry.encoding.decodePath(facility.geofence_polygon)
+                    });
+                    
+                    geofenceCircles.push(polygon);
+                    
+                    google.maps.event.addListener(polygon, 'click', function() {
+                        selectFacility(facility.id);
+                    });
+                    
+                    google.maps.event.addListener(marker, 'click', function() {
+                        selectFacility(facility.id);
+                    });
+                } else if (facility.geofence_radius) {
+                    // Add geofence circle
                     const circle = new google.maps.Circle({
                         strokeColor: '#9C27B0',
                         strokeOpacity: 0.8,
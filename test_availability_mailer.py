@@ -0,0 +1,120 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy import create_engine, text
+
+SCHEMA = 'availability_mailer_test'
+# More than two batches, so a second worker would get a batch of its own without the lease
+RECIPIENTS = 120
+
+
+class RecordingSender:
+    """Stands in for SMTPSender and records which worker sent to whom"""
+
+    def __init__(self, owner, sent, lock):
+        self.owner = owner
+        self.sent = sent
+        self.lock = lock
+
+    def send(self, message, to_address):
+        with self.lock:
+            self.sent.append((self.owner, to_address))
+
+    def close(self):
+        pass
+
+
+class TestBroadcastOwnership(unittest.TestCase):
+    """
+    Deliver one broadcast from two workers at once in a scratch schema
+
+    Requires DATABASE_URL to point at a PostgreSQL database. Workers use their own
+    connections, so the scratch schema is committed and dropped at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+            raise unittest.SkipTest("Broadcast leases need a PostgreSQL DATABASE_URL")
+
+        from app import app, db
+
+        cls.app = app
+        cls.db = db
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+
+        with db.engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        cls.engine = create_engine(db.engine.url, connect_args={'options': f'-csearch_path={SCHEMA}'})
+        db.metadata.create_all(cls.engine)
+
+        # Route the app's session to the scratch schema for the duration of the tests
+        cls.engines = mock.patch.dict(db._app_engines[app], {None: cls.engine})
+        cls.engines.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.session.remove()
+        cls.engines.stop()
+        cls.engine.dispose()
+        with cls.db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        cls.app_context.pop()
+
+    def setUp(self):
+        from services.availability_mailer import queue_broadcast
+
+        recipients = [{'email': f"broker{i}@example.com", 'name': f"Broker {i}"} for i in range(RECIPIENTS)]
+        with mock.patch('services.availability_mailer.worker.submit'):
+            self.broadcast_id = queue_broadcast('Fleet Availability', '<p>Trucks</p>', 'Trucks', recipients).id
+
+    def test_two_workers_deliver_once_from_one_owner(self):
+        from services.availability_mailer import deliver_broadcast
+        from services.email_delivery import RateLimiter
+        from models import AvailabilityBroadcast
+
+        sent = []
+        lock = threading.Lock()
+        start = threading.Barrier(2)
+
+        def run_worker(owner):
+            with self.app.app_context():
+                start.wait()
+                try:
+                    deliver_broadcast(self.broadcast_id, RecordingSender(owner, sent, lock), RateLimiter(200), owner)
+                finally:
+                    self.db.session.remove()
+
+        workers = [threading.Thread(target=run_worker, args=(f"worker-{n}",)) for n in range(2)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join(timeout=30)
+
+        self.assertEqual(len(sent), RECIPIENTS)
+        self.assertEqual(len({address for _, address in sent}), RECIPIENTS)
+        self.assertEqual(len({owner for owner, _ in sent}), 1)
+
+        broadcast = self.db.session.get(AvailabilityBroadcast, self.broadcast_id)
+        self.assertEqual(broadcast.status, 'completed')
+        self.assertEqual(broadcast.sent_count, RECIPIENTS)
+        self.assertIsNone(broadcast.claimed_by)
+
+    def test_expired_lease_is_taken_over(self):
+        from services.availability_mailer import claim_broadcast, CLAIM_LEASE_SECONDS
+
+        now = datetime.utcnow()
+        self.assertTrue(claim_broadcast(self.broadcast_id, 'worker-0', now))
+        self.assertFalse(claim_broadcast(self.broadcast_id, 'worker-1', now + timedelta(seconds=1)))
+        self.assertTrue(claim_broadcast(self.broadcast_id, 'worker-0', now + timedelta(seconds=1)))
+
+        expired = now + timedelta(seconds=CLAIM_LEASE_SECONDS + 2)
+        self.assertTrue(claim_broadcast(self.broadcast_id, 'worker-1', expired))
+        self.assertFalse(claim_broadcast(self.broadcast_id, 'worker-0', expired))
+
+
+if __name__ == '__main__':
+    unittest.main()
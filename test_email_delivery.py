@@ -0,0 +1,151 @@
+import socketserver
+import threading
+import unittest
+from collections import namedtuple
+from email import message_from_bytes
+
+from services.email_delivery import (
+    SMTPSender, RateLimiter, send_batch, personalize, RECIPIENT_NAME, RECIPIENT_COMPANY
+)
+
+Recipient = namedtuple('Recipient', 'id email name company')
+
+REJECTED_ADDRESS = 'bounce@example.com'
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages and keep them for inspection"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 sink ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address == REJECTED_ADDRESS:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                with server.lock:
+                    server.messages.append((recipients, message_from_bytes(b''.join(data))))
+                self.reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+
+
+class TestEmailDelivery(unittest.TestCase):
+    """Availability email delivery against a local SMTP sink"""
+
+    def setUp(self):
+        self.sink = SMTPSink()
+        self.thread = threading.Thread(target=self.sink.serve_forever, daemon=True)
+        self.thread.start()
+        self.sender = SMTPSender(host='127.0.0.1', port=self.sink.server_address[1],
+                                 username='', use_tls=False, timeout=5)
+
+    def tearDown(self):
+        self.sender.close()
+        self.sink.shutdown()
+        self.sink.server_close()
+
+    def send(self, recipients):
+        html_body = f"<p>Hello {RECIPIENT_NAME} at {RECIPIENT_COMPANY}</p>"
+        text_body = f"Hello {RECIPIENT_NAME} at {RECIPIENT_COMPANY}"
+        return send_batch(self.sender, 'Fleet Availability', html_body, text_body, recipients)
+
+    def test_batch_reuses_one_connection(self):
+        recipients = [Recipient(i, f"broker{i}@example.com", f"Broker {i}", 'Acme') for i in range(25)]
+        results = self.send(recipients)
+
+        self.assertEqual(results, {i: None for i in range(25)})
+        self.assertEqual(len(self.sink.messages), 25)
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_messages_are_personalized(self):
+        self.send([Recipient(1, 'pat@example.com', 'Pat <Ops>', 'Acme & Sons')])
+
+        addresses, message = self.sink.messages[0]
+        self.assertEqual(addresses, ['pat@example.com'])
+        text_part, html_part = message.get_payload()
+        self.assertIn('Hello Pat <Ops> at Acme & Sons', text_part.get_payload(decode=True).decode())
+        self.assertIn('Hello Pat &lt;Ops&gt; at Acme &amp; Sons', html_part.get_payload(decode=True).decode())
+
+    def test_rejected_recipient_does_not_stop_batch(self):
+        results = self.send([
+            Recipient(1, 'one@example.com', None, None),
+            Recipient(2, REJECTED_ADDRESS, None, None),
+            Recipient(3, 'three@example.com', None, None)
+        ])
+
+        self.assertIsNone(results[1])
+        self.assertIsNotNone(results[2])
+        self.assertIsNone(results[3])
+        self.assertEqual([addresses for addresses, _ in self.sink.messages],
+                         [['one@example.com'], ['three@example.com']])
+
+    def test_connection_is_recycled_after_limit(self):
+        self.sender.max_messages = 10
+        self.send([Recipient(i, f"broker{i}@example.com", None, None) for i in range(25)])
+
+        self.assertEqual(len(self.sink.messages), 25)
+        self.assertEqual(self.sink.connections, 3)
+
+    def test_default_greeting_without_name(self):
+        self.assertEqual(personalize(f"Hi {RECIPIENT_NAME}", Recipient(1, 'a@example.com', None, None)), 'Hi there')
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spaces_calls(self):
+        import time
+
+        limiter = RateLimiter(50)
+        started = time.monotonic()
+        for _ in range(11):
+            limiter.wait()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from services import google_maps_api
+from services.eta_cache import EtaCache, eta_cache, eta_cache_key, geohash
+
+FAILING_LAT = 99.0  # Any batch containing this latitude gets an HTTP 500
+UNROUTABLE_LAT = 0.0  # Origins at this latitude get a NOT_FOUND element
+
+
+class StandInMapsHandler(BaseHTTPRequestHandler):
+    """Minimal Directions / Distance Matrix stand-in; the duration text echoes the origin latitude"""
+
+    active = 0
+    max_active = 0
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            cls.requests.append(self.path)
+        try:
+            # Hold the request briefly so concurrent batches overlap
+            time.sleep(0.05)
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path.endswith('/distancematrix/json'):
+                self._distance_matrix(params['origins'][0].split('|'))
+            elif url.path.endswith('/directions/json'):
+                lat = params['origin'][0].split(',')[0]
+                self._send(200, {'routes': [{'legs': [{'duration': {'text': f"{float(lat):g} mins"}}]}]})
+            else:
+                self._send(404, {})
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def _distance_matrix(self, origins):
+        lats = [float(origin.split(',')[0]) for origin in origins]
+        if FAILING_LAT in lats:
+            self._send(500, {'error_message': 'stand-in failure'})
+            return
+
+        rows = []
+        for lat in lats:
+            if lat == UNROUTABLE_LAT:
+                rows.append({'elements': [{'status': 'NOT_FOUND'}]})
+            else:
+                rows.append({'elements': [{'status': 'OK', 'duration': {'text': f"{lat:g} mins"}}]})
+        self._send(200, {'status': 'OK', 'rows': rows})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestBatchedEtas(unittest.TestCase):
+    """get_etas against a local stand-in for the Google Maps API"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInMapsHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.original_base_url = google_maps_api.GOOGLE_MAPS_BASE_URL
+        google_maps_api.GOOGLE_MAPS_BASE_URL = f"http://127.0.0.1:{cls.server.server_address[1]}/maps/api"
+
+    @classmethod
+    def tearDownClass(cls):
+        google_maps_api.GOOGLE_MAPS_BASE_URL = cls.original_base_url
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInMapsHandler.requests = []
+        StandInMapsHandler.max_active = 0
+        eta_cache.clear()
+
+    def test_results_follow_input_order_across_batches(self):
+        origins = [(float(i + 1), -96.8) for i in range(60)]
+        etas = google_maps_api.get_etas(origins, "Dallas, TX")
+
+        self.assertEqual(etas, [f"{i + 1} mins" for i in range(60)])
+        self.assertEqual(len(StandInMapsHandler.requests), 3)
+
+    def test_batches_run_concurrently(self):
+        origins = [(float(i + 1), -96.8) for i in range(100)]
+        google_maps_api.get_etas(origins, "Dallas, TX")
+
+        self.assertGreater(StandInMapsHandler.max_active, 1)
+
+    def test_failed_batch_returns_partial_results(self):
+        origins = [(float(i + 1), -96.8) for i in range(50)]
+        origins[30] = (FAILING_LAT, -96.8)
+        etas = google_maps_api.get_etas(origins, "Dallas, TX")
+
+        self.assertEqual(etas[:25], [f"{i + 1} mins" for i in range(25)])
+        self.assertEqual(etas[25:], [google_maps_api.ETA_UNAVAILABLE] * 25)
+
+    def test_unroutable_origin_is_unavailable(self):
+        etas = google_maps_api.get_etas([(1.0, -96.8), (UNROUTABLE_LAT, -96.8), (3.0, -96.8)], "Dallas, TX")
+
+        self.assertEqual(etas, ["1 mins", google_maps_api.ETA_UNAVAILABLE, "3 mins"])
+
+    def test_empty_origins(self):
+        self.assertEqual(google_maps_api.get_etas([], "Dallas, TX"), [])
+        self.assertEqual(StandInMapsHandler.requests, [])
+
+    def test_single_eta_uses_directions(self):
+        self.assertEqual(google_maps_api.get_eta(12.0, -96.8, "Dallas, TX"), "12 mins")
+
+    def test_repeat_lookup_is_served_from_cache(self):
+        origins = [(float(i + 1), -96.8) for i in range(10)]
+        first = google_maps_api.get_etas(origins, "Dallas, TX")
+        second = google_maps_api.get_etas(origins, "dallas,  tx")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(StandInMapsHandler.requests), 1)
+        self.assertEqual(eta_cache.stats()['hits'], 10)
+
+    def test_origins_in_one_cell_are_looked_up_once(self):
+        etas = google_maps_api.get_etas([(32.7767, -96.7970), (32.7768, -96.7971)], "Dallas, TX")
+
+        self.assertEqual(etas[0], etas[1])
+        self.assertIn('origins=32.7767', StandInMapsHandler.requests[0])
+        self.assertNotIn('%7C', StandInMapsHandler.requests[0])
+
+    def test_failed_lookups_are_not_cached(self):
+        google_maps_api.get_etas([(UNROUTABLE_LAT, -96.8)], "Dallas, TX")
+        google_maps_api.get_etas([(UNROUTABLE_LAT, -96.8)], "Dallas, TX")
+
+        self.assertEqual(len(StandInMapsHandler.requests), 2)
+
+
+class TestEtaCache(unittest.TestCase):
+    def test_geohash_known_value(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_key_buckets_time_of_day(self):
+        from datetime import datetime
+
+        morning = eta_cache_key(32.7767, -96.797, "Dallas, TX", now=datetime(2025, 5, 1, 8, 5))
+        same_bucket = eta_cache_key(32.7767, -96.797, "Dallas, TX", now=datetime(2025, 5, 1, 8, 25))
+        next_bucket = eta_cache_key(32.7767, -96.797, "Dallas, TX", now=datetime(2025, 5, 1, 8, 35))
+
+        self.assertEqual(morning, same_bucket)
+        self.assertNotEqual(morning, next_bucket)
+
+    def test_lru_eviction_and_ttl(self):
+        cache = EtaCache(max_entries=2, ttl=60)
+        cache.set('a', '1 min')
+        cache.set('b', '2 mins')
+        cache.get('a')
+        cache.set('c', '3 mins')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '1 min')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache.set('d', '4 mins', ttl=-1)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
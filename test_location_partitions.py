@@ -0,0 +1,99 @@
+import os
+import unittest
+from datetime import datetime
+from sqlalchemy import text
+
+
+class TestLocationPartitions(unittest.TestCase):
+    """
+    Create monthly LocationUpdate partitions in a scratch schema
+
+    Requires DATABASE_URL to point at a PostgreSQL database; everything runs in one
+    transaction that is rolled back at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+            raise unittest.SkipTest("Partitioning needs a PostgreSQL DATABASE_URL")
+
+        from app import app, db
+
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        cls.db = db
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def setUp(self):
+        self.connection = self.db.engine.connect()
+        self.transaction = self.connection.begin()
+        conn = self.connection
+        conn.execute(text("CREATE SCHEMA location_partition_test"))
+        conn.execute(text("SET LOCAL search_path TO location_partition_test"))
+        self.db.metadata.create_all(conn)
+
+        # The layout convert_to_partitioned produces, with only the default partition
+        conn.execute(text("DROP TABLE location_update CASCADE"))
+        conn.execute(text("""
+            CREATE TABLE location_update (
+                id SERIAL, load_id INTEGER NOT NULL REFERENCES load (id),
+                lat FLOAT NOT NULL, lng FLOAT NOT NULL, speed FLOAT, heading FLOAT,
+                timestamp TIMESTAMP NOT NULL, PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        """))
+        conn.execute(text("CREATE TABLE location_update_default PARTITION OF location_update DEFAULT"))
+
+        conn.execute(text("INSERT INTO client (name) VALUES ('Client')"))
+        conn.execute(text("INSERT INTO facility (name, address, client_id) VALUES ('Origin', 'A', 1), ('Dest', 'B', 1)"))
+        conn.execute(text("""
+            INSERT INTO load (reference_number, client_id, status, pickup_facility_id, delivery_facility_id,
+                              scheduled_pickup_time, scheduled_delivery_time)
+            VALUES ('L1', 1, 'in_transit', 1, 2, '2025-05-01', '2025-05-02')
+        """))
+
+    def tearDown(self):
+        self.transaction.rollback()
+        self.connection.close()
+
+    def rows(self, table):
+        return self.connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+
+    def test_rows_in_default_move_to_new_partition(self):
+        from services.location_storage import ensure_partitions
+
+        # Ingest kept writing while partition maintenance was not running
+        self.connection.execute(text("""
+            INSERT INTO location_update (load_id, lat, lng, timestamp) VALUES
+                (1, 35.0, -90.0, '2025-05-03 10:00'),
+                (1, 35.1, -90.1, '2025-05-31 23:59'),
+                (1, 35.2, -90.2, '2025-06-01 00:00'),
+                (1, 35.3, -90.3, '2025-09-15 12:00')
+        """))
+
+        created = ensure_partitions(months_ahead=1, now=datetime(2025, 5, 20), connection=self.connection)
+
+        self.assertEqual(created, ['location_update_y2025m05', 'location_update_y2025m06'])
+        self.assertEqual(self.rows('location_update_y2025m05'), 2)
+        self.assertEqual(self.rows('location_update_y2025m06'), 1)
+        self.assertEqual(self.rows('location_update_default'), 1)
+        self.assertEqual(self.rows('location_update'), 4)
+
+        # The default partition is attached again and still takes out-of-range rows
+        self.connection.execute(text(
+            "INSERT INTO location_update (load_id, lat, lng, timestamp) VALUES (1, 35.4, -90.4, '2026-01-01')"
+        ))
+        self.assertEqual(self.rows('location_update_default'), 2)
+
+    def test_empty_default_takes_fast_path(self):
+        from services.location_storage import ensure_partitions
+
+        created = ensure_partitions(months_ahead=2, now=datetime(2025, 5, 20), connection=self.connection)
+        self.assertEqual(len(created), 3)
+        self.assertEqual(ensure_partitions(months_ahead=2, now=datetime(2025, 5, 20), connection=self.connection), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy import create_engine, text
+
+SCHEMA = 'motive_poller_test'
+
+
+class TestMotivePoller(unittest.TestCase):
+    """
+    Poll lease, unchanged-fix filtering and the Google ETA schedule in a scratch schema
+
+    Requires DATABASE_URL to point at a PostgreSQL database. The lease is taken on
+    separate connections, so the scratch schema is committed and dropped at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+            raise unittest.SkipTest("Poll lease checks need a PostgreSQL DATABASE_URL")
+
+        from app import app, db
+
+        cls.app = app
+        cls.db = db
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+
+        with db.engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        cls.engine = create_engine(db.engine.url, connect_args={'options': f'-csearch_path={SCHEMA}'})
+        db.metadata.create_all(cls.engine)
+
+        # Route the app's engine and session to the scratch schema for the duration of the tests
+        cls.engines = mock.patch.dict(db._app_engines[app], {None: cls.engine})
+        cls.engines.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.session.remove()
+        cls.engines.stop()
+        cls.engine.dispose()
+        with cls.db.engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+        cls.app_context.pop()
+
+    def tearDown(self):
+        self.db.session.remove()
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM telematics_snapshot"))
+            conn.execute(text("DELETE FROM vehicle"))
+
+    def claim_concurrently(self, now, workers=4):
+        from services.motive_poller import _claim
+
+        results = []
+        lock = threading.Lock()
+        start = threading.Barrier(workers)
+
+        def run_worker():
+            with self.app.app_context():
+                start.wait()
+                claimed = _claim(now)
+                with lock:
+                    results.append(claimed)
+
+        threads = [threading.Thread(target=run_worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        return results
+
+    def test_one_worker_claims_the_first_poll(self):
+        # No snapshot row yet, so the workers race to insert it
+        results = self.claim_concurrently(datetime.utcnow())
+        self.assertEqual(sorted(results), [False, False, False, True])
+
+    def test_one_worker_claims_a_due_poll(self):
+        from services.motive_poller import _claim, _store_snapshot, POLL_INTERVAL_SECONDS
+
+        now = datetime.utcnow()
+        self.assertTrue(_claim(now))
+        _store_snapshot([{'vehicle_id': 1}], now)
+
+        # Not due yet, then due again for exactly one worker
+        self.assertFalse(_claim(now + timedelta(seconds=1)))
+        results = self.claim_concurrently(now + timedelta(seconds=POLL_INTERVAL_SECONDS + 1))
+        self.assertEqual(sorted(results), [False, False, False, True])
+
+    def test_abandoned_lease_is_taken_over(self):
+        from services.motive_poller import _claim, LEASE_SECONDS
+
+        now = datetime.utcnow()
+        self.assertTrue(_claim(now))
+        self.assertFalse(_claim(now + timedelta(seconds=1), only_if_due=False))
+        self.assertTrue(_claim(now + timedelta(seconds=LEASE_SECONDS + 1)))
+
+    def test_vehicle_pings_skip_unchanged_fixes(self):
+        from models import Vehicle
+        from services.motive_poller import vehicle_pings
+
+        last_fix = datetime(2025, 5, 20, 12, 0)
+        self.db.session.add_all([
+            Vehicle(motive_vehicle_id='101', current_lat=35.0, current_lng=-90.0, last_updated=last_fix),
+            Vehicle(motive_vehicle_id='102', current_lat=36.0, current_lng=-91.0, last_updated=last_fix),
+            Vehicle(motive_vehicle_id='103')
+        ])
+        self.db.session.commit()
+
+        raw_pings, unknown, unchanged = vehicle_pings([
+            # Parked: Motive repeats the stored fix
+            {'vehicle_id': 101, 'latitude': 35.0, 'longitude': -90.0, 'located_at': '2025-05-20T12:00:00Z'},
+            {'vehicle_id': 102, 'latitude': 36.1, 'longitude': -91.1, 'located_at': '2025-05-20T12:01:00Z'},
+            {'vehicle_id': 103, 'latitude': 37.0, 'longitude': -92.0, 'located_at': '2025-05-20T12:01:00Z'},
+            {'vehicle_id': 999, 'latitude': 38.0, 'longitude': -93.0, 'located_at': '2025-05-20T12:01:00Z'},
+            {'vehicle_id': 104, 'latitude': None, 'longitude': None}
+        ])
+
+        moved = {ping['lat'] for ping in raw_pings}
+        self.assertEqual(moved, {36.1, 37.0})
+        self.assertEqual(unknown, 1)
+        self.assertEqual(unchanged, 1)
+
+    def test_google_refresh_schedule_is_shared(self):
+        from services.motive_poller import _claim, _refresh_etas, ETA_GOOGLE_REFRESH_SECONDS
+
+        now = datetime.utcnow()
+        self.assertTrue(_claim(now))
+        calls = []
+
+        def refresh_current_etas(at, use_google=True):
+            calls.append(use_google)
+            return {}
+
+        with mock.patch('services.eta_engine.refresh_current_etas', refresh_current_etas):
+            _refresh_etas(now)
+            _refresh_etas(now + timedelta(seconds=60))
+            _refresh_etas(now + timedelta(seconds=ETA_GOOGLE_REFRESH_SECONDS + 1))
+
+        self.assertEqual(calls, [True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
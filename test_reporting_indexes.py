@@ -0,0 +1,109 @@
+import os
+import unittest
+from datetime import datetime, date, timedelta
+from sqlalchemy import text
+
+SEED_LOADS = 200000
+SEED_DRIVERS = 200
+SEED_START = datetime(2024, 1, 1)
+
+
+class TestReportingIndexes(unittest.TestCase):
+    """
+    Seed a large Load table in a scratch schema and check that the reporting queries
+    are planned against the indexes instead of sequential scans.
+
+    Requires DATABASE_URL to point at a PostgreSQL database; everything runs in one
+    transaction that is rolled back at the end.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+            raise unittest.SkipTest("EXPLAIN checks need a PostgreSQL DATABASE_URL")
+
+        from app import app, db
+
+        cls.app_context = app.app_context()
+        cls.app_context.push()
+        cls.db = db
+
+        cls.connection = db.engine.connect()
+        cls.transaction = cls.connection.begin()
+        cls.connection.execute(text("CREATE SCHEMA reporting_index_test"))
+        cls.connection.execute(text("SET LOCAL search_path TO reporting_index_test"))
+        db.metadata.create_all(cls.connection)
+        cls._seed()
+        cls.connection.execute(text("ANALYZE"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.transaction.rollback()
+        cls.connection.close()
+        cls.app_context.pop()
+
+    @classmethod
+    def _seed(cls):
+        conn = cls.connection
+        conn.execute(text("INSERT INTO client (name) VALUES ('Seed Client')"))
+        conn.execute(text(
+            "INSERT INTO facility (name, address, client_id) "
+            "VALUES ('Seed Pickup', '1 Pickup Rd', 1), ('Seed Delivery', '2 Delivery Rd', 1)"
+        ))
+        conn.execute(text(
+            "INSERT INTO driver (name, status) "
+            "SELECT 'Driver ' || g, 'active' FROM generate_series(1, :drivers) g"
+        ), {'drivers': SEED_DRIVERS})
+
+        # One load every five minutes; 2% scheduled and 2% in transit, the rest delivered
+        conn.execute(text("""
+            INSERT INTO load (reference_number, client_id, driver_id,
+                              pickup_facility_id, scheduled_pickup_time, actual_pickup_arrival,
+                              delivery_facility_id, scheduled_delivery_time, actual_delivery_arrival,
+                              status)
+            SELECT 'SEED-' || g, 1, 1 + g % :drivers,
+                   1, ts, CASE WHEN g % 50 > 1 THEN ts + (g % 7 - 3) * interval '10 minutes' END,
+                   2, ts + interval '8 hours', CASE WHEN g % 50 > 1 THEN ts + interval '8 hours' + (g % 5 - 2) * interval '15 minutes' END,
+                   CASE g % 50 WHEN 0 THEN 'scheduled' WHEN 1 THEN 'in_transit' ELSE 'delivered' END
+            FROM (SELECT g, CAST(:start AS timestamp) + g * interval '5 minutes' AS ts
+                  FROM generate_series(1, :loads) g) seeded
+        """), {'drivers': SEED_DRIVERS, 'loads': SEED_LOADS, 'start': SEED_START})
+
+    def explain(self, statement):
+        sql = str(statement.compile(dialect=self.connection.dialect, compile_kwargs={'literal_binds': True}))
+        rows = self.connection.execute(text(f"EXPLAIN {sql}")).fetchall()
+        return '\n'.join(row[0] for row in rows)
+
+    def assertNoLoadSeqScan(self, statement):
+        plan = self.explain(statement)
+        self.assertNotIn('Seq Scan on load', plan, plan)
+
+    def test_summary_window_counts(self):
+        from services.dashboard_summary import window_counts_query
+
+        self.assertNoLoadSeqScan(window_counts_query(date(2024, 3, 1), date(2024, 3, 30)).statement)
+
+    def test_summary_window_counts_for_driver(self):
+        from services.dashboard_summary import window_counts_query
+
+        self.assertNoLoadSeqScan(window_counts_query(date(2024, 3, 1), date(2024, 3, 30), driver_id=7).statement)
+
+    def test_summary_status_counts_for_driver(self):
+        from services.dashboard_summary import status_counts_query
+
+        self.assertNoLoadSeqScan(status_counts_query(driver_id=7).statement)
+
+    def test_at_risk_loads(self):
+        from routes.dashboard import at_risk_loads_query
+
+        self.assertNoLoadSeqScan(at_risk_loads_query(SEED_START + timedelta(days=30)).statement)
+
+    def test_rollup_refresh_aggregate(self):
+        from services.rollups import _aggregate_select
+
+        day = date(2024, 3, 15)
+        self.assertNoLoadSeqScan(_aggregate_select([7], day, day))
+
+
+if __name__ == '__main__':
+    unittest.main()